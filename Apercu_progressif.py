@@ -0,0 +1,339 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+
+import numpy as np
+
+from Ecriture_asynchrone import writer_processus, vider_ecritures, ecrire_png
+from Index_tuiles import supprimer_absents
+from Couleurs import color_lut
+from Execution_pool import executer_pool
+from Sortie_MVT import origine
+from Stockage_tuiles import lire_tuile
+from Trace import mesure
+
+############################################################################################################
+
+## Construction progressive : aperçu des niveaux de zoom les moins précis
+
+############################################################################################################
+
+# Les niveaux de zoom 0 à zoom_apercu sont dessinés directement à partir des positions, dès le tri du fichier TSV :
+# chaque position est placée dans son pixel de la pyramide TMS (tuiles de 256 pixels, y compté depuis le bas comme gdal2tiles)
+# en gardant la vitesse maximale. Ces niveaux sont petits et ne coûtent qu'un tri des positions par niveau.
+# La page progressif.html de chaque catégorie permet de les consulter aussitôt. Les niveaux suivants sont dessinés un par un, du moins précis
+# au plus précis, à partir du stockage des tuiles de base et avec la même règle (vitesse maximale de chaque pixel), et la page est republiée
+# avec un niveau de plus après chacun. Seul le niveau le plus précis est produit par gdal2tiles, en une seule passe sur les tuiles de base.
+
+# Côté des tuiles en pixels
+taille_tuile = 256
+
+
+"""
+binning_niveau draws every tile of one zoom level from the positions, keeping the fastest speed on each pixel.
+:param x: x of the positions (WebMercator)
+:param y: y of the positions (WebMercator)
+:param speed: speed of the positions
+:param zoom: zoom level
+:return: dictionary {(x, y) TMS index of the tile: RGBA array (256, 256, 4)}
+"""
+
+
+def binning_niveau(x, y, speed, zoom):
+    if np.any(speed < 0):
+        raise ValueError("Vitesse doit être un nombre positif")
+
+    cote = taille_tuile * 2**zoom
+    col = np.clip(((x + origine) / (2 * origine) * cote).astype(np.int64), 0, cote - 1)
+    row = np.clip(((origine - y) / (2 * origine) * cote).astype(np.int64), 0, cote - 1)
+    vitesse = np.minimum(speed, 20).astype(np.int64)
+
+    # Vitesse maximale de chaque pixel occupé : après le tri, le dernier élément de chaque pixel est le plus rapide
+    pixel = row * cote + col
+    ordre = np.lexsort((vitesse, pixel))
+    pixel = pixel[ordre]
+    dernier = np.append(pixel[1:] != pixel[:-1], True)
+    pixel = pixel[dernier]
+    vitesse = vitesse[ordre][dernier]
+    row = pixel // cote
+    col = pixel % cote
+
+    # Regroupement des pixels par tuile
+    nb_tuiles = 2**zoom
+    tuile = (col // taille_tuile) * nb_tuiles + row // taille_tuile
+    ordre = np.argsort(tuile, kind="stable")
+    tuile = tuile[ordre]
+    row = row[ordre] % taille_tuile
+    col = col[ordre] % taille_tuile
+    couleurs = color_lut[vitesse[ordre]]
+    bornes = np.flatnonzero(np.diff(tuile)) + 1
+
+    resultat = {}
+    for debut, fin in zip(
+        np.concatenate([[0], bornes]), np.concatenate([bornes, [len(tuile)]])
+    ):
+        image = np.zeros((taille_tuile, taille_tuile, 4), dtype=np.uint8)
+        image[row[debut:fin], col[debut:fin]] = couleurs[debut:fin]
+        tx, ty = divmod(int(tuile[debut]), nb_tuiles)
+        # Numérotation TMS : la ligne 0 est en bas
+        resultat[(tx, nb_tuiles - 1 - ty)] = image
+    return resultat
+
+
+# Page de visualisation des tuiles déjà produites (OpenLayers), réécrite à chaque nouveau niveau de zoom
+modele_page = """<!DOCTYPE html>
+<html>
+<head>
+<title>{categorie}</title>
+<meta charset="utf-8">
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/ol@v9.2.4/ol.css">
+<script src="https://cdn.jsdelivr.net/npm/ol@v9.2.4/dist/ol.js"></script>
+<style>html, body, #map {{ margin: 0; width: 100%; height: 100%; }}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = new ol.Map({{
+    target: "map",
+    layers: [
+        new ol.layer.Tile({{source: new ol.source.OSM()}}),
+        new ol.layer.Tile({{
+            source: new ol.source.XYZ({{
+                url: "{{z}}/{{x}}/{{-y}}.png",
+                minZoom: {zoom_min},
+                maxZoom: {zoom_max}
+            }})
+        }})
+    ],
+    view: new ol.View({{center: [0, 0], zoom: {zoom_min}}})
+}});
+{ajustement}
+</script>
+</body>
+</html>
+"""
+
+
+"""
+publier_page writes the viewer of the zoom levels already produced in a category directory.
+:param categorie_directory: path to the category directory
+:param categorie: name of the category
+:param zoom_min: least precise zoom level
+:param zoom_max: most precise zoom level already produced
+:param extent: extent of the view (min_x, min_y, max_x, max_y in WebMercator), None for the whole world
+:param nom: name of the page
+"""
+
+
+def publier_page(
+    categorie_directory, categorie, zoom_min, zoom_max, extent=None, nom="progressif.html"
+):
+    ajustement = ""
+    if extent is not None:
+        ajustement = f"map.getView().fit([{', '.join(f'{v:f}' for v in extent)}]);"
+    chemin = os.path.join(categorie_directory, nom)
+    # Ecriture atomique : la page peut être ouverte pendant sa mise à jour
+    temp_path = chemin + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(
+            modele_page.format(
+                categorie=categorie,
+                zoom_min=zoom_min,
+                zoom_max=zoom_max,
+                ajustement=ajustement,
+            )
+        )
+    os.replace(temp_path, chemin)
+
+
+"""
+creer_apercu draws the least precise zoom levels of every category directly from the positions and publishes their viewer.
+:param data: points with the columns lon, lat (WebMercator), speed and QO_category
+:param Path_works: paths to the work directories of the maps
+:param zoom_min: least precise zoom level
+:param zooms_max: most precise zoom level drawn for each map
+:param extent: extent of the view (min_x, min_y, max_x, max_y in WebMercator), None for the whole world
+"""
+
+
+def creer_apercu(data, Path_works, zoom_min, zooms_max, extent=None):
+    if not any(zoom_min <= zoom_max for zoom_max in zooms_max):
+        return
+
+    # Les positions hors de la projection WebMercator (pôles) ne peuvent pas être placées dans une tuile
+    data = data[np.isfinite(data["lon"].values) & np.isfinite(data["lat"].values)]
+    categories = list(data["QO_category"].unique()) + ["All"]
+    writer = writer_processus()
+
+    for categorie in categories:
+        # Tuiles écrites dans chaque dossier de niveau de zoom
+        ecrites = {}
+        if categorie == "All":
+            data_cat = data
+        else:
+            data_cat = data[data["QO_category"].values == categorie]
+        x = data_cat["lon"].values
+        y = data_cat["lat"].values
+        speed = data_cat["speed"].values
+
+        for zoom in range(zoom_min, max(zooms_max) + 1):
+            Path_works_zoom = [
+                Path_work
+                for Path_work, zoom_max in zip(Path_works, zooms_max)
+                if zoom <= zoom_max
+            ]
+            with mesure(f"{categorie} zoom {zoom}", "apercu", points=len(x)) as infos:
+                tuiles = binning_niveau(x, y, speed, zoom)
+                infos["tuiles"] = len(tuiles)
+            for Path_work in Path_works_zoom:
+                categorie_directory = os.path.join(Path_work, categorie)
+                dossier_zoom = os.path.join(categorie_directory, str(zoom))
+                ecrites[dossier_zoom] = set()
+                for (tx, ty), image in tuiles.items():
+                    dossier = os.path.join(dossier_zoom, str(tx))
+                    os.makedirs(dossier, exist_ok=True)
+                    chemin = os.path.join(dossier, f"{ty}.png")
+                    ecrites[dossier_zoom].add(chemin)
+                    # Une tuile identique à celle de l'exécution précédente n'est pas réécrite
+                    writer.soumettre(chemin, ecrire_png, image, categorie_directory)
+            print(
+                f"Aperçu de la catégorie {categorie} au zoom {zoom} : {len(tuiles)} tuiles"
+            )
+
+        # La page n'est publiée qu'une fois les tuiles écrites
+        vider_ecritures()
+        # Les tuiles d'une exécution précédente qui n'ont plus de position sont supprimées
+        for dossier_zoom, chemins in ecrites.items():
+            supprimer_absents(dossier_zoom, chemins, os.path.dirname(dossier_zoom))
+        for Path_work, zoom_max in zip(Path_works, zooms_max):
+            if zoom_min <= zoom_max:
+                categorie_directory = os.path.join(Path_work, categorie)
+                publier_page(categorie_directory, categorie, zoom_min, zoom_max, extent)
+                print(
+                    f"Aperçu consultable : {os.path.join(categorie_directory, 'progressif.html')}"
+                )
+
+
+"""
+tuile_niveau draws one tile of a zoom level from the store of the base tiles, keeping the fastest speed on each pixel like the preview.
+:param categorie_directory: path to the category directory
+:param tsv_directory: path to the store of the tiles of the category (see Stockage_tuiles)
+:param cles_base: (x, y) of the base tiles that meet the tile
+:param zoom: zoom level of the tile
+:param tx: x TMS index of the tile
+:param ty: y TMS index of the tile
+:param mode_trajectoire: True if the store holds segments instead of pixels
+:return: path of the tile, None if the tile has no boat
+"""
+
+
+def tuile_niveau(
+    categorie_directory, tsv_directory, cles_base, zoom, tx, ty, mode_trajectoire
+):
+    from MAIN import burn_segments, burn_speeds
+
+    cote = 2 * origine / 2**zoom
+    min_x = -origine + tx * cote
+    max_y = -origine + (ty + 1) * cote
+    resolution = cote / taille_tuile
+
+    # Les pixels hors de la tuile sont ignorés par le tracé : chaque tuile de base est lue en entier
+    image = np.zeros((taille_tuile, taille_tuile, 4), dtype=np.uint8)
+    with mesure(f"{zoom}/{tx}/{ty}", "niveau", tuile=[tx, ty]) as infos:
+        infos["points"] = 0
+        for x, y in cles_base:
+            df = lire_tuile(tsv_directory, x, y)
+            if df is None:
+                continue
+            infos["points"] += len(df)
+            if mode_trajectoire:
+                burn_segments(image, df, min_x, max_y, resolution)
+            else:
+                rows = ((max_y - df["lat"].values) // resolution).astype(np.int64)
+                cols = ((df["lon"].values - min_x) // resolution).astype(np.int64)
+                burn_speeds(image, rows, cols, df["speed"].values)
+    if not image[..., 3].any():
+        return None
+
+    dossier = os.path.join(categorie_directory, str(zoom), str(tx))
+    os.makedirs(dossier, exist_ok=True)
+    chemin = os.path.join(dossier, f"{ty}.png")
+    writer_processus().soumettre(chemin, ecrire_png, image, categorie_directory)
+    return chemin
+
+
+"""
+niveau_depuis_stockage creates one zoom level of a category from the store of its base tiles (see tuile_niveau).
+:param categorie_directory: path to the category directory
+:param tsv_directory: path to the store of the tiles of the category (see Stockage_tuiles)
+:param tuiles: dictionary {(x, y) of the base tile: (min_x, min_y, max_x, max_y)}
+:param couts: number of rows of each base tile that has rows (see Stockage_tuiles.couts_partition)
+:param zoom: zoom level to create
+:param mode_trajectoire: True if the store holds segments instead of pixels
+:param pool: pool of processes to reuse, None to create one
+"""
+
+
+def niveau_depuis_stockage(
+    categorie_directory, tsv_directory, tuiles, couts, zoom, mode_trajectoire, pool=None
+):
+    # Tuiles du niveau touchées par chaque tuile de base qui a des lignes
+    cote = 2 * origine / 2**zoom
+    dernier = 2**zoom - 1
+    bases = {}
+    for cle, nombre in couts.items():
+        if nombre == 0 or cle not in tuiles:
+            continue
+        min_x, min_y, max_x, max_y = tuiles[cle]
+        # Bornes comprises : une position sur le bord maximal de la tuile de base appartient à la tuile suivante du niveau
+        tx_min, tx_max, ty_min, ty_max = (
+            min(max(int((v + origine) // cote), 0), dernier)
+            for v in (min_x, max_x, min_y, max_y)
+        )
+        for tx in range(tx_min, tx_max + 1):
+            for ty in range(ty_min, ty_max + 1):
+                bases.setdefault((tx, ty), []).append(cle)
+
+    # Les tuiles qui ont le plus de lignes à lire d'abord
+    ordre = sorted(bases, key=lambda tuile: -sum(couts[cle] for cle in bases[tuile]))
+    with mesure(f"niveau zoom {zoom}", "etape", tuiles=len(ordre)):
+        # executer_pool rend la main une fois les tuiles écrites : le niveau peut être publié aussitôt
+        chemins = executer_pool(
+            tuile_niveau,
+            [
+                (
+                    categorie_directory,
+                    tsv_directory,
+                    bases[(tx, ty)],
+                    zoom,
+                    tx,
+                    ty,
+                    mode_trajectoire,
+                )
+                for tx, ty in ordre
+            ],
+            pool,
+        )
+    # Les tuiles d'une exécution précédente qui ne sont plus couvertes sont supprimées
+    dossier_zoom = os.path.join(categorie_directory, str(zoom))
+    if os.path.isdir(dossier_zoom):
+        supprimer_absents(
+            dossier_zoom,
+            {chemin for chemin in chemins if chemin is not None},
+            categorie_directory,
+        )
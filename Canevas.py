@@ -0,0 +1,273 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import json
+import os
+
+import numpy as np
+
+from Ecriture_asynchrone import writer_processus, ecrire_png
+from Couleurs import color_lut
+from Execution_pool import executer_pool
+from Index_tuiles import supprimer_absents
+from Sortie_MVT import origine
+from Trace import mesure
+
+############################################################################################################
+
+## Mode canevas : un seul raster sur disque par catégorie au lieu de tuiles .tif
+
+############################################################################################################
+
+# Pour les zooms maximaux peu élevés (jusqu'à zoom_max_canevas), toute l'étendue couverte tient dans un tableau uint8 sur disque (np.memmap)
+# aligné sur la pyramide de tuiles de 256 pixels au zoom maximal. Chaque pixel contient la vitesse maximale + 1 (0 : pas de bateau).
+# Au tri du fichier TSV, les positions sont converties en indices de pixels du canevas (une seule vitesse par pixel) et enregistrées
+# dans le dossier canevas de chaque catégorie. Les processus de calcul remplissent ensuite le canevas par bandes de 256 lignes disjointes
+# et écrivent directement les tuiles PNG de chaque bande : il n'y a plus de GeoTIFF intermédiaires, ni de gdal2tiles, ni de fusion aux bords des tuiles.
+# Chaque niveau moins précis est un canevas deux fois plus petit, dont chaque pixel garde le maximum des 4 pixels du niveau suivant.
+
+# Côté des tuiles en pixels
+taille_tuile = 256
+
+nom_geometrie = "canevas.json"
+
+
+"""
+geometrie gives the tiles covered by the canvas at one zoom level.
+:param meta: geometry of the canvas at the most precise zoom level (see preparer_canevas)
+:param zoom: zoom level
+:return: (x of the first tile, y of the first tile counted from the top, number of tile columns, number of tile rows)
+"""
+
+
+def geometrie(meta, zoom):
+    decalage = meta["zoom"] - zoom
+    tx0 = meta["tx0"] >> decalage
+    ty0 = meta["ty0"] >> decalage
+    tx1 = (meta["tx0"] + meta["nx"] - 1) >> decalage
+    ty1 = (meta["ty0"] + meta["ny"] - 1) >> decalage
+    return tx0, ty0, tx1 - tx0 + 1, ty1 - ty0 + 1
+
+
+"""
+ouvrir_niveau opens the canvas of one zoom level.
+:param canevas_directory: path to the canvas directory of the category
+:param meta: geometry of the canvas (see preparer_canevas)
+:param zoom: zoom level
+:param mode: memmap mode ("w+" to create the file, "r+" to fill it, "r" to read it)
+:return: uint8 memmap (rows, columns)
+"""
+
+
+def ouvrir_niveau(canevas_directory, meta, zoom, mode):
+    _, _, nx, ny = geometrie(meta, zoom)
+    return np.memmap(
+        os.path.join(canevas_directory, f"niveau_{zoom}.u8"),
+        dtype=np.uint8,
+        mode=mode,
+        shape=(ny * taille_tuile, nx * taille_tuile),
+    )
+
+
+"""
+preparer_canevas places the positions in the pixels of the canvas of one map and saves them for every category.
+:param data: points with the columns lon, lat (WebMercator), speed and QO_category
+:param Path_work: path to the work directory of the map
+:param zoom: most precise zoom level of the map
+:param bornes: (min_x, min_y, max_x, max_y) in WebMercator, area to cover
+:return: dictionary {(0, 0): (min_x, min_y, max_x, max_y)} of the extent of the canvas, in the format of the tiles of tri_CSV
+"""
+
+
+def preparer_canevas(data, Path_work, zoom, bornes):
+    if np.any(data["speed"].values < 0):
+        raise ValueError("Vitesse doit être un nombre positif")
+
+    # Tuiles du zoom maximal qui couvrent la zone, numérotées depuis le haut
+    nb_tuiles = 2**zoom
+    taille = 2 * origine / nb_tuiles
+    min_x, min_y, max_x, max_y = bornes
+    tx0, tx1, ty0, ty1 = (
+        int(np.clip(v, 0, nb_tuiles - 1))
+        for v in [
+            (min_x + origine) // taille,
+            (max_x + origine) // taille,
+            (origine - max_y) // taille,
+            (origine - min_y) // taille,
+        ]
+    )
+    meta = {"zoom": zoom, "tx0": tx0, "ty0": ty0, "nx": tx1 - tx0 + 1, "ny": ty1 - ty0 + 1}
+    os.makedirs(Path_work, exist_ok=True)
+    with open(os.path.join(Path_work, nom_geometrie), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    # Les positions hors de la projection WebMercator (pôles) ne peuvent pas être placées dans le canevas
+    data = data[np.isfinite(data["lon"].values) & np.isfinite(data["lat"].values)]
+    largeur = meta["nx"] * taille_tuile
+    resolution = taille / taille_tuile
+    col = np.clip(
+        ((data["lon"].values + origine) // resolution).astype(np.int64) - tx0 * taille_tuile,
+        0,
+        largeur - 1,
+    )
+    row = np.clip(
+        ((origine - data["lat"].values) // resolution).astype(np.int64) - ty0 * taille_tuile,
+        0,
+        meta["ny"] * taille_tuile - 1,
+    )
+    pixel = row * largeur + col
+    vitesse = np.minimum(data["speed"].values, 20).astype(np.uint8) + 1
+
+    for categorie in list(data["QO_category"].unique()) + ["All"]:
+        if categorie == "All":
+            pixel_cat = pixel
+            vitesse_cat = vitesse
+        else:
+            dans_categorie = data["QO_category"].values == categorie
+            pixel_cat = pixel[dans_categorie]
+            vitesse_cat = vitesse[dans_categorie]
+
+        # Vitesse maximale de chaque pixel : après le tri, le dernier élément de chaque pixel est le plus rapide
+        ordre = np.lexsort((vitesse_cat, pixel_cat))
+        pixel_cat = pixel_cat[ordre]
+        dernier = np.append(pixel_cat[1:] != pixel_cat[:-1], True)
+
+        canevas_directory = os.path.join(Path_work, categorie, "canevas")
+        os.makedirs(canevas_directory, exist_ok=True)
+        np.save(os.path.join(canevas_directory, "pixels.npy"), pixel_cat[dernier])
+        np.save(
+            os.path.join(canevas_directory, "vitesses.npy"), vitesse_cat[ordre][dernier]
+        )
+        print(
+            f"Canevas de la catégorie {categorie} : {int(dernier.sum())} pixels occupés sur {meta['nx']} x {meta['ny']} tuiles"
+        )
+
+    return {
+        (0, 0): (
+            -origine + tx0 * taille,
+            origine - (ty1 + 1) * taille,
+            -origine + (tx1 + 1) * taille,
+            origine - ty0 * taille,
+        )
+    }
+
+
+"""
+niveau_bande fills one band of 256 rows of the canvas of a zoom level and writes the PNG tiles of this band.
+At the most precise zoom level the band is filled from the positions, at the other levels from the canvas of the next zoom level.
+:param canevas_directory: path to the canvas directory of the category
+:param meta: geometry of the canvas (see preparer_canevas)
+:param zoom: zoom level
+:param ty: y of the tile row (counted from the top)
+:param categorie_directory: path to the category directory where the tiles are written
+:return: list of the paths of the tiles written
+"""
+
+
+def niveau_bande(canevas_directory, meta, zoom, ty, categorie_directory):
+    tx0, ty0, nx, _ = geometrie(meta, zoom)
+    largeur = nx * taille_tuile
+    canevas = ouvrir_niveau(canevas_directory, meta, zoom, "r+")
+    debut = (ty - ty0) * taille_tuile
+    # Bandes disjointes : chaque processus écrit ses propres lignes du canevas
+    bande = canevas[debut : debut + taille_tuile]
+
+    with mesure(
+        f"{os.path.basename(categorie_directory)} zoom {zoom} ligne {ty}", "canevas", tuile=[zoom, ty]
+    ) as infos:
+        if zoom == meta["zoom"]:
+            pixels = np.load(os.path.join(canevas_directory, "pixels.npy"), mmap_mode="r")
+            vitesses = np.load(os.path.join(canevas_directory, "vitesses.npy"), mmap_mode="r")
+            a, b = np.searchsorted(
+                pixels, [debut * largeur, (debut + taille_tuile) * largeur]
+            )
+            bande.reshape(-1)[pixels[a:b] - debut * largeur] = vitesses[a:b]
+            infos["points"] = int(b - a)
+        else:
+            # Bloc de 512 lignes du niveau suivant qui couvre la bande, complété par des zéros hors du canevas de ce niveau
+            sx0, sy0, snx, sny = geometrie(meta, zoom + 1)
+            source = ouvrir_niveau(canevas_directory, meta, zoom + 1, "r")
+            r0 = (2 * ty - sy0) * taille_tuile
+            c0 = (2 * tx0 - sx0) * taille_tuile
+            bloc = np.zeros((2 * taille_tuile, 2 * largeur), dtype=np.uint8)
+            rs0, rs1 = max(r0, 0), min(r0 + 2 * taille_tuile, sny * taille_tuile)
+            cs0, cs1 = max(c0, 0), min(c0 + 2 * largeur, snx * taille_tuile)
+            bloc[rs0 - r0 : rs1 - r0, cs0 - c0 : cs1 - c0] = source[rs0:rs1, cs0:cs1]
+            bande[:] = bloc.reshape(taille_tuile, 2, largeur, 2).max(axis=(1, 3))
+        canevas.flush()
+
+        # Tuiles PNG de la bande, numérotées depuis le bas comme gdal2tiles (TMS)
+        chemins = []
+        for i in range(nx):
+            tuile = bande[:, i * taille_tuile : (i + 1) * taille_tuile]
+            if not tuile.any():
+                continue
+            image = np.zeros((taille_tuile, taille_tuile, 4), dtype=np.uint8)
+            occupe = tuile > 0
+            image[occupe] = color_lut[tuile[occupe] - 1]
+            dossier = os.path.join(categorie_directory, str(zoom), str(tx0 + i))
+            os.makedirs(dossier, exist_ok=True)
+            chemin = os.path.join(dossier, f"{2**zoom - 1 - ty}.png")
+            writer_processus().soumettre(chemin, ecrire_png, image, categorie_directory)
+            chemins.append(chemin)
+        infos["tuiles"] = len(chemins)
+    return chemins
+
+
+"""
+produire_canevas creates every zoom level of one category from its canvas, from the most precise to the least precise.
+:param Path_work: path to the work directory of the map
+:param categorie_directory: path to the category directory
+:param zoom_min: least precise zoom level
+:param pool: pool of processes to reuse, None to create one for each zoom level
+"""
+
+
+def produire_canevas(Path_work, categorie_directory, zoom_min, pool=None):
+    with open(os.path.join(Path_work, nom_geometrie), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    canevas_directory = os.path.join(categorie_directory, "canevas")
+    categorie = os.path.basename(categorie_directory)
+
+    for zoom in range(meta["zoom"], zoom_min - 1, -1):
+        _, ty0, _, ny = geometrie(meta, zoom)
+        # Fichier créé (rempli de zéros) avant que les processus n'écrivent leurs bandes
+        ouvrir_niveau(canevas_directory, meta, zoom, "w+").flush()
+
+        lignes = list(range(ty0, ty0 + ny))
+        if zoom == meta["zoom"]:
+            # Les bandes les plus chargées d'abord
+            pixels = np.load(os.path.join(canevas_directory, "pixels.npy"), mmap_mode="r")
+            largeur = meta["nx"] * taille_tuile * taille_tuile
+            nb_points = np.diff(
+                np.searchsorted(pixels, np.arange(meta["ny"] + 1) * largeur)
+            )
+            lignes = [lignes[i] for i in np.argsort(-nb_points, kind="stable")]
+
+        ecrites = executer_pool(
+            niveau_bande,
+            [(canevas_directory, meta, zoom, ty, categorie_directory) for ty in lignes],
+            pool,
+            nom=f"canevas {categorie} zoom {zoom}",
+        )
+        # Les tuiles d'une exécution précédente qui n'ont plus de position sont supprimées
+        supprimer_absents(
+            os.path.join(categorie_directory, str(zoom)),
+            {chemin for chemins in ecrites for chemin in chemins},
+            categorie_directory,
+        )
+        print(f"Niveau de zoom {zoom} de la catégorie {categorie} créé à partir du canevas")
@@ -0,0 +1,142 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+
+import Parametres_a_modifier
+
+############################################################################################################
+
+## Configuration d'une exécution
+
+############################################################################################################
+
+# Les paramètres d'une exécution sont regroupés dans un objet passé à MAIN.render, au lieu d'être lus dans les variables du module Parametres_a_modifier :
+# un service peut ainsi lancer plusieurs exécutions différentes sans modifier de fichier. Les paramètres non donnés gardent la valeur de Parametres_a_modifier.py.
+
+
+"""
+Configuration gathers the parameters of a run, every parameter not given takes its value from Parametres_a_modifier.py.
+:param reprise: True to resume an interrupted run (see Reprise)
+:param valeurs: parameters to change, by name (see Configuration.noms)
+"""
+
+
+class Configuration:
+    noms = [
+        "PATH",
+        "Database_Name",
+        "max_zoom",
+        "liste_max_zoom",
+        "emprise",
+        "zoom_min",
+        "pixels",
+        "hauteur_bande",
+        "sortie_cog",
+        "sortie_mvt",
+        "zoom_max_mvt",
+        "budget_mvt",
+        "sortie_densite",
+        "zoom_max_densite",
+        "rayon_densite",
+        "croissance_rayon_densite",
+        "mode_progressif",
+        "zoom_apercu",
+        "mode_canevas",
+        "zoom_statistiques",
+        "mode_trajectoire",
+        "ecart_temps_max",
+        "ecart_distance_max",
+        "mode_distribue",
+        "dossier_file_taches",
+        "duree_bail",
+        "nb_essais_max",
+        "mode_trace",
+    ]
+
+    def __init__(self, reprise=False, **valeurs):
+        inconnus = set(valeurs) - set(self.noms)
+        if inconnus:
+            raise ValueError(f"Paramètres inconnus : {sorted(inconnus)}")
+
+        for nom in self.noms:
+            setattr(self, nom, valeurs.get(nom, getattr(Parametres_a_modifier, nom)))
+        self.reprise = reprise
+
+        # La file de tâches suit le dossier des données si elle n'est pas donnée
+        if "PATH" in valeurs and "dossier_file_taches" not in valeurs:
+            self.dossier_file_taches = os.path.join(self.PATH, "file_taches")
+
+        for zoom in self.cibles():
+            if zoom not in Parametres_a_modifier.zoom_resolutions:
+                raise ValueError(f"Niveau de zoom {zoom} invalide (entre 0 et 18)")
+            if zoom < self.zoom_min:
+                raise ValueError(
+                    f"Le zoom minimal {self.zoom_min} dépasse le zoom maximal {zoom}"
+                )
+        if self.sortie_densite and self.zoom_max_densite < self.zoom_min:
+            raise ValueError(
+                f"Le zoom minimal {self.zoom_min} dépasse le zoom maximal de la densité {self.zoom_max_densite}"
+            )
+        if self.hauteur_bande < 0:
+            raise ValueError(f"Hauteur de bande invalide : {self.hauteur_bande}")
+        if self.mode_canevas:
+            if max(self.cibles()) > Parametres_a_modifier.zoom_max_canevas:
+                raise ValueError(
+                    f"Le mode canevas est limité au zoom {Parametres_a_modifier.zoom_max_canevas}"
+                )
+            if self.mode_trajectoire or self.sortie_cog or self.mode_progressif or self.mode_distribue:
+                raise ValueError(
+                    "Le mode canevas ne produit que des cartes de points, sans COG, construction progressive ni calcul distribué"
+                )
+        if self.emprise is not None:
+            self.emprise = tuple(float(v) for v in self.emprise)
+            lon_min, lat_min, lon_max, lat_max = self.emprise
+            if not (-180 <= lon_min < lon_max <= 180 and -85.0511 <= lat_min < lat_max <= 85.0511):
+                raise ValueError(f"Emprise invalide : {self.emprise}")
+
+    @property
+    def name_tsv(self):
+        return self.Database_Name.split(".")[0]
+
+    def cibles(self):
+        # Une carte par zoom maximum demandé, de la plus précise à la moins précise
+        return sorted(set(self.liste_max_zoom or [self.max_zoom]), reverse=True)
+
+    def resolution(self, zoom):
+        # On prend 90/100 de la résolution du zoom pour être sûr de ne pas perdre de l'information
+        return int(Parametres_a_modifier.zoom_resolutions[zoom] * 90 / 100)
+
+    def zoom_levels(self, zoom):
+        return f"{self.zoom_min}-{zoom}"
+
+    def zoom_max_apercu(self, zoom):
+        # Niveaux dessinés directement à partir des positions en construction progressive, None sinon
+        if not self.mode_progressif:
+            return None
+        return min(self.zoom_apercu, zoom)
+
+    def Path_work(self, zoom):
+        nom = "Resolution_" + str(self.resolution(zoom)) + "m_per_pixel"
+        # Une carte restreinte à une emprise ne remplace pas la carte complète
+        if self.emprise is not None:
+            nom += "_" + "_".join(f"{v:g}" for v in self.emprise)
+        return os.path.join(self.PATH, self.name_tsv, nom)
+
+    def __repr__(self):
+        valeurs = ", ".join(f"{nom}={getattr(self, nom)!r}" for nom in self.noms)
+        return f"Configuration(reprise={self.reprise!r}, {valeurs})"
@@ -0,0 +1,92 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import numpy as np
+
+############################################################################################################
+
+## Couleurs des vitesses
+
+############################################################################################################
+
+# Dictionnaire pour stocker les correspondances vitesse -> couleur RGB
+color_map = {
+    0: [45, 255, 45],  # Speed 0
+    1: [43, 242, 56],  # Speed 1
+    2: [41, 230, 66],  # Speed 2
+    3: [38, 217, 77],  # Speed 3
+    4: [36, 204, 87],  # Speed 4
+    5: [34, 191, 98],  # Speed 5
+    6: [32, 179, 108],  # Speed 6
+    7: [29, 166, 119],  # Speed 7
+    8: [27, 153, 129],  # Speed 8
+    9: [25, 140, 140],  # Speed 9
+    10: [23, 128, 150],  # Speed 10
+    11: [20, 115, 161],  # Speed 11
+    12: [18, 102, 171],  # Speed 12
+    13: [16, 89, 182],  # Speed 13
+    14: [14, 77, 192],  # Speed 14
+    15: [11, 64, 203],  # Speed 15
+    16: [9, 51, 212],  # Speed 16
+    17: [6, 38, 224],  # Speed 17
+    18: [5, 26, 234],  # Speed 18
+    19: [2, 13, 245],  # Speed 19
+    20: [0, 0, 255],  # Speed 20
+}
+
+
+"""
+get_color_from_speed does retrun the color as a function of speed.
+:param speed: speed for a particular point
+:return: color for the point in [R,G,B] format  
+"""
+
+
+def get_color_from_speed(speed):
+    if speed < 0:
+        raise ValueError("Vitesse doit être un nombre positif")
+
+    # Si la vitesse est supérieure à 20, on utilise la couleur associée à 20
+    if speed > 20:
+        speed = 20
+
+    # On cherche la couleur correspondante dans le dictionnaire
+    return color_map[int(speed)] + [255]  # Ajoute l'alpha pour RGBA (255 pour opaque)
+
+
+# Table de correspondance vitesse entière -> couleur RGBA, pour colorer des tableaux de vitesses d'un seul coup
+color_lut = np.array(
+    [color_map[speed] + [255] for speed in range(len(color_map))], dtype=np.uint8
+)
+
+
+"""
+reduction_max halves the size of a RGBA array, keeping in each 2x2 block the pixel with the fastest speed (strongest blue component).
+:param bloc: RGBA array (height, width, 4), height and width being even
+:return: RGBA array (height / 2, width / 2, 4)
+"""
+
+
+def reduction_max(bloc):
+    height, width = bloc.shape[:2]
+    candidats = (
+        bloc.reshape(height // 2, 2, width // 2, 2, 4)
+        .transpose(0, 2, 1, 3, 4)
+        .reshape(height // 2, width // 2, 4, 4)
+    )
+    indice = candidats[..., 2].argmax(axis=2)
+    return np.take_along_axis(candidats, indice[..., None, None], axis=2)[:, :, 0, :]
@@ -0,0 +1,284 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import io
+import os
+import queue
+import threading
+import time
+from multiprocessing import util
+
+from Index_tuiles import empreinte, contenu_inchange, noter_ecriture
+from Parametres_a_modifier import nb_threads_ecriture, taille_file_ecriture
+from Trace import mesure
+
+############################################################################################################
+
+## Ecriture des tuiles en arrière-plan
+
+############################################################################################################
+
+# Les processus de calcul confient les tableaux terminés à des threads d'écriture (encodage + écriture disque) et passent à la tuile suivante.
+# La file est bornée : quand elle est pleine, le processus de calcul attend, ce qui borne la mémoire occupée par les tuiles en attente.
+
+
+"""
+TileWriter writes files in background threads through a bounded queue.
+:param nb_threads: number of writing threads
+:param taille_file: maximum number of files waiting to be written
+"""
+
+
+class TileWriter:
+    def __init__(self, nb_threads, taille_file):
+        self.file = queue.Queue(maxsize=taille_file)
+        self.verrou = threading.Lock()
+        # Ecritures en cours par chemin, pour pouvoir relire un fichier après l'avoir fait écrire
+        self.en_cours = {}
+        # Ecritures échouées (chemin, exception), signalées au processus de calcul par verifier
+        self.erreurs = []
+
+        self.nb_fichiers = 0
+        self.nb_inchanges = 0
+        self.nb_octets = 0
+        self.temps_ecriture = 0.0
+        self.temps_attente = 0.0
+        self.profondeur_max = 0
+        self.somme_profondeur = 0
+        self.debut = time.time()
+
+        self.threads = [
+            threading.Thread(target=self.boucle, daemon=True) for _ in range(nb_threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def soumettre(self, chemin, ecrire, *args):
+        # ecrire(chemin, *args) encode et écrit le fichier dans un thread d'écriture
+        with self.verrou:
+            precedent = self.en_cours.get(chemin)
+            fini = threading.Event()
+            self.en_cours[chemin] = fini
+        profondeur = self.file.qsize()
+        self.profondeur_max = max(self.profondeur_max, profondeur)
+        self.somme_profondeur += profondeur
+
+        debut = time.time()
+        self.file.put((chemin, ecrire, args, precedent, fini))
+        self.temps_attente += time.time() - debut
+
+    def boucle(self):
+        while True:
+            element = self.file.get()
+            if element is None:
+                return
+            chemin, ecrire, args, precedent, fini = element
+            # Deux écritures d'un même fichier se font dans l'ordre de soumission
+            if precedent is not None:
+                precedent.wait()
+            debut = time.time()
+            with mesure(os.path.basename(chemin), "ecriture", chemin=str(chemin)) as infos:
+                # Une fonction d'écriture qui rend False n'a pas touché au fichier (contenu identique, voir Index_tuiles)
+                inchange = False
+                try:
+                    inchange = ecrire(chemin, *args) is False
+                    taille = 0 if inchange else os.path.getsize(chemin)
+                except Exception as e:
+                    print(f"Erreur lors de l'enregistrement de {chemin} : {str(e)}")
+                    taille = 0
+                    with self.verrou:
+                        self.erreurs.append((chemin, e))
+                infos["octets"] = taille
+                infos["inchange"] = inchange
+            with self.verrou:
+                self.nb_fichiers += 1
+                self.nb_inchanges += inchange
+                self.nb_octets += taille
+                self.temps_ecriture += time.time() - debut
+                if self.en_cours.get(chemin) is fini:
+                    del self.en_cours[chemin]
+            fini.set()
+
+    def attendre(self, chemin):
+        # Attendre la fin de l'écriture d'un fichier avant de le relire
+        with self.verrou:
+            fini = self.en_cours.get(chemin)
+        if fini is not None:
+            fini.wait()
+        self.verifier()
+
+    def vider(self):
+        # Attendre la fin de toutes les écritures soumises
+        with self.verrou:
+            en_cours = list(self.en_cours.values())
+        for fini in en_cours:
+            fini.wait()
+        self.verifier()
+
+    def verifier(self):
+        # Une écriture échouée fait échouer l'étape qui l'a soumise : les erreurs ne sont signalées qu'une fois
+        with self.verrou:
+            erreurs, self.erreurs = self.erreurs, []
+        if erreurs:
+            chemin, e = erreurs[0]
+            raise RuntimeError(
+                f"{len(erreurs)} fichiers n'ont pas pu être écrits, dont {chemin} : {str(e)}"
+            ) from e
+
+    def fermer(self):
+        for _ in self.threads:
+            self.file.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.nb_fichiers:
+            self.rapport()
+        self.verifier()
+
+    def rapport(self):
+        duree = time.time() - self.debut
+        mega_octets = self.nb_octets / 1e6
+        print(
+            f"Ecriture en arrière-plan (processus {os.getpid()}) : {self.nb_fichiers} fichiers dont {self.nb_inchanges} inchangés, {mega_octets:.1f} Mo, "
+            f"débit {mega_octets / max(self.temps_ecriture, 1e-9) * len(self.threads):.1f} Mo/s, "
+            f"profondeur de file moyenne {self.somme_profondeur / self.nb_fichiers:.1f} (max {self.profondeur_max}), "
+            f"attente des processus de calcul {self.temps_attente:.1f} s sur {duree:.1f} s"
+        )
+
+
+# Un seul TileWriter par processus, créé à la première écriture
+_writer = None
+_writer_pid = None
+
+
+"""
+writer_processus gives the TileWriter of the current process, created on first use.
+The writer is closed (pending writes flushed) when the process exits normally, so pools must be closed with close() and join() rather than terminate().
+A failed write is raised by the next vider_ecritures (or attendre) of the process.
+:return: the TileWriter of the process
+"""
+
+
+def writer_processus():
+    global _writer, _writer_pid
+    # Après un fork, le TileWriter du processus parent n'a plus de threads dans le processus fils
+    if _writer is None or _writer_pid != os.getpid():
+        _writer = TileWriter(nb_threads_ecriture, taille_file_ecriture)
+        _writer_pid = os.getpid()
+        util.Finalize(_writer, _writer.fermer, exitpriority=10)
+    return _writer
+
+
+"""
+vider_ecritures waits until every file submitted by the current process is written.
+Raises RuntimeError if some of them could not be written.
+"""
+
+
+def vider_ecritures():
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.vider()
+
+
+###########################################################
+## Fonctions d'écriture ##
+###########################################################
+
+# Chaque fonction écrit dans un fichier temporaire renommé une fois complet, un fichier présent sous son nom final est donc entier.
+# Les bibliothèques d'encodage ne sont importées qu'à la première écriture qui en a besoin.
+# Les tuiles publiées sont écrites avec le dossier publié qui les contient (racine) : elles ne sont réécrites que si leur contenu change.
+
+
+"""
+remplacer writes bytes already encoded, unless the published file already holds them.
+:param chemin: path of the file
+:param donnees: bytes to write
+:param racine: published directory whose index is kept (see Index_tuiles), None to always write
+:return: False if the file was left untouched
+"""
+
+
+def remplacer(chemin, donnees, racine=None):
+    if racine is not None:
+        valeur = empreinte(donnees)
+        if contenu_inchange(racine, chemin, valeur):
+            return False
+    temp_path = str(chemin) + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(donnees)
+    os.replace(temp_path, chemin)
+    if racine is not None:
+        noter_ecriture(racine, chemin, valeur)
+    return True
+
+
+"""
+ecrire_geotiff encodes and writes a RGBA raster as a GeoTIFF.
+:param chemin: path of the file
+:param raster_data: RGBA array (height, width, 4)
+:param transform: affine transform of the raster
+"""
+
+
+def ecrire_geotiff(chemin, raster_data, transform):
+    import rasterio
+
+    temp_path = chemin + ".tmp"
+    height, width = raster_data.shape[:2]
+    with rasterio.open(
+        temp_path,
+        "w",
+        driver="GTiff",
+        height=height,
+        width=width,
+        count=4,
+        dtype=rasterio.uint8,
+        crs="EPSG:3857",
+        transform=transform,
+    ) as dst:
+        dst.write(raster_data.transpose(2, 0, 1))  # Transposer les dimensions pour RGBA
+    os.replace(temp_path, chemin)
+
+
+"""
+ecrire_png encodes and writes a RGBA array as a PNG image.
+:param chemin: path of the file
+:param image: RGBA array (height, width, 4)
+:param racine: published directory whose index is kept (see Index_tuiles), None to always write
+:return: False if the file was left untouched
+"""
+
+
+def ecrire_png(chemin, image, racine=None):
+    from PIL import Image
+
+    # Encodage en mémoire : le contenu est comparé à l'index avant d'être écrit
+    tampon = io.BytesIO()
+    Image.fromarray(image, mode="RGBA").save(tampon, format="PNG")
+    return remplacer(chemin, tampon.getvalue(), racine)
+
+
+"""
+ecrire_octets writes bytes already encoded (copy of a file read beforehand).
+:param chemin: path of the file
+:param donnees: bytes to write
+:param racine: published directory whose index is kept (see Index_tuiles), None to always write
+:return: False if the file was left untouched
+"""
+
+
+def ecrire_octets(chemin, donnees, racine=None):
+    return remplacer(chemin, donnees, racine)
@@ -0,0 +1,121 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+import time
+from multiprocessing import Barrier, Pool
+
+from Ecriture_asynchrone import vider_ecritures
+
+############################################################################################################
+
+## Exécution des tâches sur un pool de processus
+
+############################################################################################################
+
+
+"""
+tache_chronometree calls a function and measures its duration in the process of the pool.
+:param tache: (function, arguments of the function, True to wait until the files submitted to the writer are written)
+:return: (process id, duration in seconds, result of the function)
+"""
+
+
+def tache_chronometree(tache):
+    fonction, arguments, vider = tache
+    debut = time.time()
+    resultat = fonction(*arguments)
+    if vider:
+        vider_ecritures()
+    return os.getpid(), time.time() - debut, resultat
+
+
+# Barrière partagée par les processus d'un pool créé par executer_pool
+_barriere = None
+
+
+def _initialiser(barriere):
+    global _barriere
+    _barriere = barriere
+
+
+"""
+fin_ecritures waits until the files submitted by the current process of the pool are written.
+Every process waits at the barrier first, so that each of them gets exactly one of these tasks.
+:param _: index of the process (unused)
+"""
+
+
+def fin_ecritures(_):
+    _barriere.wait()
+    vider_ecritures()
+
+
+"""
+rapport_equilibrage prints the balance of the work between the processes of a pool.
+:param nom: name of the stage
+:param durees: list of (process id, duration, result) of every task
+"""
+
+
+def rapport_equilibrage(nom, durees):
+    occupation = {}
+    for pid, duree, _ in durees:
+        occupation[pid] = occupation.get(pid, 0) + duree
+    if not occupation:
+        return
+    maximum = max(occupation.values())
+    moyenne = sum(occupation.values()) / len(occupation)
+    print(
+        f"Equilibrage {nom} : {len(durees)} tâches sur {len(occupation)} processus, occupation de {min(occupation.values()):.2f} s à {maximum:.2f} s (max / moyenne = {maximum / max(moyenne, 1e-9):.2f})"
+    )
+
+
+"""
+executer_pool executes a function on every set of arguments with a pool of processes.
+The tasks are given one by one to the first idle process, in the order of the list: the most expensive tasks must come first.
+:param fonction: function to execute
+:param arguments: list of the sets of arguments, sorted by decreasing cost
+:param pool: pool of processes to reuse (see render), None to create one for this call
+:param chunksize: number of tasks given at once to a process (1 for tasks of very different costs)
+:param nom: name of the stage in the balance report, None for no report
+:return: list of the results of the function, in any order
+"""
+
+
+def executer_pool(fonction, arguments, pool=None, chunksize=1, nom=None):
+    # Les processus d'un pool réutilisé ne se terminent pas : chaque tâche attend la fin de ses écritures avant de rendre la main
+    taches = [(fonction, args, pool is not None) for args in arguments]
+    if pool is None:
+        nb_processus = os.cpu_count()
+        barriere = Barrier(nb_processus)
+        with Pool(nb_processus, initializer=_initialiser, initargs=(barriere,)) as pool:
+            durees = list(
+                pool.imap_unordered(tache_chronometree, taches, chunksize=chunksize)
+            )
+            # Chaque processus attend ses écritures en arrière-plan : une écriture échouée fait échouer l'étape
+            pool.map(fin_ecritures, range(nb_processus), chunksize=1)
+            # close + join (et non terminate) pour que les processus finissent leurs écritures en arrière-plan
+            pool.close()
+            pool.join()
+    else:
+        durees = list(
+            pool.imap_unordered(tache_chronometree, taches, chunksize=chunksize)
+        )
+    if nom is not None:
+        rapport_equilibrage(nom, durees)
+    return [resultat for _, _, resultat in durees]
@@ -0,0 +1,333 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+############################################################################################################
+
+## File de tâches partagée pour le calcul distribué
+
+############################################################################################################
+
+# La file est un dossier sur un système de fichiers partagé entre les machines :
+#   - pending/ : tâches en attente d'un processus de calcul
+#   - leased/  : tâches réservées par un processus, dont le bail est prolongé par des battements (date de modification du fichier)
+#   - done/    : tâches terminées
+#   - failed/  : tâches abandonnées après trop d'essais
+# Le passage d'un dossier à l'autre se fait par os.rename, qui est atomique : une tâche ne peut être réservée que par un seul processus.
+
+etats = ["pending", "leased", "done", "failed"]
+
+
+"""
+prepare_file prepares the directories of a work queue.
+:param dossier_file: path to the work queue directory
+"""
+
+
+def prepare_file(dossier_file):
+    for etat in etats:
+        os.makedirs(os.path.join(dossier_file, etat), exist_ok=True)
+    stop = os.path.join(dossier_file, "stop")
+    if os.path.exists(stop):
+        os.remove(stop)
+
+
+"""
+ecrire_tache writes a task file atomically.
+:param chemin: path to the task file
+:param tache: task as a dictionary
+"""
+
+
+def ecrire_tache(chemin, tache):
+    temp_path = f"{chemin}.{socket.gethostname()}_{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(tache, f)
+    os.replace(temp_path, chemin)
+
+
+"""
+publier_tache publishes a task in the work queue.
+:param dossier_file: path to the work queue directory
+:param nom: unique name of the task
+:param fonction: name of the function to execute (see taches_disponibles)
+:param arguments: list of the arguments of the function, must be serializable in JSON
+"""
+
+
+def publier_tache(dossier_file, nom, fonction, arguments):
+    tache = {"nom": nom, "fonction": fonction, "arguments": arguments, "essais": 0}
+    # Une tâche du même nom d'une exécution précédente ne doit pas être prise pour terminée
+    for etat in ["done", "failed"]:
+        ancienne = os.path.join(dossier_file, etat, f"{nom}.json")
+        if os.path.exists(ancienne):
+            os.remove(ancienne)
+    ecrire_tache(os.path.join(dossier_file, "pending", f"{nom}.json"), tache)
+
+
+"""
+reserver_tache takes a lease on the first pending task of the work queue.
+:param dossier_file: path to the work queue directory
+:param travailleur: name of the worker taking the lease
+:return: (path of the leased task file, task) or None if no task is pending
+"""
+
+
+def reserver_tache(dossier_file, travailleur):
+    pending = os.path.join(dossier_file, "pending")
+    for nom_fichier in sorted(os.listdir(pending)):
+        if not nom_fichier.endswith(".json"):
+            continue
+        chemin = os.path.join(dossier_file, "leased", nom_fichier)
+        try:
+            os.rename(os.path.join(pending, nom_fichier), chemin)
+        except FileNotFoundError:
+            # Un autre processus a réservé cette tâche avant nous
+            continue
+        # os.rename garde la date de publication : sans cela le bail paraîtrait déjà expiré aux autres processus
+        os.utime(chemin, None)
+        with open(chemin, "r", encoding="utf-8") as f:
+            tache = json.load(f)
+        tache["travailleur"] = travailleur
+        ecrire_tache(chemin, tache)
+        return chemin, tache
+    return None
+
+
+"""
+Battement is a thread renewing the lease of a task while it is executed.
+:param chemin: path of the leased task file
+:param intervalle: time in seconds between two heartbeats
+"""
+
+
+class Battement(threading.Thread):
+    def __init__(self, chemin, intervalle):
+        super().__init__(daemon=True)
+        self.chemin = chemin
+        self.intervalle = intervalle
+        self.arret = threading.Event()
+
+    def run(self):
+        while not self.arret.wait(self.intervalle):
+            try:
+                os.utime(self.chemin, None)
+            except FileNotFoundError:
+                # Le bail a expiré et la tâche a été remise dans la file
+                return
+
+    def stop(self):
+        self.arret.set()
+        self.join()
+
+
+"""
+terminer_tache moves a leased task to the done directory.
+:param dossier_file: path to the work queue directory
+:param chemin: path of the leased task file
+"""
+
+
+def terminer_tache(dossier_file, chemin):
+    try:
+        os.rename(chemin, os.path.join(dossier_file, "done", os.path.basename(chemin)))
+    except FileNotFoundError:
+        # Bail expiré pendant le calcul : la tâche a été reprise par un autre processus (les tâches sont idempotentes)
+        pass
+
+
+"""
+relancer_tache puts a leased task back in the pending directory, or in the failed directory after too many tries.
+:param dossier_file: path to the work queue directory
+:param chemin: path of the leased task file
+:param nb_essais_max: maximum number of tries of a task
+"""
+
+
+def relancer_tache(dossier_file, chemin, nb_essais_max):
+    try:
+        with open(chemin, "r", encoding="utf-8") as f:
+            tache = json.load(f)
+    except FileNotFoundError:
+        return
+    tache["essais"] += 1
+    tache.pop("travailleur", None)
+    ecrire_tache(chemin, tache)
+
+    etat = "pending" if tache["essais"] < nb_essais_max else "failed"
+    try:
+        os.rename(chemin, os.path.join(dossier_file, etat, os.path.basename(chemin)))
+    except FileNotFoundError:
+        pass
+
+
+"""
+recuperer_baux_expires puts back in the queue the tasks whose lease has not been renewed in time (dead worker).
+:param dossier_file: path to the work queue directory
+:param duree_bail: duration of a lease in seconds
+:param nb_essais_max: maximum number of tries of a task
+"""
+
+
+def recuperer_baux_expires(dossier_file, duree_bail, nb_essais_max):
+    leased = os.path.join(dossier_file, "leased")
+    maintenant = time.time()
+    for nom_fichier in os.listdir(leased):
+        if not nom_fichier.endswith(".json"):
+            continue
+        chemin = os.path.join(leased, nom_fichier)
+        try:
+            expire = maintenant - os.path.getmtime(chemin) > duree_bail
+        except FileNotFoundError:
+            continue
+        if expire:
+            print(f"Bail expiré pour la tâche {nom_fichier}, remise dans la file")
+            relancer_tache(dossier_file, chemin, nb_essais_max)
+
+
+"""
+executer_par_file publishes tasks in the work queue and waits for the workers to process them all.
+:param dossier_file: path to the work queue directory
+:param fonction: name of the function to execute (see taches_disponibles)
+:param taches: dictionary {name of the task: list of arguments}
+:param duree_bail: duration of a lease in seconds
+:param nb_essais_max: maximum number of tries of a task
+:param attente: time in seconds between two checks of the queue
+:return: list of the names of the failed tasks
+"""
+
+
+def executer_par_file(
+    dossier_file, fonction, taches, duree_bail, nb_essais_max, attente=2
+):
+    prepare_file(dossier_file)
+    for nom, arguments in taches.items():
+        publier_tache(dossier_file, nom, fonction, arguments)
+    print(f"{len(taches)} tâches {fonction} publiées dans la file {dossier_file}")
+
+    restantes = set(taches)
+    echecs = []
+    while restantes:
+        time.sleep(attente)
+        recuperer_baux_expires(dossier_file, duree_bail, nb_essais_max)
+        for nom in list(restantes):
+            if os.path.exists(os.path.join(dossier_file, "done", f"{nom}.json")):
+                restantes.discard(nom)
+            elif os.path.exists(os.path.join(dossier_file, "failed", f"{nom}.json")):
+                restantes.discard(nom)
+                echecs.append(nom)
+
+    if echecs:
+        print(f"{len(echecs)} tâches {fonction} ont échoué : {echecs}")
+    return echecs
+
+
+"""
+arreter_travailleurs asks every worker of the work queue to stop once idle.
+:param dossier_file: path to the work queue directory
+"""
+
+
+def arreter_travailleurs(dossier_file):
+    with open(os.path.join(dossier_file, "stop"), "w") as f:
+        f.write("stop")
+
+
+"""
+taches_disponibles gives the functions a worker can execute.
+:return: dictionary {name of the function: function}
+"""
+
+
+def taches_disponibles():
+    # Import tardif : le coordinateur n'a pas besoin des fonctions de calcul pour utiliser la file
+    from MAIN import create_subraster, process_tile_group
+
+    return {
+        "create_subraster": create_subraster,
+        "process_tile_group": process_tile_group,
+    }
+
+
+"""
+travailleur pulls tasks from the work queue and executes them until a stop file is found.
+:param dossier_file: path to the work queue directory
+:param duree_bail: duration of a lease in seconds
+:param nb_essais_max: maximum number of tries of a task
+:param attente: time in seconds to wait when the queue is empty
+:param fonctions: dictionary {name of the function: function} of the functions the worker can execute, None for taches_disponibles()
+"""
+
+
+def travailleur(dossier_file, duree_bail, nb_essais_max, attente=2, fonctions=None):
+    from Ecriture_asynchrone import vider_ecritures
+
+    fonctions = fonctions or taches_disponibles()
+    nom_travailleur = f"{socket.gethostname()}_{os.getpid()}"
+    for etat in etats:
+        os.makedirs(os.path.join(dossier_file, etat), exist_ok=True)
+    print(f"Processus de calcul {nom_travailleur} en attente de tâches dans {dossier_file}")
+
+    while True:
+        recuperer_baux_expires(dossier_file, duree_bail, nb_essais_max)
+        reservation = reserver_tache(dossier_file, nom_travailleur)
+        if reservation is None:
+            if os.path.exists(os.path.join(dossier_file, "stop")):
+                break
+            time.sleep(attente)
+            continue
+
+        chemin, tache = reservation
+        battement = Battement(chemin, duree_bail / 3)
+        battement.start()
+        try:
+            fonctions[tache["fonction"]](*tache["arguments"])
+        except Exception as e:
+            print(f"Erreur lors de l'exécution de la tâche {tache['nom']} : {str(e)}")
+            battement.stop()
+            relancer_tache(dossier_file, chemin, nb_essais_max)
+        else:
+            # La tâche n'est terminée qu'une fois ses fichiers écrits par les threads d'écriture
+            vider_ecritures()
+            battement.stop()
+            terminer_tache(dossier_file, chemin)
+
+    print(f"Processus de calcul {nom_travailleur} arrêté")
+
+
+############################################################################################################
+
+## MAIN
+
+############################################################################################################
+
+# Lancer un processus de calcul : python File_de_taches.py [dossier_file]
+# (plusieurs processus, sur une ou plusieurs machines, peuvent pointer vers le même dossier)
+if __name__ == "__main__":
+    from Parametres_a_modifier import dossier_file_taches, duree_bail, nb_essais_max
+
+    travailleur(
+        sys.argv[1] if len(sys.argv) > 1 else dossier_file_taches,
+        duree_bail,
+        nb_essais_max,
+    )
@@ -0,0 +1,468 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import io
+import json
+import os
+import queue
+import shutil
+import socket
+import sys
+import threading
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from Configuration import Configuration
+from Ecriture_asynchrone import ecrire_geotiff
+from Index_tuiles import consolider_index
+from Validation import valider_positions
+from Projection import projeter
+from MAIN import (
+    burn_speeds,
+    executer_pool,
+    liste_sous_dossiers,
+    modify_openlayers_file,
+    parallel_merge,
+    prepare_directory,
+    process_tile_group,
+)
+from Parametres_a_modifier import (
+    duree_lot_flux,
+    taille_lot_flux,
+    port_flux,
+    inactivite_max_flux,
+)
+
+############################################################################################################
+
+## Ingestion continue : mise à jour des tuiles au fil de l'arrivée des positions AIS
+
+############################################################################################################
+
+# Les positions arrivent par un fichier TSV auquel des lignes sont ajoutées (suivi comme "tail -f") ou par une connexion locale (socket),
+# avec les mêmes colonnes que le fichier de la base. Elles sont regroupées en lots (au plus duree_lot_flux secondes ou taille_lot_flux positions),
+# puis chaque lot est ajouté aux tuiles de base touchées en gardant la vitesse maximale, et seuls les niveaux de zoom de ces tuiles sont refaits.
+# Contrairement au traitement par lot, la grille des tuiles de base est alignée sur l'origine de WebMercator : elle ne dépend pas de l'étendue des données.
+# Les tuiles de base (.tif) sont gardées entre deux lots et d'une exécution à l'autre, dans le dossier tiles_producted de chaque catégorie.
+
+colonnes = ["datetime", "mmsi", "lat", "lon", "sog", "cog", "QO_category"]
+
+# Demi-côté de la projection WebMercator (EPSG:3857), en mètres
+origine = 20037508.342789244
+
+nom_etat = "flux_etat.json"
+nom_metriques = "flux_metriques.json"
+
+
+"""
+lire_fichier follows an append-only TSV file and puts every new complete line in a queue (thread).
+:param chemin: path of the TSV file
+:param file_lignes: queue receiving (reception time, line, position in the file after the line)
+:param position: position in the file where to start reading
+:param arret: event stopping the thread
+:param attente: time in seconds between two checks of the file
+"""
+
+
+def lire_fichier(chemin, file_lignes, position, arret, attente=0.5):
+    reste = b""
+    while not arret.is_set():
+        if not os.path.exists(chemin):
+            arret.wait(attente)
+            continue
+        with open(chemin, "rb") as f:
+            f.seek(position)
+            donnees = f.read()
+        if not donnees:
+            arret.wait(attente)
+            continue
+        # Position du début de la première ligne de ces données (reste compris)
+        position_ligne = position - len(reste)
+        position += len(donnees)
+        lignes = (reste + donnees).split(b"\n")
+        # La dernière ligne n'est peut-être pas encore entièrement écrite
+        reste = lignes.pop()
+        reception = time.time()
+        for ligne in lignes:
+            # Chaque ligne porte la position juste après elle : un lot peut s'arrêter au milieu des données lues
+            position_ligne += len(ligne) + 1
+            file_lignes.put((reception, ligne.decode("utf-8"), position_ligne))
+
+
+"""
+lire_socket receives lines from local connections and puts them in a queue (thread).
+:param port: port listened on the local address
+:param file_lignes: queue receiving (reception time, line, None)
+:param arret: event stopping the thread
+"""
+
+
+def lire_socket(port, file_lignes, arret):
+    serveur = socket.create_server(("127.0.0.1", port))
+    serveur.settimeout(0.5)
+
+    def connexion(client):
+        with client, client.makefile("r", encoding="utf-8") as lignes:
+            for ligne in lignes:
+                file_lignes.put((time.time(), ligne.rstrip("\n"), None))
+
+    print(f"En attente des positions AIS sur le port {port}")
+    with serveur:
+        while not arret.is_set():
+            try:
+                client, _ = serveur.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(target=connexion, args=(client,), daemon=True).start()
+
+
+"""
+lire_lot reads the lines of one micro-batch from the queue.
+:param file_lignes: queue of (reception time, line, position)
+:param duree_lot: maximum time in seconds between the first line of the batch and its processing
+:param taille_lot: maximum number of lines of the batch
+:param inactivite_max: time in seconds without any line after which None is returned, None to wait forever
+:return: list of (reception time, line, position), None after inactivite_max seconds without any line
+"""
+
+
+def lire_lot(file_lignes, duree_lot, taille_lot, inactivite_max):
+    try:
+        lot = [file_lignes.get(timeout=inactivite_max)]
+    except queue.Empty:
+        return None
+    fin = time.time() + duree_lot
+    while len(lot) < taille_lot:
+        reste = fin - time.time()
+        if reste <= 0:
+            break
+        try:
+            lot.append(file_lignes.get(timeout=reste))
+        except queue.Empty:
+            break
+    return lot
+
+
+"""
+positions_lot converts the lines of a batch into WebMercator positions.
+:param lignes: lines of the batch (TSV with the columns of the database, header lines are ignored)
+:param dossier_quarantaine: directory where the rejected lines are appended (see Validation), None to only drop them
+:return: pandas DataFrame with the columns lon, lat (WebMercator), speed and QO_category
+"""
+
+
+def positions_lot(lignes, dossier_quarantaine=None):
+    import pandas as pd
+
+    lignes = [ligne for ligne in lignes if ligne and not ligne.startswith(colonnes[0])]
+    data = pd.read_csv(
+        io.StringIO("\n".join(lignes)),
+        sep="\t",
+        names=colonnes,
+        on_bad_lines="skip",
+    )
+    # Les lignes illisibles ou hors de la projection sont écartées avant la projection
+    data = valider_positions(data, dossier_quarantaine, ajouter=True)
+    x, y = projeter(data["lat"].values, data["lon"].values)
+    return pd.DataFrame(
+        {
+            "lon": x,
+            "lat": y,
+            "speed": data["sog"].values,
+            "QO_category": data["QO_category"].astype(str).values,
+        }
+    )
+
+
+"""
+mettre_a_jour_tuiles draws the positions of a batch in the base tiles of a category, keeping the maximum speed on each pixel.
+:param data: positions of the category (see positions_lot)
+:param tiles_producted_directory: path to the base tiles of the category
+:param resolution: resolution of the base tiles
+:param pixels: number of pixels on each side of a base tile
+:return: list of the names of the modified base tiles
+"""
+
+
+def mettre_a_jour_tuiles(data, tiles_producted_directory, resolution, pixels):
+    import rasterio
+    from rasterio.transform import from_origin
+
+    tile_size = resolution * pixels
+    x = data["lon"].values
+    y = data["lat"].values
+    i = np.floor((x + origine) / tile_size).astype(np.int64)
+    j = np.floor((y + origine) / tile_size).astype(np.int64)
+
+    modifiees = []
+    for (ti, tj), indices in data.groupby([i, j]).indices.items():
+        min_x = -origine + ti * tile_size
+        max_y = -origine + (tj + 1) * tile_size
+        nom = f"{ti}_{tj}.tif"
+        chemin = os.path.join(tiles_producted_directory, nom)
+
+        if os.path.exists(chemin):
+            with rasterio.open(chemin) as src:
+                raster_data = src.read().transpose(1, 2, 0).copy()
+        else:
+            raster_data = np.zeros((pixels, pixels, 4), dtype=np.uint8)
+
+        rows = ((max_y - y[indices]) // resolution).astype(np.int64)
+        cols = ((x[indices] - min_x) // resolution).astype(np.int64)
+        burn_speeds(raster_data, rows, cols, data["speed"].values[indices])
+        # Ecriture immédiate : gdal2tiles relit la tuile juste après
+        ecrire_geotiff(
+            chemin, raster_data, from_origin(min_x, max_y, resolution, resolution)
+        )
+        modifiees.append(nom)
+    return modifiees
+
+
+"""
+mettre_a_jour_zooms re-renders the zoom levels of the modified base tiles and merges them in the category directory.
+:param noms: names of the modified base tiles
+:param tiles_producted_directory: path to the base tiles of the category
+:param categorie_directory: path to the category directory
+:param zoom_levels: zoom levels to create
+:param pool: pool of processes to reuse
+"""
+
+
+def mettre_a_jour_zooms(
+    noms, tiles_producted_directory, categorie_directory, zoom_levels, pool
+):
+    Gdal_directory = os.path.join(categorie_directory, "processGdal")
+    prepare_directory(Gdal_directory)
+    executer_pool(
+        process_tile_group,
+        [([nom], tiles_producted_directory, Gdal_directory, zoom_levels) for nom in noms],
+        pool,
+    )
+    dossiers = [os.path.join(Gdal_directory, nom) for nom in liste_sous_dossiers(Gdal_directory)]
+    # Seules les tuiles touchées par le lot sont refaites : les tuiles PNG existantes sont fusionnées avec les nouvelles en gardant la vitesse maximale
+    parallel_merge(dossiers, categorie_directory, pool, garder_existant=True)
+
+    # Page de visualisation, à la première mise à jour de la catégorie
+    if not os.path.exists(os.path.join(categorie_directory, "openlayers.html")):
+        for dossier in dossiers:
+            source = os.path.join(dossier, "openlayers.html")
+            if os.path.exists(source):
+                shutil.copy2(source, categorie_directory)
+                modify_openlayers_file(categorie_directory, int(zoom_levels.split("-")[1]))
+                break
+    shutil.rmtree(Gdal_directory)
+
+
+"""
+enregistrer_json writes a JSON file atomically.
+:param chemin: path of the file
+:param contenu: content of the file
+"""
+
+
+def enregistrer_json(chemin, contenu):
+    temp_path = chemin + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(contenu, f, indent=1)
+    os.replace(temp_path, chemin)
+
+
+"""
+flux processes the AIS positions as they arrive, by micro-batches, until it is stopped (Ctrl+C) or no position arrives for inactivite_max seconds.
+:param config: configuration (PATH, max_zoom and pixels are used)
+:param fichier: path of the append-only TSV file to follow, None to listen on a local port
+:param port: local port to listen on if fichier is None
+:param duree_lot: maximum time in seconds between the reception of a position and its processing
+:param taille_lot: maximum number of positions of a batch
+:param inactivite_max: time in seconds without any position after which the processing stops, None to never stop
+:return: dictionary of the metrics of the run
+"""
+
+
+def flux(
+    config,
+    fichier=None,
+    port=port_flux,
+    duree_lot=duree_lot_flux,
+    taille_lot=taille_lot_flux,
+    inactivite_max=inactivite_max_flux,
+):
+    resolution = config.resolution(config.max_zoom)
+    zoom_levels = f"0-{config.max_zoom}"
+    Path_work = os.path.join(
+        config.PATH, "flux", "Resolution_" + str(resolution) + "m_per_pixel"
+    )
+    os.makedirs(Path_work, exist_ok=True)
+
+    # Position de lecture du fichier enregistrée après chaque lot : un redémarrage reprend après le dernier lot traité
+    chemin_etat = os.path.join(Path_work, nom_etat)
+    etat = {"fichier": fichier, "position": 0}
+    if fichier is not None and os.path.exists(chemin_etat):
+        with open(chemin_etat, "r", encoding="utf-8") as f:
+            etat_precedent = json.load(f)
+        if etat_precedent.get("fichier") == fichier:
+            etat = etat_precedent
+
+    file_lignes = queue.Queue()
+    arret = threading.Event()
+    if fichier is not None:
+        lecteur = threading.Thread(
+            target=lire_fichier,
+            args=(fichier, file_lignes, etat["position"], arret),
+            daemon=True,
+        )
+    else:
+        lecteur = threading.Thread(
+            target=lire_socket, args=(port, file_lignes, arret), daemon=True
+        )
+    lecteur.start()
+
+    metriques = {"lots": 0, "points": 0, "tuiles_modifiees": 0, "tuiles_png_ecrites": 0}
+    debut_flux = time.time()
+    # Processus de calcul gardés d'un lot à l'autre
+    with Pool() as pool:
+        try:
+            while True:
+                lot = lire_lot(file_lignes, duree_lot, taille_lot, inactivite_max)
+                if lot is None:
+                    print(f"Aucune position depuis {inactivite_max} s, arrêt")
+                    break
+
+                debut = time.time()
+                data = positions_lot(
+                    [ligne for _, ligne, _ in lot], Path_work
+                )
+                nb_tuiles = 0
+                nb_png = 0
+                for categorie in list(data["QO_category"].unique()) + ["All"]:
+                    if categorie == "All":
+                        data_cat = data
+                    else:
+                        data_cat = data[data["QO_category"].values == categorie]
+                    categorie_directory = os.path.join(Path_work, categorie)
+                    tiles_producted_directory = os.path.join(
+                        categorie_directory, "tiles_producted"
+                    )
+                    os.makedirs(tiles_producted_directory, exist_ok=True)
+                    noms = mettre_a_jour_tuiles(
+                        data_cat, tiles_producted_directory, resolution, config.pixels
+                    )
+                    mettre_a_jour_zooms(
+                        noms,
+                        tiles_producted_directory,
+                        categorie_directory,
+                        zoom_levels,
+                        pool,
+                    )
+                    # Les tuiles PNG identiques ne sont pas réécrites, les autres sont ajoutées à tuiles_modifiees.txt pour la synchronisation
+                    nb_png += consolider_index(categorie_directory)
+                    nb_tuiles += len(noms)
+                fin = time.time()
+
+                if fichier is not None:
+                    etat["position"] = lot[-1][2]
+                    enregistrer_json(chemin_etat, etat)
+
+                # Latence : de la réception de la plus ancienne position du lot à la fin de la mise à jour des tuiles
+                metriques["lots"] += 1
+                metriques["points"] += data.shape[0]
+                metriques["tuiles_modifiees"] += nb_tuiles
+                metriques["tuiles_png_ecrites"] += nb_png
+                metriques["derniere_latence_s"] = fin - min(r for r, _, _ in lot)
+                metriques["dernier_debit_points_s"] = data.shape[0] / max(fin - debut, 1e-9)
+                metriques["debit_moyen_points_s"] = metriques["points"] / max(
+                    fin - debut_flux, 1e-9
+                )
+                metriques["date"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                enregistrer_json(os.path.join(Path_work, nom_metriques), metriques)
+                print(
+                    f"Lot {metriques['lots']} : {data.shape[0]} positions, {nb_tuiles} tuiles de base mises à jour, {nb_png} tuiles PNG écrites, "
+                    f"latence {metriques['derniere_latence_s']:.1f} s, {metriques['dernier_debit_points_s']:.0f} positions/s"
+                )
+        except KeyboardInterrupt:
+            print("Arrêt demandé")
+        finally:
+            arret.set()
+    return metriques
+
+
+"""
+rejouer replays a recorded TSV file as a live stream, by appending its lines to a file or sending them to a local port at a given rate.
+:param enregistrement: path of the recorded TSV file
+:param cible: path of the append-only TSV file, or port number
+:param lignes_par_seconde: rate of the replay
+"""
+
+
+def rejouer(enregistrement, cible, lignes_par_seconde=1000):
+    if isinstance(cible, int):
+        sortie = socket.create_connection(("127.0.0.1", cible)).makefile(
+            "w", encoding="utf-8"
+        )
+    else:
+        nouveau = not os.path.exists(cible)
+        sortie = open(cible, "a", encoding="utf-8")
+        if nouveau:
+            sortie.write("\t".join(colonnes) + "\n")
+
+    # Envoi par paquets de 1/10 de seconde
+    paquet = max(int(lignes_par_seconde / 10), 1)
+    debut = time.time()
+    nb_lignes = 0
+    with sortie, open(enregistrement, "r", encoding="utf-8") as source:
+        for ligne in source:
+            if ligne.startswith(colonnes[0]):
+                continue
+            sortie.write(ligne)
+            nb_lignes += 1
+            if nb_lignes % paquet == 0:
+                sortie.flush()
+                attente = debut + nb_lignes / lignes_par_seconde - time.time()
+                if attente > 0:
+                    time.sleep(attente)
+    print(f"{nb_lignes} lignes rejouées en {time.time() - debut:.1f} s")
+
+
+############################################################################################################
+
+## MAIN
+
+############################################################################################################
+
+# python Flux_continu.py fichier positions.tsv : suit le fichier positions.tsv
+# python Flux_continu.py socket [port] : reçoit les positions sur un port local
+# python Flux_continu.py rejouer enregistrement.tsv positions.tsv|port [lignes_par_seconde] : rejoue un fichier enregistré pour tester
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ["fichier", "socket", "rejouer"]:
+        print(
+            "Usage : python Flux_continu.py fichier positions.tsv | socket [port] | rejouer enregistrement.tsv positions.tsv|port [lignes_par_seconde]"
+        )
+        sys.exit(1)
+
+    if sys.argv[1] == "fichier":
+        flux(Configuration(), fichier=sys.argv[2])
+    elif sys.argv[1] == "socket":
+        flux(Configuration(), port=int(sys.argv[2]) if len(sys.argv) > 2 else port_flux)
+    else:
+        cible = sys.argv[3]
+        rejouer(
+            sys.argv[2],
+            int(cible) if cible.isdigit() else cible,
+            float(sys.argv[4]) if len(sys.argv) > 4 else 1000,
+        )
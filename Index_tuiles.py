@@ -0,0 +1,181 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import hashlib
+import json
+import os
+import socket
+import threading
+
+############################################################################################################
+
+## Index des empreintes des tuiles publiées
+
+############################################################################################################
+
+# Chaque dossier publié (dossier d'une catégorie) garde l'empreinte du contenu de chacune de ses tuiles dans index_tuiles.json.
+# Avant d'écrire une tuile, son contenu encodé est comparé à l'index : une tuile identique n'est pas réécrite et garde sa date de modification.
+# Les processus de calcul ne modifient pas l'index : chacun note ses écritures dans son propre journal (dossier journal_index),
+# puis consolider_index les reporte dans l'index une fois les écritures terminées.
+# Les chemins des tuiles écrites ou supprimées sont ajoutés à tuiles_modifiees.txt, que la synchronisation vers le serveur web
+# consomme puis supprime (ex : rsync --files-from=tuiles_modifiees.txt --delete-missing-args).
+
+nom_index = "index_tuiles.json"
+nom_journaux = "journal_index"
+nom_modifiees = "tuiles_modifiees.txt"
+
+# Index relus par le processus, par dossier publié : {racine: (date de modification de l'index, {chemin relatif: empreinte})}
+_index = {}
+_verrou = threading.Lock()
+
+
+"""
+empreinte gives the hash of the content of a file.
+:param donnees: bytes of the file
+:return: hexadecimal hash
+"""
+
+
+def empreinte(donnees):
+    return hashlib.sha1(donnees).hexdigest()
+
+
+"""
+chemin_relatif gives the key of a file in the index of its published directory.
+:param racine: path to the published directory
+:param chemin: path of the file
+:return: path relative to racine, with / separators
+"""
+
+
+def chemin_relatif(racine, chemin):
+    return os.path.relpath(chemin, racine).replace(os.sep, "/")
+
+
+def _index_processus(racine):
+    # L'index est relu quand il a été consolidé depuis la dernière lecture (pool réutilisé d'une exécution ou d'un lot à l'autre)
+    chemin = os.path.join(racine, nom_index)
+    date = os.stat(chemin).st_mtime_ns if os.path.exists(chemin) else None
+    if racine not in _index or _index[racine][0] != date:
+        contenu = {}
+        if date is not None:
+            with open(chemin, "r", encoding="utf-8") as f:
+                contenu = json.load(f)
+        _index[racine] = (date, contenu)
+    return _index[racine][1]
+
+
+"""
+contenu_inchange tells if a file already holds the given content, according to the index of its published directory.
+:param racine: path to the published directory
+:param chemin: path of the file
+:param valeur: hash of the new content (see empreinte)
+:return: True if the file exists with the same content
+"""
+
+
+def contenu_inchange(racine, chemin, valeur):
+    with _verrou:
+        connue = _index_processus(racine).get(chemin_relatif(racine, chemin))
+    return connue == valeur and os.path.exists(chemin)
+
+
+"""
+noter_ecriture records in the journal of the process that a file of a published directory was written or removed.
+:param racine: path to the published directory
+:param chemin: path of the file
+:param valeur: hash of the content written, None if the file was removed
+"""
+
+
+def noter_ecriture(racine, chemin, valeur):
+    relatif = chemin_relatif(racine, chemin)
+    dossier = os.path.join(racine, nom_journaux)
+    # Le nom de la machine distingue les processus de même pid en mode distribué
+    journal = os.path.join(dossier, f"{socket.gethostname()}_{os.getpid()}.txt")
+    with _verrou:
+        _index_processus(racine)[relatif] = valeur
+        os.makedirs(dossier, exist_ok=True)
+        with open(journal, "a", encoding="utf-8") as f:
+            f.write(f"{relatif}\t{valeur or ''}\n")
+
+
+"""
+supprimer_absents removes the files of a directory that were not written by the current run, and the empty directories.
+Must be called once the writes of the run are finished (see vider_ecritures).
+:param dossier: directory to clean
+:param gardes: paths of the files to keep
+:param racine: path to the published directory holding dossier
+"""
+
+
+def supprimer_absents(dossier, gardes, racine):
+    gardes = {os.path.normpath(chemin) for chemin in gardes}
+    for base, _, noms in os.walk(dossier, topdown=False):
+        for nom in noms:
+            chemin = os.path.normpath(os.path.join(base, nom))
+            if chemin not in gardes:
+                os.remove(chemin)
+                noter_ecriture(racine, chemin, None)
+        if not os.listdir(base):
+            os.rmdir(base)
+
+
+"""
+consolider_index merges the journals of every process into the index of a published directory and adds the written or removed files to the changed-tiles list.
+Must be called once every process has finished its writes.
+:param racine: path to the published directory
+:return: number of files written or removed since the last consolidation
+"""
+
+
+def consolider_index(racine):
+    dossier = os.path.join(racine, nom_journaux)
+    if not os.path.isdir(dossier):
+        return 0
+
+    chemin_index = os.path.join(racine, nom_index)
+    index = {}
+    if os.path.exists(chemin_index):
+        with open(chemin_index, "r", encoding="utf-8") as f:
+            index = json.load(f)
+
+    journaux = [os.path.join(dossier, nom) for nom in os.listdir(dossier)]
+    modifiees = set()
+    for journal in journaux:
+        with open(journal, "r", encoding="utf-8") as f:
+            for ligne in f:
+                relatif, _, valeur = ligne.rstrip("\n").partition("\t")
+                if valeur:
+                    index[relatif] = valeur
+                else:
+                    index.pop(relatif, None)
+                modifiees.add(relatif)
+
+    # Ecriture atomique : les processus de calcul peuvent relire l'index pendant sa mise à jour
+    temp_path = chemin_index + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(temp_path, chemin_index)
+
+    # Ajout à la liste : les tuiles modifiées depuis la dernière synchronisation restent dans la liste
+    with open(os.path.join(racine, nom_modifiees), "a", encoding="utf-8") as f:
+        f.writelines(f"{relatif}\n" for relatif in sorted(modifiees))
+    for journal in journaux:
+        os.remove(journal)
+    os.rmdir(dossier)
+    return len(modifiees)
@@ -19,27 +19,36 @@ import numpy as np
 import time
 from multiprocessing import Pool
 import os
-import rasterio
-from rasterio.transform import from_origin
 import shutil
-import pandas as pd
-from PIL import Image
-from bs4 import BeautifulSoup
-import multiprocessing
 from pathlib import Path
 import sys
-from osgeo import gdal
-
-from Parametres_a_modifier import (
-    resolution_max,
-    Database_Name,
-    PATH,
-    pixels,
-    max_zoom,
-    name_tsv,
-    zoom_levels,
+import socket
+
+# Les bibliothèques lourdes (pandas, rasterio, PIL, bs4, osgeo) ne sont importées que dans les fonctions qui s'en servent :
+# un processus de calcul ou un service qui importe MAIN ne paye que ce qu'il utilise
+from Configuration import Configuration
+from Couleurs import color_map, get_color_from_speed, color_lut
+from Execution_pool import executer_pool
+from File_de_taches import executer_par_file, arreter_travailleurs
+from Ecriture_asynchrone import (
+    writer_processus,
+    vider_ecritures,
+    ecrire_geotiff,
+    ecrire_png,
+    ecrire_octets,
+)
+from Trace import activer_trace, desactiver_trace, exporter_trace, mesure
+from Index_tuiles import consolider_index, supprimer_absents
+from Stockage_tuiles import nom_stockage, tuile_presente, lire_tuile, couts_partition
+from Reprise import (
+    nouveau_manifeste,
+    charger_manifeste,
+    enregistrer_manifeste,
+    etape_terminee,
+    marquer_etape,
+    charger_tuiles,
+    supprimer_fichiers_partiels,
 )
-from Tri_CSV import tri_CSV
 
 ############################################################################################################
 
@@ -67,49 +76,107 @@ def prepare_directory(tiles_directory):
 ##        print(f"Dossier '{tiles_directory}' créé.")
 
 
-# Dictionnaire pour stocker les correspondances vitesse -> couleur RGB
-color_map = {
-    0: [45, 255, 45],  # Speed 0
-    1: [43, 242, 56],  # Speed 1
-    2: [41, 230, 66],  # Speed 2
-    3: [38, 217, 77],  # Speed 3
-    4: [36, 204, 87],  # Speed 4
-    5: [34, 191, 98],  # Speed 5
-    6: [32, 179, 108],  # Speed 6
-    7: [29, 166, 119],  # Speed 7
-    8: [27, 153, 129],  # Speed 8
-    9: [25, 140, 140],  # Speed 9
-    10: [23, 128, 150],  # Speed 10
-    11: [20, 115, 161],  # Speed 11
-    12: [18, 102, 171],  # Speed 12
-    13: [16, 89, 182],  # Speed 13
-    14: [14, 77, 192],  # Speed 14
-    15: [11, 64, 203],  # Speed 15
-    16: [9, 51, 212],  # Speed 16
-    17: [6, 38, 224],  # Speed 17
-    18: [5, 26, 234],  # Speed 18
-    19: [2, 13, 245],  # Speed 19
-    20: [0, 0, 255],  # Speed 20
-}
-
-
-"""
-get_color_from_speed does retrun the color as a function of speed.
-:param speed: speed for a particular point
-:return: color for the point in [R,G,B] format  
-"""
-
-
-def get_color_from_speed(speed):
-    if speed < 0:
+"""
+burn_speeds colours a set of pixels of a raster, keeping the fastest speed on each pixel.
+:param raster_data: RGBA array (height, width, 4) to fill
+:param rows: row index of each pixel
+:param cols: column index of each pixel
+:param speeds: speed for each pixel
+"""
+
+
+def burn_speeds(raster_data, rows, cols, speeds):
+    if np.any(speeds < 0):
         raise ValueError("Vitesse doit être un nombre positif")
 
-    # Si la vitesse est supérieure à 20, on utilise la couleur associée à 20
-    if speed > 20:
-        speed = 20
+    height, width = raster_data.shape[:2]
+    dans_tuile = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    rows = rows[dans_tuile]
+    cols = cols[dans_tuile]
+    speeds = np.minimum(speeds[dans_tuile], 20).astype(np.int8)
+
+    # Vitesse maximale par pixel (-1 : pas de bateau), en tenant compte de ce qui est déjà dessiné
+    deja = raster_data[..., 3].reshape(-1) > 0
+    vitesse_pixel = np.full(height * width, -1, dtype=np.int8)
+    # La composante bleue croît strictement avec la vitesse : elle permet de retrouver la vitesse d'un pixel
+    vitesse_pixel[deja] = np.searchsorted(
+        color_lut[:, 2], raster_data[..., 2].reshape(-1)[deja]
+    )
+    np.maximum.at(vitesse_pixel, rows * width + cols, speeds)
+
+    rempli = vitesse_pixel >= 0
+    raster_data.reshape(-1, 4)[rempli] = color_lut[vitesse_pixel[rempli]]
+
+
+"""
+rasterize_segments gives every pixel crossed by a set of segments, all segments being drawn at once.
+:param r0, c0: row and column of the first end of each segment
+:param r1, c1: row and column of the second end of each segment
+:return:
+    - rows, cols: row and column of each pixel drawn
+    - segment: index of the segment each pixel belongs to
+"""
+
+
+def rasterize_segments(r0, c0, r1, c1):
+    dr = r1 - r0
+    dc = c1 - c0
+    # Nombre de pixels de chaque segment (algorithme DDA : un pixel par pas sur l'axe principal)
+    longueur = np.maximum(np.abs(dr), np.abs(dc)) + 1
+
+    segment = np.repeat(np.arange(len(longueur)), longueur)
+    debut = np.cumsum(longueur) - longueur
+    pas = np.arange(longueur.sum()) - debut[segment]
+    fraction = pas / np.maximum(longueur - 1, 1)[segment]
+
+    rows = r0[segment] + np.rint(dr[segment] * fraction).astype(np.int64)
+    cols = c0[segment] + np.rint(dc[segment] * fraction).astype(np.int64)
+    return rows, cols, segment
+
+
+# Nombre maximal de pixels tracés en une fois, pour borner la mémoire des tuiles très chargées
+pixels_par_lot = 5_000_000
+
+
+"""
+burn_segments draws the segments of a tile on its raster.
+:param raster_data: RGBA array (height, width, 4) to fill
+:param df: segments of the tile (columns lon0, lat0, lon1, lat1, speed)
+:param min_x: minimum x of the tile
+:param max_y: maximum y of the tile
+:param resolution: resolution of the tile
+"""
+
+
+def burn_segments(raster_data, df, min_x, max_y, resolution):
+    r0 = ((max_y - df["lat0"].values) // resolution).astype(np.int64)
+    c0 = ((df["lon0"].values - min_x) // resolution).astype(np.int64)
+    r1 = ((max_y - df["lat1"].values) // resolution).astype(np.int64)
+    c1 = ((df["lon1"].values - min_x) // resolution).astype(np.int64)
+    burn_segments_pixels(raster_data, r0, c0, r1, c1, df["speed"].values)
+
 
-    # On cherche la couleur correspondante dans le dictionnaire
-    return color_map[int(speed)] + [255]  # Ajoute l'alpha pour RGBA (255 pour opaque)
+"""
+burn_segments_pixels draws segments given in pixels on a raster, the pixels outside of the raster being ignored.
+:param raster_data: RGBA array (height, width, 4) to fill
+:param r0, c0: row and column of the first end of each segment
+:param r1, c1: row and column of the second end of each segment
+:param speeds: speed of each segment
+"""
+
+
+def burn_segments_pixels(raster_data, r0, c0, r1, c1, speeds):
+    # Découpage en lots de segments dont le nombre total de pixels reste borné
+    longueur = np.maximum(np.abs(r1 - r0), np.abs(c1 - c0)) + 1
+    lot = np.cumsum(longueur) // pixels_par_lot
+    bornes = np.flatnonzero(np.diff(lot)) + 1
+    for debut, fin in zip(
+        np.concatenate([[0], bornes]), np.concatenate([bornes, [len(lot)]])
+    ):
+        rows, cols, segment = rasterize_segments(
+            r0[debut:fin], c0[debut:fin], r1[debut:fin], c1[debut:fin]
+        )
+        burn_speeds(raster_data, rows, cols, speeds[debut:fin][segment])
 
 
 """
@@ -117,26 +184,35 @@ create_subraster does create a .tif file (image) of a tile.
 :param key: coordinate on the tile map
 :param value: coordinate of the extreme points of the tile
 :param output_directory: path to the output
-:param tsv_directory: path to the .tsv file
+:param tsv_directory: path to the store of the tiles of the category (see Stockage_tuiles)
 :param resolution: resolution of the tile
+:param pixels: number of pixels on each side of the tile
+:param mode_trajectoire: True if the store holds segments instead of pixels
+:param hauteur_bande: number of rows drawn and written at once (see create_subraster_bandes), 0 to draw the whole tile in memory
 :return: false if a tif is not created
 """
 
 
-def create_subraster(key, values, output_directory, tsv_directory, resolution):
+def create_subraster(
+    key,
+    values,
+    output_directory,
+    tsv_directory,
+    resolution,
+    pixels,
+    mode_trajectoire,
+    hauteur_bande=0,
+):
+    from rasterio.transform import from_origin
 
     x, y = key
 
-    """Vérifie si un fichier CSV nommé '(x,y).csv' existe dans le dossier = si cette tuile contient des informations."""
     if not os.path.exists(tsv_directory):
         print(f"Le dossier {tsv_directory} n'existe pas.")
         return False
 
-    # Construire le nom du fichier cible
-    target_file = f"{x}_{y}.csv"
-
-    # Vérifier si le fichier existe, on crée le fichier.tif de la tuile
-    if target_file in os.listdir(tsv_directory):
+    # Vérifier dans l'index du stockage si la tuile contient des informations, on crée le fichier.tif de la tuile
+    if tuile_presente(tsv_directory, x, y):
 
         min_x = values[0]
         min_y = values[1]
@@ -146,6 +222,24 @@ def create_subraster(key, values, output_directory, tsv_directory, resolution):
         # Définir la transformation
         transform = from_origin(min_x, max_y, resolution, resolution)
 
+        # Déterminer le nom du fichier de la tuile
+        tile_filename = os.path.join(output_directory, f"{x}_{y}.tif")
+
+        if hauteur_bande:
+            with mesure(f"{x}_{y}", "rasterisation", tuile=[x, y]) as infos:
+                df = lire_tuile(tsv_directory, x, y)
+                infos["points"] = len(df)
+                create_subraster_bandes(
+                    df,
+                    tile_filename,
+                    transform,
+                    pixels,
+                    resolution,
+                    mode_trajectoire,
+                    hauteur_bande,
+                )
+            return
+
         # Déterminer la taille du raster pour la tuile
         width = pixels
         height = pixels
@@ -153,50 +247,103 @@ def create_subraster(key, values, output_directory, tsv_directory, resolution):
         # Créer un tableau pour la tuile (4 canaux pour RGBA)
         raster_data = np.zeros((height, width, 4), dtype=np.uint8)
 
-        tuile_path = os.path.join(tsv_directory, f"{x}_{y}.csv")
-
-        # Lire le fichier CSV
-        df = pd.read_csv(tuile_path)
+        with mesure(f"{x}_{y}", "rasterisation", tuile=[x, y]) as infos:
+            # Lire les lignes de la tuile (np.memmap : seules ces lignes sont lues)
+            df = lire_tuile(tsv_directory, x, y)
+            infos["points"] = len(df)
 
-        # Itérer sur les lignes du DataFrame
-        for index, row in df.iterrows():
+            if mode_trajectoire:
+                burn_segments(raster_data, df, min_x, max_y, resolution)
+            else:
+                # Une ligne par pixel occupé (rapports regroupés à l'ingestion), tous les pixels sont colorés d'un coup
+                rows = ((max_y - df["lat"].values) // resolution).astype(np.int64)
+                cols = ((df["lon"].values - min_x) // resolution).astype(np.int64)
+                burn_speeds(raster_data, rows, cols, df["speed"].values)
 
-            speed = row["speed"]
-            x_coord = row["lon"]
-            y_coord = row["lat"]
+        # Enregistrer le raster de la tuile en arrière-plan (fichier temporaire renommé une fois complet : une tuile .tif présente est toujours entière)
+        writer_processus().soumettre(tile_filename, ecrire_geotiff, raster_data, transform)
 
-            row_size = int((max_y - y_coord) / resolution)
-            col_size = int((x_coord - min_x) / resolution)
 
-            if 0 <= row_size < height and 0 <= col_size < width:
-                color = get_color_from_speed(speed)
-                # Priorité au pixel avec les vitesses les plus rapides
-                if raster_data[row_size, col_size][2] < color[2]:
-                    raster_data[row_size, col_size] = (
-                        color  # Remplir avec la couleur correspondant à la vitesse
-                    )
+"""
+create_subraster_bandes draws a tile band by band and writes each band as soon as it is drawn, in a tiled and compressed GeoTIFF.
+Only one band of hauteur_bande rows is in memory at once, whatever the number of pixels of the tile.
+:param df: pixels or segments of the tile (see Stockage_tuiles.lire_tuile)
+:param tile_filename: path of the .tif file
+:param transform: affine transform of the tile
+:param pixels: number of pixels on each side of the tile
+:param resolution: resolution of the tile
+:param mode_trajectoire: True if df holds segments instead of pixels
+:param hauteur_bande: number of rows of each band
+"""
 
-        # Déterminer le nom du fichier de la tuile
-        tile_filename = os.path.join(output_directory, f"{x}_{y}.tif")
 
-        # Enregistrer le raster de la tuile
-        try:
-            with rasterio.open(
-                tile_filename,
-                "w",
-                driver="GTiff",
-                height=height,
-                width=width,
-                count=4,
-                dtype=rasterio.uint8,
-                crs="EPSG:3857",
-                transform=transform,
-            ) as dst:
-                dst.write(
-                    raster_data.transpose(2, 0, 1)
-                )  # Transposer les dimensions pour RGBA
-        except Exception as e:
-            print(f"Erreur lors de l'enregistrement : {str(e)}")
+def create_subraster_bandes(
+    df, tile_filename, transform, pixels, resolution, mode_trajectoire, hauteur_bande
+):
+    import rasterio
+    from rasterio.windows import Window
+
+    min_x, max_y = transform.c, transform.f
+    if mode_trajectoire:
+        r0 = ((max_y - df["lat0"].values) // resolution).astype(np.int64)
+        c0 = ((df["lon0"].values - min_x) // resolution).astype(np.int64)
+        r1 = ((max_y - df["lat1"].values) // resolution).astype(np.int64)
+        c1 = ((df["lon1"].values - min_x) // resolution).astype(np.int64)
+        haut = np.minimum(r0, r1)
+        bas = np.maximum(r0, r1)
+    else:
+        # Pixels triés par ligne : ceux d'une bande sont contigus
+        rows = ((max_y - df["lat"].values) // resolution).astype(np.int64)
+        ordre = np.argsort(rows, kind="stable")
+        rows = rows[ordre]
+        cols = ((df["lon"].values - min_x) // resolution).astype(np.int64)[ordre]
+        speeds = df["speed"].values[ordre]
+
+    # Fichier temporaire renommé une fois complet : une tuile .tif présente est toujours entière
+    temp_path = tile_filename + ".tmp"
+    with rasterio.open(
+        temp_path,
+        "w",
+        driver="GTiff",
+        height=pixels,
+        width=pixels,
+        count=4,
+        dtype=rasterio.uint8,
+        crs="EPSG:3857",
+        transform=transform,
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        compress="deflate",
+        # Les blocs jamais écrits (sans bateau) ne sont pas stockés et se lisent comme des zéros
+        sparse_ok=True,
+    ) as dst:
+        for debut in range(0, pixels, hauteur_bande):
+            hauteur = min(hauteur_bande, pixels - debut)
+            if mode_trajectoire:
+                # Segments qui traversent la bande, tracés avec des lignes relatives à la bande
+                dans_bande = (bas >= debut) & (haut < debut + hauteur)
+                if not dans_bande.any():
+                    continue
+                bande = np.zeros((hauteur, pixels, 4), dtype=np.uint8)
+                burn_segments_pixels(
+                    bande,
+                    r0[dans_bande] - debut,
+                    c0[dans_bande],
+                    r1[dans_bande] - debut,
+                    c1[dans_bande],
+                    df["speed"].values[dans_bande],
+                )
+            else:
+                a, b = np.searchsorted(rows, [debut, debut + hauteur])
+                if a == b:
+                    continue
+                bande = np.zeros((hauteur, pixels, 4), dtype=np.uint8)
+                burn_speeds(bande, rows[a:b] - debut, cols[a:b], speeds[a:b])
+            dst.write(
+                bande.transpose(2, 0, 1), window=Window(0, debut, pixels, hauteur)
+            )
+    os.replace(temp_path, tile_filename)
 
 
 ###########################################################
@@ -207,10 +354,11 @@ create_readme_final does create ReadMe for all category of boat.
 :param resolution_max: resolution in real metres per pixel
 :param hours, minutes, seconds: total programme execution time to produce all zoom levels for all categories at a given resolution
 :param Path_work: path to the file
+:param zoom_levels: zoom levels of the map
 """
 
 
-def create_readme_final(resolution_max, hours, minutes, seconds, Path_work):
+def create_readme_final(resolution_max, hours, minutes, seconds, Path_work, zoom_levels):
     # Chemin complet du fichier README
     readme_path = os.path.join(Path_work, "README.md")
 
@@ -241,7 +389,7 @@ create_readme does create ReadMe for one category of boat.
 :param zoom_levels: most precise zoom level
 :param resolutionmax: resolution in real metres per pixel
 :param hours, minutes, seconds: total programme execution time to produce all zoom levels for one categories at a given resolution
-:param hours0, minutes0, seconds0: execution time for the creation of the .csv file
+:param hours0, minutes0, seconds0: execution time for the sort of the database into the store of the tiles
 :param hours1, minutes1, seconds1: execution time to create the most precise tiles
 :param hours2, minutes2, seconds2: execution time to create all the other zoom levels
 :param Path_work: path to the file
@@ -285,10 +433,10 @@ def create_readme(
 
 # Rapport de Temps d'Exécution de cette catégorie
 
-## Temps d'Exécution pour créer les csv de chaque du niveau de zoom le plus précis avec les données du fichier AIS.tsv:
+## Temps d'Exécution pour trier par tuile du niveau de zoom le plus précis les données du fichier AIS.tsv:
 - **Durée** : {int(hours0)} heures, {int(minutes0)} minutes, {seconds0:.6f} secondes
 
-## Temps d'Exécution pour créer les tuiles du niveau de zoom le plus précis avec les données des fichiers .csv :
+## Temps d'Exécution pour créer les tuiles du niveau de zoom le plus précis avec les données triées par tuile :
 - **Durée** : {int(hours1)} heures, {int(minutes1)} minutes, {seconds1:.6f} secondes
 
 ## Temps d'Exécution pour créer les niveaux de zoom supérieurs via gdal :
@@ -309,13 +457,16 @@ def create_readme(
 modify_openlayers_file creates/modifies the openlayers.html file.
 :param path: path where creates/modifies the openlayers file
 :param max_zoom: most precise zoom level
+:param extent: extent of the view (min_x, min_y, max_x, max_y in WebMercator), None for the default extent
 """
 
 
-def modify_openlayers_file(path, max_zoom):
+def modify_openlayers_file(path, max_zoom, extent=None):
 
     file_path = os.path.join(path, "openlayers.html")
-    new_extent_line = "                                extent: [-17650288.579405, -5408574.014009, 21099711.420595, 15617675.985991],\n"
+    if extent is None:
+        extent = [-17650288.579405, -5408574.014009, 21099711.420595, 15617675.985991]
+    new_extent_line = f"                                extent: [{', '.join(f'{v:f}' for v in extent)}],\n"
     # Lire le fichier et modifier la ligne
     with open(file_path, "r", encoding="utf-8") as f:
         lines = f.readlines()
@@ -347,6 +498,43 @@ def modify_openlayers_file(path, max_zoom):
 ## Fonctions qui utilise GDAL pour créer les niveaux de zooms supérieurs ##
 ###########################################################
 
+"""
+charger_rgba loads an image as a RGBA array.
+:param path: path to the image file
+:return: RGBA array (height, width, 4)
+"""
+
+
+def charger_rgba(path):
+    from PIL import Image
+
+    return np.array(Image.open(path).convert("RGBA"))
+
+
+"""
+fusion_max merges two RGBA images, keeping on each pixel the fastest speed (strongest blue component).
+:param arr_1: first RGBA array
+:param arr_2: second RGBA array
+:return: merged RGBA array
+"""
+
+
+def fusion_max(arr_1, arr_2):
+    # Vérifier que les deux tableaux ont la même forme
+    if arr_1.shape != arr_2.shape:
+        print(
+            f"Les formes des images sont différentes : {arr_1.shape} vs {arr_2.shape}"
+        )
+        raise ValueError(
+            "Les deux images doivent avoir la même taille et format pour être fusionnées."
+        )
+
+    # Fusion : Garder les pixels avec la composante bleue (indice 2) la plus forte
+    return np.where(
+        arr_2[..., 2:3] > arr_1[..., 2:3], arr_2, arr_1
+    )  # Utiliser des dimensions compatibles
+
+
 """
 merge_tiles merges two results from gdal2tiles.py (the png images for each zoom level).
 :param dossier_1: path to the folders 1
@@ -355,6 +543,7 @@ merge_tiles merges two results from gdal2tiles.py (the png images for each zoom
 
 
 def merge_tiles(dossier_1, dossier_2):
+    writer = writer_processus()
 
     for zoom_level in os.listdir(dossier_2):
         zoom_path_2 = os.path.join(dossier_2, zoom_level)
@@ -380,37 +569,19 @@ def merge_tiles(dossier_1, dossier_2):
                 y_path_2 = os.path.join(x_path_2, y_file)
                 y_path_1 = os.path.join(x_path_1, y_file)
 
+                # La tuile de dossier_1 est peut-être encore en cours d'écriture
+                writer.attendre(y_path_1)
+
                 # Si le fichier n'existe pas dans dossier_1, copier depuis dossier_2
+                # (lu tout de suite : dossier_2 est supprimé après la fusion, seule l'écriture est faite en arrière-plan)
                 if not os.path.exists(y_path_1):
-                    shutil.copy2(y_path_2, y_path_1)
+                    with open(y_path_2, "rb") as f:
+                        writer.soumettre(y_path_1, ecrire_octets, f.read())
                 else:
-                    # Charger les deux images en RGBA
-                    img_1 = Image.open(y_path_1).convert("RGBA")
-                    img_2 = Image.open(y_path_2).convert("RGBA")
-
-                    # Convertir en tableaux NumPy
-                    arr_1 = np.array(img_1)
-                    arr_2 = np.array(img_2)
-
-                    # Vérifier que les deux tableaux ont la même forme
-                    if arr_1.shape != arr_2.shape:
-                        print(
-                            f"Les formes des images sont différentes : {arr_1.shape} vs {arr_2.shape}"
-                        )
-                        raise ValueError(
-                            "Les deux images doivent avoir la même taille et format pour être fusionnées."
-                        )
-
-                    # Fusion : Garder les pixels avec la composante bleue (indice 2) la plus forte
-                    fusion = np.where(
-                        arr_2[..., 2:3] > arr_1[..., 2:3], arr_2, arr_1
-                    )  # Utiliser des dimensions compatibles
-
-                    # Convertir le tableau fusionné en image
-                    img_fusion = Image.fromarray(fusion, mode="RGBA")
+                    fusion = fusion_max(charger_rgba(y_path_1), charger_rgba(y_path_2))
 
                     # Sauvegarder l'image fusionnée à la place de la première image
-                    img_fusion.save(y_path_1)
+                    writer.soumettre(y_path_1, ecrire_png, fusion)
 
 
 """
@@ -439,6 +610,8 @@ def create_zoom(
         target = os.path.join(tiles_producted_directory, name)
 
         # On cherche le path de gdal2tiles
+        from osgeo import gdal
+
         gdal2tiles_path = gdal.__file__[:-8] + '_utils/gdal2tiles.py'
 
         cmd = f"{sys.executable} {gdal2tiles_path} -z {zoom_levels} {target} {process_output_directories}"
@@ -449,14 +622,17 @@ def create_zoom(
         #     ]
 
         # Exécution de la commande
-        exit_code = os.system(cmd)
+        with mesure(name, "zoom", tuile=name):
+            exit_code = os.system(cmd)
 
         # Vérification et gestion des erreurs
         if exit_code != 0:
             return f"Erreur lors de l'exécution de : {cmd}"
 
     # Vérifier si le répertoire de sortie existe, sinon le créer et généré les niveaux de zoom de la première tuile de ce processus
-    if not os.path.exists(os.path.join(process_output_directories, "0")):
+    # (repéré par le dossier du niveau le moins précis, qui n'est pas forcément 0)
+    premier_zoom = zoom_levels.split("-")[0]
+    if not os.path.exists(os.path.join(process_output_directories, premier_zoom)):
         os.makedirs(process_output_directories, exist_ok=True)
         gdal2tiles(name, tiles_producted_directory, process_output_directories)
 
@@ -469,7 +645,8 @@ def create_zoom(
         # On génère les niveaux de zoom de cette tuile
         gdal2tiles(name, tiles_producted_directory, process__new_output_directories)
         # Et on fusionne les image png résultantes de gdal2tiles avec un résultat général
-        merge_tiles(process_output_directories, process__new_output_directories)
+        with mesure(name, "fusion_zoom", tuile=name):
+            merge_tiles(process_output_directories, process__new_output_directories)
         shutil.rmtree(process__new_output_directories)
 
 
@@ -483,7 +660,8 @@ process_tile_group
 
 
 def process_tile_group(group, tiles_producted_directory, Gdal_directory, zoom_levels):
-    temp_dir = os.path.join(Gdal_directory, f"temp_{os.getpid()}")
+    # Le nom de la machine distingue les processus de même pid en mode distribué
+    temp_dir = os.path.join(Gdal_directory, f"temp_{socket.gethostname()}_{os.getpid()}")
     os.makedirs(temp_dir, exist_ok=True)
 
     for name in group:
@@ -545,6 +723,8 @@ html adjusts the html to open Openlayer
 
 def htlm(nouvelle_valeur_maxZoom, html_path):
     # Charger le fichier HTML
+    from bs4 import BeautifulSoup
+
     html_file = os.path.join(html_path, "openlayers.html")
     with open(html_file, "r", encoding="utf-8") as file:
         soup = BeautifulSoup(file, "html.parser")
@@ -568,66 +748,59 @@ def htlm(nouvelle_valeur_maxZoom, html_path):
         file.write(str(soup))
 
 
-# Verrou global pour éviter les conflits
-lock = multiprocessing.Lock()
-
-"""
-merge merges two images by comparing their alpha values
-:param image1_path: path to the first image file
-:param image2_path: path to the second image file
-:param output_path: path where the merged image will be saved
-"""
-
-
-def merge(image1_path, image2_path, output_path):
-    img_1 = Image.open(image1_path).convert("RGBA")
-    img_2 = Image.open(image2_path).convert("RGBA")
-
-    arr_1 = np.array(img_1)
-    arr_2 = np.array(img_2)
-
-    if arr_1.shape != arr_2.shape:
-        raise ValueError(f"Taille incompatible : {arr_1.shape} vs {arr_2.shape}")
-
-    fusion = np.where(arr_2[..., 2:3] > arr_1[..., 2:3], arr_2, arr_1)
-
-    img_fusion = Image.fromarray(fusion, mode="RGBA")
-    img_fusion.save(output_path)
-
-
 """
 process_tile processes a single tile from the source directories and saves it to the target directory
 :param source_dirs: list of source directories containing tiles
 :param target_dir: target directory to save the processed tile
 :param tile_path: path to the tile to be processed
+:param garder_existant: True to also keep the fastest speed of the tile already in the target directory (incremental update)
 """
 
 
-def process_tile(source_dirs, target_dir, tile_path):
-    global lock  # Utilisation du verrou global
+def process_tile(source_dirs, target_dir, tile_path, garder_existant=False):
+    # Chaque tuile n'est traitée que par une seule tâche de parallel_merge : aucun verrou n'est nécessaire,
+    # toutes les sources sont fusionnées en mémoire puis la tuile est écrite une seule fois, en arrière-plan
+    # (et seulement si elle a changé : target_dir est un dossier publié, voir Index_tuiles)
+    # Sans garder_existant, la tuile d'une exécution précédente est remplacée : une vitesse plus faible ou une tuile vide y apparaissent
     target_tile_path = target_dir / tile_path
+    source_tile_paths = [
+        source_dir / tile_path
+        for source_dir in source_dirs
+        if (source_dir / tile_path).exists()
+    ]
+    target_tile_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with mesure(str(tile_path), "fusion", sources=len(source_tile_paths)):
+        garder_existant = garder_existant and target_tile_path.exists()
+        if not garder_existant and len(source_tile_paths) == 1:
+            with open(source_tile_paths[0], "rb") as f:
+                writer_processus().soumettre(
+                    target_tile_path, ecrire_octets, f.read(), str(target_dir)
+                )
+            return
 
-    for source_dir in source_dirs:
-        source_tile_path = source_dir / tile_path
-        if source_tile_path.exists():
-            with lock:
-                if target_tile_path.exists():
-                    temp_path = target_tile_path.with_suffix(".png")
-                    merge(target_tile_path, source_tile_path, temp_path)
-                    os.replace(temp_path, target_tile_path)
-                else:
-                    target_tile_path.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(source_tile_path, target_tile_path)
+        if garder_existant:
+            fusion = charger_rgba(target_tile_path)
+        else:
+            fusion = charger_rgba(source_tile_paths.pop(0))
+        for source_tile_path in source_tile_paths:
+            fusion = fusion_max(fusion, charger_rgba(source_tile_path))
+        writer_processus().soumettre(
+            target_tile_path, ecrire_png, fusion, str(target_dir)
+        )
 
 
 """
 parallel_merge merges tiles in parallel from multiple source directories into a target directory
 :param source_dirs: list of source directories containing tiles
 :param target_dir: target directory to save the merged tiles
+:param pool: pool of processes to reuse, None to create one
+:param garder_existant: True to merge with the tiles already in the target directory, False to replace them
+:return: set of the paths of the merged tiles, relative to target_dir
 """
 
 
-def parallel_merge(source_dirs, target_dir):
+def parallel_merge(source_dirs, target_dir, pool=None, garder_existant=False):
     source_dirs = [Path(d) for d in source_dirs]
     target_dir = Path(target_dir)
 
@@ -637,37 +810,245 @@ def parallel_merge(source_dirs, target_dir):
             relative_path = tile_path.relative_to(source_dir)
             all_tiles.add(relative_path)
 
-    with Pool() as pool:
-        pool.starmap(
-            process_tile,
-            [(source_dirs, target_dir, tile_path) for tile_path in all_tiles],
-        )
+    # Tâches de coût voisin et très nombreuses : données par paquets pour limiter les échanges entre processus
+    executer_pool(
+        process_tile,
+        [
+            (source_dirs, target_dir, tile_path, garder_existant)
+            for tile_path in all_tiles
+        ],
+        pool,
+        chunksize=max(len(all_tiles) // (4 * os.cpu_count()), 1),
+        nom="fusion",
+    )
+    return all_tiles
 
 
-############################################################################################################
+"""
+rasterisation_categorie creates the .tif files of the most precise zoom level for one category.
+:param categorie: name of the category
+:param tuiles: dictionary of the tiles to create
+:param tiles_producted_directory: path where the .tif files are created
+:param tsv_directory: path to the store of the tiles (see Stockage_tuiles)
+:param resolution: resolution of the tiles
+:param config: configuration of the run
+:param pool: pool of processes to reuse, None to create one
+:param couts: dictionary {(x, y): number of rows to draw} (see Stockage_tuiles.couts_partition), None if unknown
+"""
 
-## MAIN
 
-############################################################################################################
+def rasterisation_categorie(
+    categorie,
+    tuiles,
+    tiles_producted_directory,
+    tsv_directory,
+    resolution,
+    config,
+    pool=None,
+    couts=None,
+):
+    couts = couts or {}
+    # Les tuiles les plus chargées d'abord : les processus libres prennent ensuite les petites tuiles, personne ne finit longtemps après les autres
+    tuiles = sorted(tuiles.items(), key=lambda item: -couts.get(item[0], 0))
+    try:
+        if config.mode_distribue:
+            # Une tâche par tuile, les arguments doivent pouvoir s'écrire en JSON
+            # (le rang en tête du nom fait réserver les tuiles les plus chargées en premier)
+            echecs = executer_par_file(
+                config.dossier_file_taches,
+                "create_subraster",
+                {
+                    f"{rang:06d}_{categorie}_raster_{key[0]}_{key[1]}": [
+                        list(key),
+                        [float(v) for v in value],
+                        tiles_producted_directory,
+                        tsv_directory,
+                        resolution,
+                        config.pixels,
+                        config.mode_trajectoire,
+                        config.hauteur_bande,
+                    ]
+                    for rang, (key, value) in enumerate(tuiles)
+                },
+                config.duree_bail,
+                config.nb_essais_max,
+            )
+            # Des tuiles manquent : l'étape ne doit pas être marquée terminée
+            if echecs:
+                raise RuntimeError(
+                    f"{len(echecs)} tuiles de la catégorie {categorie} n'ont pas pu être créées"
+                )
+        else:
+            # Passer les arguments nécessaires à create_subraster
+            executer_pool(
+                create_subraster,
+                [
+                    (
+                        key,
+                        value,
+                        tiles_producted_directory,
+                        tsv_directory,
+                        resolution,
+                        config.pixels,
+                        config.mode_trajectoire,
+                        config.hauteur_bande,
+                    )
+                    for key, value in tuiles
+                ],
+                pool,
+                nom=f"rasterisation {categorie}",
+            )
+    except Exception as e:
+        print(f"Erreur lors de l'exécution du pooling : {str(e)}")
+        raise
 
-# Appeler la fonction principale dans le bloc principal
-if __name__ == "__main__":
 
-    # Démarrer le chronomètre pour la catégorie
-    start_time_total = time.time()
+"""
+niveaux_zoom_categorie creates the other zoom levels of one category with gdal2tiles and merges them in the category directory.
+:param categorie: name of the category
+:param tiles_producted_directory: path to the .tif files of the most precise zoom level
+:param categorie_directory: path to the category directory where the zoom levels are merged
+:param zoom_levels: zoom levels to create
+:param config: configuration of the run
+:param pool: pool of processes to reuse, None to create one
+:param couts: dictionary {(x, y): number of rows drawn} (see Stockage_tuiles.couts_partition), None if unknown
+"""
 
-    # trie du fichier TSV en sous fichier associé aux tuiles par chaque catégorie
-    Path_work_root = os.path.join(PATH, name_tsv)
-    Path_work = os.path.join(
-        Path_work_root, "Resolution_" + str(resolution_max) + "m_per_pixel"
+
+def niveaux_zoom_categorie(
+    categorie,
+    tiles_producted_directory,
+    categorie_directory,
+    zoom_levels,
+    config,
+    pool=None,
+    couts=None,
+):
+    couts = couts or {}
+    # Une tâche par tuile, les plus chargées d'abord : chaque processus prend la tuile suivante dès qu'il est libre
+    # et fusionne toutes ses tuiles dans son propre dossier (process_tile_group)
+    liste_raster = sorted(
+        liste_fichiers_tif(tiles_producted_directory),
+        key=lambda nom: -couts.get(
+            tuple(int(v) for v in nom[: -len(".tif")].split("_")), 0
+        ),
     )
+    tile_groups = [[nom] for nom in liste_raster]
 
-    tile_size, tuiles = tri_CSV(
-        PATH, Path_work, Database_Name, resolution_max, pixels
-    )  # dimension de chaque tuile du niveau de zoom k en mètres réels
-    # tile_size = resolution_max*pixels
-    end_time_tri_csv = time.time()
-    collapse_tri_csv = end_time_tri_csv - start_time_total
+    # Créer un répertoire général pour les sorties des processus (vidé : il peut contenir les résultats partiels d'une exécution interrompue)
+    Gdal_directory = os.path.join(tiles_producted_directory, "processGdal")
+    prepare_directory(Gdal_directory)
+
+    try:
+        if config.mode_distribue:
+            # Chaque tâche produit le sous-arbre de la pyramide d'une tuile
+            echecs = executer_par_file(
+                config.dossier_file_taches,
+                "process_tile_group",
+                {
+                    f"{i:06d}_{categorie}_zoom_{i}": [
+                        group,
+                        tiles_producted_directory,
+                        Gdal_directory,
+                        zoom_levels,
+                    ]
+                    for i, group in enumerate(tile_groups)
+                },
+                config.duree_bail,
+                config.nb_essais_max,
+            )
+            if echecs:
+                raise RuntimeError(
+                    f"{len(echecs)} sous-arbres de zoom de la catégorie {categorie} n'ont pas pu être créés"
+                )
+        else:
+            executer_pool(
+                process_tile_group,
+                [
+                    (group, tiles_producted_directory, Gdal_directory, zoom_levels)
+                    for group in tile_groups
+                ],
+                pool,
+                nom=f"niveaux de zoom {categorie}",
+            )
+
+    except Exception as e:
+        print(f"Erreur lors de l'exécution du pooling de Gdal : {str(e)}")
+        raise
+
+    # Fusion des résultats des processus :
+    print(
+        "Fin de la génération des niveaux de zoom par processus, résultats en cours de fusion ..."
+    )
+
+    list_threads = liste_sous_dossiers(Gdal_directory)
+    for i in range(len(list_threads)):
+        list_threads[i] = os.path.join(Gdal_directory, list_threads[i])
+    target_dir = categorie_directory
+    with mesure(f"fusion {categorie}", "etape"):
+        fusionnees = parallel_merge(list_threads, target_dir, pool)
+
+    # Les tuiles d'une exécution précédente absentes de ce rendu sont supprimées, dans les seuls niveaux produits ici
+    # (en mode progressif, les niveaux de l'aperçu sont gérés par Apercu_progressif)
+    premier_zoom, _, dernier_zoom = zoom_levels.partition("-")
+    for zoom in range(int(premier_zoom), int(dernier_zoom or premier_zoom) + 1):
+        supprimer_absents(
+            os.path.join(categorie_directory, str(zoom)),
+            {
+                os.path.join(categorie_directory, tile_path)
+                for tile_path in fusionnees
+                if tile_path.parts[0] == str(zoom)
+            },
+            categorie_directory,
+        )
+
+    # Parcourir les sous-dossiers immédiats
+    for entry in os.listdir(Gdal_directory):
+        subdirectory_path = os.path.join(Gdal_directory, entry)
+        # Vérifier si c'est un dossier
+        if os.path.isdir(subdirectory_path):
+            # Copier les fichiers non-dossiers vers categorie_directory s'ils n'existent pas
+            for file_name in os.listdir(subdirectory_path):
+                file_path = os.path.join(subdirectory_path, file_name)
+                if os.path.isfile(file_path):  # Vérifie que c'est un fichier
+                    target_path = os.path.join(categorie_directory, file_name)
+                    if not os.path.exists(
+                        target_path
+                    ):  # Si le fichier n'existe pas déjà
+                        shutil.copy2(
+                            file_path, target_path
+                        )  # Copier avec les métadonnées
+        break
+
+
+"""
+produire_carte creates every zoom level of every category for one maximum resolution, from the store of the tiles sorted by tri_CSV.
+:param Path_work: path to the work directory of the resolution
+:param tuiles: dictionary of the tiles
+:param resolution_max: resolution of the most precise zoom level
+:param max_zoom: most precise zoom level
+:param manifeste: manifest of the run (see Reprise)
+:param reprise: True if the intermediate files of a previous run can be reused
+:param start_time_total: start time of the run
+:param collapse_tri_csv: execution time of the sort of the TSV file
+:param config: configuration of the run
+:param pool: pool of processes to reuse, None to create one for each stage
+"""
+
+
+def produire_carte(
+    Path_work,
+    tuiles,
+    resolution_max,
+    max_zoom,
+    manifeste,
+    reprise,
+    start_time_total,
+    collapse_tri_csv,
+    config,
+    pool=None,
+):
+    zoom_levels = config.zoom_levels(max_zoom)
 
     hours0, remainder = divmod(collapse_tri_csv, 3600)
     minutes0, seconds0 = divmod(remainder, 60)
@@ -679,36 +1060,85 @@ if __name__ == "__main__":
 
     for categorie in liste_categories:
 
+        if etape_terminee(manifeste, "termine", categorie):
+            print(f"Catégorie {categorie} déjà terminée")
+            continue
+
         categorie_directory = os.path.join(Path_work, categorie)
-        tsv_directory = os.path.join(categorie_directory, "tiles_csv")
+        tsv_directory = os.path.join(categorie_directory, nom_stockage)
         tiles_producted_directory = os.path.join(categorie_directory, "tiles_producted")
+        # Nombre de lignes à dessiner dans chaque tuile, pour ordonner les tâches de la plus longue à la plus courte
+        couts = couts_partition(tsv_directory)
+
+        if reprise:
+            # Tuiles PNG à moitié écrites par une exécution interrompue (dans toute la catégorie, pas seulement tiles_producted)
+            supprimer_fichiers_partiels(categorie_directory)
 
         # Démarrer le chronomètre pour la catégorie
         start_time = time.time()
 
-        prepare_directory(tiles_producted_directory)
-        print(
-            f"Création des tuiles de la catérorie {categorie} pour une résolution de {resolution_max} m/pixel"
-        )
+        if config.mode_canevas:
+            from Canevas import produire_canevas
+
+            # Pas de tuiles .tif intermédiaires : toutes les tuiles PNG sont découpées dans le canevas de la catégorie
+            if etape_terminee(manifeste, "canevas", categorie):
+                print(f"Tuiles de la catégorie {categorie} déjà créées")
+            else:
+                with mesure(f"canevas {categorie}", "etape"):
+                    produire_canevas(Path_work, categorie_directory, config.zoom_min, pool)
+                marquer_etape(Path_work, manifeste, "canevas", categorie)
+
+        elif etape_terminee(manifeste, "rasterisation", categorie):
+            print(f"Tuiles de la catégorie {categorie} déjà créées")
+        else:
+            if not couts and not os.path.exists(tsv_directory):
+                raise FileNotFoundError(
+                    f"Stockage des tuiles de la catégorie {categorie} absent : {tsv_directory}"
+                )
+            if reprise and os.path.exists(tiles_producted_directory):
+                # On garde les tuiles complètes et on ne refait que les tuiles manquantes ou à moitié écrites
+                supprimer_fichiers_partiels(tiles_producted_directory)
+            else:
+                prepare_directory(tiles_producted_directory)
+            deja_produites = set(liste_fichiers_tif(tiles_producted_directory))
+            tuiles_a_produire = {
+                key: value
+                for key, value in tuiles.items()
+                if f"{key[0]}_{key[1]}.tif" not in deja_produites
+            }
+            print(
+                f"Création des tuiles de la catérorie {categorie} pour une résolution de {resolution_max} m/pixel ({len(deja_produites)} tuiles déjà créées)"
+            )
 
-        try:
-            with Pool() as pool:
-                # Passer les arguments nécessaires à create_subraster
-                pool.starmap(
-                    create_subraster,
-                    [
-                        (
-                            key,
-                            value,
-                            tiles_producted_directory,
-                            tsv_directory,
-                            resolution_max,
-                        )
-                        for key, value in tuiles.items()
-                    ],
+            with mesure(f"rasterisation {categorie}", "etape"):
+                rasterisation_categorie(
+                    categorie,
+                    tuiles_a_produire,
+                    tiles_producted_directory,
+                    tsv_directory,
+                    resolution_max,
+                    config,
+                    pool,
+                    couts,
+                )
+            # L'étape n'est marquée terminée que si chaque tuile qui a des lignes à dessiner a son fichier .tif
+            produites = [
+                nom[: -len(".tif")] for nom in liste_fichiers_tif(tiles_producted_directory)
+            ]
+            manquantes = {f"{x}_{y}" for x, y in tuiles if (x, y) in couts} - set(
+                produites
+            )
+            if manquantes:
+                raise RuntimeError(
+                    f"{len(manquantes)} tuiles de la catégorie {categorie} manquent : {sorted(manquantes)[:10]}"
                 )
-        except Exception as e:
-            print(f"Erreur lors de l'exécution du pooling : {str(e)}")
+            marquer_etape(
+                Path_work,
+                manifeste,
+                "rasterisation",
+                categorie,
+                tuiles=produites,
+            )
 
         print(
             "Fin de la génération des tuiles, génèration les niveaux de zoom avec tous les processus..."
@@ -721,65 +1151,107 @@ if __name__ == "__main__":
         hours1, remainder = divmod(elapsed_time1, 3600)
         minutes1, seconds1 = divmod(remainder, 60)
 
-        liste_raster = liste_fichiers_tif(tiles_producted_directory)
-        max_processes = os.cpu_count()
-        # Déterminer le nombre de processus disponibles
-        chunk_size = (len(liste_raster) + max_processes - 1) // max_processes
-        tile_groups = [
-            liste_raster[i : i + chunk_size]
-            for i in range(0, len(liste_raster), chunk_size)
-        ]
-
-        # Créer un répertoire général pour les sorties des processus
-        Gdal_directory = os.path.join(tiles_producted_directory, "processGdal")
-        os.makedirs(Gdal_directory, exist_ok=True)
+        if config.sortie_cog and not etape_terminee(manifeste, "cog", categorie):
+            from Sortie_COG import creer_cog
 
-        try:
-
-            with Pool() as pool:
-                pool.starmap(
-                    process_tile_group,
-                    [
-                        (group, tiles_producted_directory, Gdal_directory, zoom_levels)
-                        for group in tile_groups
-                    ],
+            # Raster unique pour l'analyse SIG, créé avant la suppression des tuiles .tif
+            with mesure(f"cog {categorie}", "etape"):
+                creer_cog(
+                    tiles_producted_directory,
+                    resolution_max,
+                    os.path.join(categorie_directory, f"{categorie}_cog.tif"),
                 )
+            marquer_etape(Path_work, manifeste, "cog", categorie)
+
+        # Avec une emprise, la vue est limitée aux tuiles produites
+        extent = None
+        if config.emprise is not None:
+            extent = [
+                min(v[0] for v in tuiles.values()),
+                min(v[1] for v in tuiles.values()),
+                max(v[2] for v in tuiles.values()),
+                max(v[3] for v in tuiles.values()),
+            ]
+
+        if config.mode_canevas:
+            from Apercu_progressif import publier_page
+
+            publier_page(
+                categorie_directory,
+                categorie,
+                config.zoom_min,
+                max_zoom,
+                extent,
+                "openlayers.html",
+            )
 
-        except Exception as e:
-            print(f"Erreur lors de l'exécution du pooling de Gdal : {str(e)}")
+        elif config.mode_progressif:
+            from Apercu_progressif import publier_page, niveau_depuis_stockage
+
+            # Les niveaux les moins précis sont déjà dessinés et publiés (voir Apercu_progressif). Les niveaux intermédiaires sont dessinés
+            # un par un depuis le stockage des tuiles, avec la même règle que l'aperçu (vitesse maximale de chaque pixel), et la page est
+            # republiée avec un niveau de plus après chacun : la carte reste consultable pendant l'affinage.
+            # gdal2tiles ne produit que le niveau le plus précis, en une seule passe
+            zoom_debut = max(config.zoom_min, config.zoom_max_apercu(max_zoom) + 1)
+            if zoom_debut <= max_zoom and not etape_terminee(
+                manifeste, "niveaux_zoom", categorie
+            ):
+                with mesure(f"niveaux_zoom {categorie}", "etape"):
+                    for zoom in range(zoom_debut, max_zoom):
+                        niveau_depuis_stockage(
+                            categorie_directory,
+                            tsv_directory,
+                            tuiles,
+                            couts,
+                            zoom,
+                            config.mode_trajectoire,
+                            pool,
+                        )
+                        publier_page(
+                            categorie_directory, categorie, config.zoom_min, zoom, extent
+                        )
+                        print(
+                            f"Niveau de zoom {zoom} de la catégorie {categorie} publié"
+                        )
+                    niveaux_zoom_categorie(
+                        categorie,
+                        tiles_producted_directory,
+                        categorie_directory,
+                        str(max_zoom),
+                        config,
+                        pool,
+                        couts,
+                    )
+                marquer_etape(Path_work, manifeste, "niveaux_zoom", categorie)
+            publier_page(categorie_directory, categorie, config.zoom_min, max_zoom, extent)
+            print(f"Niveau de zoom {max_zoom} de la catégorie {categorie} publié")
+
+        elif not etape_terminee(manifeste, "niveaux_zoom", categorie):
+            # Les tuiles sont réécrites à partir des seules sorties de gdal2tiles de cette exécution : refaire l'étape après une interruption donne le même résultat
+            with mesure(f"niveaux_zoom {categorie}", "etape"):
+                niveaux_zoom_categorie(
+                    categorie,
+                    tiles_producted_directory,
+                    categorie_directory,
+                    zoom_levels,
+                    config,
+                    pool,
+                    couts,
+                )
+            marquer_etape(Path_work, manifeste, "niveaux_zoom", categorie)
 
-        # Fusion des résultats des processus :
-        print(
-            "Fin de la génération des niveaux de zoom par processus, résultats en cours de fusion ..."
-        )
+        if config.mode_canevas:
+            shutil.rmtree(os.path.join(categorie_directory, "canevas"))
+        else:
+            # La page openlayers.html vient de gdal2tiles : elle n'existe pas si tous les niveaux sont dessinés par l'aperçu
+            if os.path.exists(os.path.join(categorie_directory, "openlayers.html")):
+                modify_openlayers_file(categorie_directory, max_zoom, extent)
+            shutil.rmtree(tiles_producted_directory)
 
-        list_threads = liste_sous_dossiers(Gdal_directory)
-        for i in range(len(list_threads)):
-            list_threads[i] = os.path.join(Gdal_directory, list_threads[i])
-        target_dir = categorie_directory
-        parallel_merge(list_threads, target_dir)
-
-        # Parcourir les sous-dossiers immédiats
-        for entry in os.listdir(Gdal_directory):
-            subdirectory_path = os.path.join(Gdal_directory, entry)
-            # Vérifier si c'est un dossier
-            if os.path.isdir(subdirectory_path):
-                # Copier les fichiers non-dossiers vers categorie_directory s'ils n'existent pas
-                for file_name in os.listdir(subdirectory_path):
-                    file_path = os.path.join(subdirectory_path, file_name)
-                    if os.path.isfile(file_path):  # Vérifie que c'est un fichier
-                        target_path = os.path.join(categorie_directory, file_name)
-                        if not os.path.exists(
-                            target_path
-                        ):  # Si le fichier n'existe pas déjà
-                            shutil.copy2(
-                                file_path, target_path
-                            )  # Copier avec les métadonnées
-            break
-
-        modify_openlayers_file(categorie_directory, max_zoom)
-        shutil.rmtree(tiles_producted_directory)
-        shutil.rmtree(tsv_directory)
+        # Index des tuiles de la catégorie et liste des tuiles modifiées pour la synchronisation
+        vider_ecritures()
+        nb_modifiees = consolider_index(categorie_directory)
+        print(f"Catégorie {categorie} : {nb_modifiees} tuiles écrites ou supprimées")
 
         # Arrêter le chronomètre pour avoir le temps de créations de niveaux de zooms supérieurs
         end_time2 = time.time()
@@ -814,6 +1286,7 @@ if __name__ == "__main__":
             seconds2,
             categorie_directory,
         )
+        marquer_etape(Path_work, manifeste, "termine", categorie)
 
         print(
             f"Temps d'exécution de la création des tuiles pour une précision de : {resolution_max} m/pixel de la catégorie : {categorie} sur tous les niveaux de zoom avec multi-threads est de : {int(hours)} heures, {int(minutes)} minutes, {seconds:.6f} secondes"
@@ -827,8 +1300,284 @@ if __name__ == "__main__":
         hours, remainder = divmod(elapsed_time_total, 3600)
         minutes, seconds = divmod(remainder, 60)
 
-        create_readme_final(resolution_max, hours, minutes, seconds, Path_work)
+        create_readme_final(
+            resolution_max, hours, minutes, seconds, Path_work, zoom_levels
+        )
 
         print(
             f"Temps d'exécution de la création des tuiles pour une précision de : {resolution_max} m/pixel pour toutes les catégories sur tous les niveaux de zoom avec multi-threads est de : {int(hours)} heures, {int(minutes)} minutes, {seconds:.6f} secondes"
         )
+
+    # Le stockage de "All" lit ceux des autres catégories : les stockages ne sont supprimés qu'une fois toutes les catégories terminées
+    for categorie in liste_categories:
+        stockage = os.path.join(Path_work, categorie, nom_stockage)
+        if os.path.exists(stockage):
+            shutil.rmtree(stockage)
+
+
+"""
+render creates the maps described by a configuration: sort of the TSV file, then every zoom level of every category.
+A long-lived process (service) can call render several times with the same pool, the processes and their loaded modules are then reused from one run to the next.
+:param config: configuration of the run (see Configuration)
+:param pool: pool of processes to reuse, None to create one for each stage
+:return: list of the work directories of the maps created
+"""
+
+
+def render(config, pool=None):
+    from Tri_CSV import tri_CSV_multi
+
+    # Démarrer le chronomètre pour la catégorie
+    start_time_total = time.time()
+
+    # Trace des tâches de tous les processus, activée avant la création des processus de calcul
+    dossier_trace = os.path.join(config.PATH, config.name_tsv, "trace")
+    if config.mode_trace:
+        activer_trace(dossier_trace)
+
+    # Une carte par zoom maximum demandé, de la plus précise à la moins précise
+    cibles = config.cibles()
+    resolutions = [config.resolution(zoom) for zoom in cibles]
+
+    # trie du fichier TSV en sous fichier associé aux tuiles par chaque catégorie
+    Path_works = [config.Path_work(zoom) for zoom in cibles]
+
+    # Manifeste des étapes terminées de chaque carte, pour pouvoir reprendre une exécution interrompue
+    manifestes = []
+    for Path_work, resolution, zoom in zip(Path_works, resolutions, cibles):
+        parametres = {
+            "Database_Name": config.Database_Name,
+            "resolution_max": resolution,
+            "pixels": config.pixels,
+            "zoom_levels": config.zoom_levels(zoom),
+            # Liste et non tuple : le manifeste relu depuis le JSON doit être égal
+            "emprise": None if config.emprise is None else list(config.emprise),
+            "mode_trajectoire": config.mode_trajectoire,
+            "zoom_max_apercu": config.zoom_max_apercu(zoom),
+            "mode_canevas": config.mode_canevas,
+        }
+        if config.reprise:
+            manifeste = charger_manifeste(Path_work, parametres)
+        else:
+            manifeste = nouveau_manifeste(parametres)
+            enregistrer_manifeste(Path_work, manifeste)
+        manifestes.append(manifeste)
+
+    # Les fichiers intermédiaires d'une exécution précédente ne sont réutilisés que si le tri du fichier TSV n'est pas refait
+    reprise = all(etape_terminee(manifeste, "tri_csv") for manifeste in manifestes)
+    if reprise:
+        print("Reprise de l'exécution précédente, tri du fichier TSV déjà fait")
+        liste_tuiles = [charger_tuiles(Path_work) for Path_work in Path_works]
+    else:
+        # Une seule lecture du fichier TSV pour toutes les cartes
+        with mesure(f"tri_csv {config.Database_Name}", "etape"):
+            liste_tuiles = [
+                tuiles
+                for tile_size, tuiles in tri_CSV_multi(
+                    config.PATH,
+                    Path_works,
+                    config.Database_Name,
+                    resolutions,
+                    config.pixels,
+                    config.mode_trajectoire,
+                    config.ecart_temps_max,
+                    config.ecart_distance_max,
+                    # Tuiles vectorielles au-delà des niveaux raster de chaque carte
+                    [zoom + 1 for zoom in cibles] if config.sortie_mvt else None,
+                    config.zoom_max_mvt,
+                    config.budget_mvt,
+                    config.emprise,
+                    config.zoom_min,
+                    # Niveaux les moins précis dessinés et publiés dès le tri en construction progressive
+                    [config.zoom_max_apercu(zoom) for zoom in cibles]
+                    if config.mode_progressif
+                    else None,
+                    # Zoom maximal de chaque carte en mode canevas
+                    cibles if config.mode_canevas else None,
+                    config.zoom_statistiques,
+                    config.zoom_max_densite if config.sortie_densite else None,
+                    config.rayon_densite,
+                    config.croissance_rayon_densite,
+                )
+            ]
+        for Path_work, manifeste in zip(Path_works, manifestes):
+            marquer_etape(Path_work, manifeste, "tri_csv")
+    end_time_tri_csv = time.time()
+    collapse_tri_csv = end_time_tri_csv - start_time_total
+
+    for Path_work, tuiles, resolution, zoom, manifeste in zip(
+        Path_works, liste_tuiles, resolutions, cibles, manifestes
+    ):
+        produire_carte(
+            Path_work,
+            tuiles,
+            resolution,
+            zoom,
+            manifeste,
+            reprise,
+            start_time_total,
+            collapse_tri_csv,
+            config,
+            pool,
+        )
+
+    if config.mode_distribue:
+        arreter_travailleurs(config.dossier_file_taches)
+
+    if config.mode_trace:
+        vider_ecritures()
+        exporter_trace(dossier_trace, os.path.join(dossier_trace, "trace.json"))
+        desactiver_trace()
+
+    return Path_works
+
+
+"""
+lire_arguments reads the command line, the parameters not given keep their value of Parametres_a_modifier.py.
+:param arguments: list of the command line arguments
+:return: configuration of the run
+"""
+
+
+def lire_arguments(arguments):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Création des tuiles de la carte des vitesses des navires à partir d'un fichier AIS .tsv"
+    )
+    parser.add_argument("--path", dest="PATH", help="dossier des données")
+    parser.add_argument(
+        "--database", dest="Database_Name", help="nom du fichier .tsv (ex : dataBase.tsv)"
+    )
+    parser.add_argument("--max-zoom", dest="max_zoom", type=int, help="zoom maximal")
+    parser.add_argument(
+        "--liste-max-zoom",
+        dest="liste_max_zoom",
+        type=int,
+        nargs="+",
+        help="zooms maximaux de plusieurs cartes produites en une seule exécution",
+    )
+    parser.add_argument(
+        "--emprise",
+        type=float,
+        nargs=4,
+        metavar=("LON_MIN", "LAT_MIN", "LON_MAX", "LAT_MAX"),
+        help="ne produit que cette zone (en degrés)",
+    )
+    parser.add_argument(
+        "--zoom-min", dest="zoom_min", type=int, help="zoom le moins précis produit"
+    )
+    parser.add_argument(
+        "--pixels", type=int, help="nombre de pixels par côté de chaque tuile"
+    )
+    parser.add_argument(
+        "--hauteur-bande",
+        dest="hauteur_bande",
+        type=int,
+        help="nombre de lignes dessinées et écrites à la fois dans chaque tuile (0 : tuile entière en mémoire)",
+    )
+    parser.add_argument(
+        "--cog",
+        dest="sortie_cog",
+        action="store_true",
+        default=None,
+        help="produit en plus un Cloud Optimized GeoTIFF par catégorie",
+    )
+    parser.add_argument(
+        "--mvt",
+        dest="sortie_mvt",
+        action="store_true",
+        default=None,
+        help="produit les niveaux de zoom au-delà du zoom maximal en tuiles vectorielles",
+    )
+    parser.add_argument(
+        "--zoom-max-mvt", dest="zoom_max_mvt", type=int, help="zoom maximal des tuiles vectorielles"
+    )
+    parser.add_argument(
+        "--densite",
+        dest="sortie_densite",
+        action="store_true",
+        default=None,
+        help="produit en plus une carte de densité (heatmap) de chaque catégorie",
+    )
+    parser.add_argument(
+        "--zoom-max-densite",
+        dest="zoom_max_densite",
+        type=int,
+        help="zoom maximal de la carte de densité",
+    )
+    parser.add_argument(
+        "--progressif",
+        dest="mode_progressif",
+        action="store_true",
+        default=None,
+        help="publie d'abord les niveaux de zoom les moins précis puis ajoute les suivants un par un",
+    )
+    parser.add_argument(
+        "--zoom-apercu",
+        dest="zoom_apercu",
+        type=int,
+        help="zoom maximal dessiné directement à partir des positions en construction progressive",
+    )
+    parser.add_argument(
+        "--canevas",
+        dest="mode_canevas",
+        action="store_true",
+        default=None,
+        help="dessine chaque catégorie dans un seul raster sur disque découpé en tuiles (zooms maximaux jusqu'à 8)",
+    )
+    parser.add_argument(
+        "--zoom-statistiques",
+        dest="zoom_statistiques",
+        type=int,
+        help="zoom le plus précis de la pyramide des nombres de rapports (voir Statistiques.py)",
+    )
+    parser.add_argument(
+        "--trajectoire",
+        dest="mode_trajectoire",
+        action="store_true",
+        default=None,
+        help="relie les positions successives de chaque navire par des segments",
+    )
+    parser.add_argument(
+        "--distribue",
+        dest="mode_distribue",
+        action="store_true",
+        default=None,
+        help="publie les calculs dans la file de tâches partagée",
+    )
+    parser.add_argument(
+        "--file-taches", dest="dossier_file_taches", help="dossier de la file de tâches"
+    )
+    parser.add_argument(
+        "--trace",
+        dest="mode_trace",
+        action="store_true",
+        default=None,
+        help="enregistre la durée de chaque tâche de tous les processus (fichier trace.json pour chrome://tracing ou Perfetto)",
+    )
+    parser.add_argument(
+        "--resume",
+        dest="reprise",
+        action="store_true",
+        help="reprend une exécution interrompue là où elle s'était arrêtée",
+    )
+    valeurs = {
+        nom: valeur
+        for nom, valeur in vars(parser.parse_args(arguments)).items()
+        if valeur is not None
+    }
+    return Configuration(**valeurs)
+
+
+############################################################################################################
+
+## MAIN
+
+############################################################################################################
+
+# Appeler la fonction principale dans le bloc principal
+# python MAIN.py --help : paramètres modifiables en ligne de commande sans toucher à Parametres_a_modifier.py
+# python MAIN.py --resume : reprend une exécution interrompue là où elle s'était arrêtée
+if __name__ == "__main__":
+    render(lire_arguments(sys.argv[1:]))
@@ -0,0 +1,115 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+############################################################################################################
+
+## Mesure du temps de démarrage
+
+############################################################################################################
+
+# Chaque processus lancé (processus de calcul, service, ligne de commande) paye le temps d'import des modules avant de calculer.
+# Ce script mesure ce démarrage à froid dans des interpréteurs neufs, pour suivre son évolution d'une version à l'autre :
+#   python Mesure_demarrage.py [nombre d'essais]
+
+dossier = os.path.dirname(os.path.abspath(__file__))
+
+# Code exécuté dans un interpréteur neuf pour chaque mesure
+demarrages = {
+    "interpréteur seul": "pass",
+    "import MAIN (ligne de commande, service)": "import MAIN",
+    "processus de calcul (File_de_taches)": "import File_de_taches; File_de_taches.taches_disponibles()",
+    "bibliothèques lourdes (ancien import de MAIN)": "import pandas, pyproj, rasterio, PIL.Image, bs4",
+}
+
+
+"""
+mesure_demarrage measures the execution time of some code in a new Python interpreter.
+:param code: code to execute
+:param nb_essais: number of measures
+:return: median time in seconds, None if the code fails
+"""
+
+
+def mesure_demarrage(code, nb_essais):
+    durees = []
+    for _ in range(nb_essais):
+        debut = time.perf_counter()
+        resultat = subprocess.run(
+            [sys.executable, "-c", code], cwd=dossier, capture_output=True
+        )
+        if resultat.returncode != 0:
+            return None
+        durees.append(time.perf_counter() - debut)
+    return statistics.median(durees)
+
+
+def tache_vide(i):
+    return i
+
+
+"""
+mesure_pool compares a pool created for each stage with a pool reused from one stage to the next (see MAIN.render).
+:param nb_etapes: number of stages
+:return: (time with a new pool for each stage, time with a reused pool) in seconds
+"""
+
+
+def mesure_pool(nb_etapes):
+    debut = time.perf_counter()
+    for _ in range(nb_etapes):
+        with Pool() as pool:
+            pool.map(tache_vide, range(os.cpu_count()))
+            pool.close()
+            pool.join()
+    duree_froid = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    with Pool() as pool:
+        for _ in range(nb_etapes):
+            pool.map(tache_vide, range(os.cpu_count()))
+    duree_chaud = time.perf_counter() - debut
+    return duree_froid, duree_chaud
+
+
+############################################################################################################
+
+## MAIN
+
+############################################################################################################
+
+if __name__ == "__main__":
+    nb_essais = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"Démarrage à froid, médiane sur {nb_essais} essais :")
+    for nom, code in demarrages.items():
+        duree = mesure_demarrage(code, nb_essais)
+        if duree is None:
+            print(f"  {nom} : échec (module manquant ?)")
+        else:
+            print(f"  {nom} : {duree * 1000:.0f} ms")
+
+    duree_froid, duree_chaud = mesure_pool(10)
+    print(
+        f"10 étapes : {duree_froid:.2f} s avec un pool par étape, {duree_chaud:.2f} s avec un pool réutilisé"
+    )
@@ -15,6 +15,8 @@
 #  * limitations under the License.
 #  */
 
+import os
+
 ############################################################################################################
 
 ## Définition des variables
@@ -63,6 +65,124 @@ Database_Name = "ALL_01072023_IMT.tsv"
 # !! ATTENTION !! un résolution plus précise que 14 commence à rendre les points très difficilement visibles en contraste avec la carte, à réserver pour une observation ponctuelle
 max_zoom = 6
 
+# Pour produire plusieurs cartes en une seule exécution (ex : [6, 10] pour un aperçu rapide et un produit détaillé), mettre la liste des zooms maximums souhaités.
+# Le fichier n'est lu et projeté qu'une fois, et les cartes les moins précises sont déduites de la plus précise. Liste vide : seulement max_zoom
+liste_max_zoom = []
+
+# Pour ne produire qu'une zone (ex : un port à fort zoom), mettre son emprise en degrés (lon_min, lat_min, lon_max, lat_max), ex : (-4.55, 48.33, -4.40, 48.40)
+# Seules les positions de l'emprise sont lues et les tuiles ne couvrent que l'emprise. None : toute l'étendue des données
+emprise = None
+
+# Niveau de zoom le moins précis produit (0 : carte du monde entier), utile avec une emprise pour ne produire que les zooms élevés
+zoom_min = 0
+
+# Si différent de 0, chaque tuile est dessinée et écrite par bandes de hauteur_bande lignes dans un GeoTIFF découpé en blocs et compressé :
+# la mémoire d'un processus dépend de la hauteur de bande et non plus de la surface de la tuile, ce qui permet des tuiles bien plus grandes (pixels = 20000 et plus).
+# Le fichier est écrit directement par le processus de calcul (pas d'écriture en arrière-plan)
+hauteur_bande = 0
+
+## Sorties : ##
+####
+
+# Si True, produit en plus des tuiles PNG un seul Cloud Optimized GeoTIFF par catégorie ({catégorie}_cog.tif, compressé, avec aperçus internes)
+sortie_cog = False
+
+# Si True, les niveaux de zoom au-delà de max_zoom et jusqu'à zoom_max_mvt sont produits en tuiles vectorielles (dossier mvt de chaque catégorie, page mvt.html) :
+# aux zooms élevés, elles sont beaucoup plus légères et rapides à produire que les tuiles raster. Les niveaux de 0 à max_zoom restent en raster
+sortie_mvt = False
+zoom_max_mvt = 16
+
+# Nombre maximal de points par tuile vectorielle, au-delà les points proches sont regroupés (en gardant le plus rapide)
+budget_mvt = 4096
+
+# Si True, produit en plus une carte de densité (heatmap) de chaque catégorie, des zooms 0 à zoom_max_densite (dossier densite, page densite.html) :
+# les rapports sont comptés par pixel puis lissés par un noyau gaussien, les positions isolées restent visibles aux zooms peu précis
+sortie_densite = False
+zoom_max_densite = 8
+
+# Ecart-type du noyau en pixels au zoom zoom_max_densite, multiplié par croissance_rayon_densite à chaque niveau moins précis
+rayon_densite = 2.0
+croissance_rayon_densite = 1.3
+
+# Si True, construction progressive : les niveaux de zoom jusqu'à zoom_apercu sont dessinés directement à partir des positions dès le tri du fichier TSV
+# et consultables aussitôt avec la page progressif.html de chaque catégorie, puis les niveaux plus précis sont produits un par un et ajoutés à la page
+mode_progressif = False
+zoom_apercu = 7
+
+# Si True, mode canevas : chaque catégorie est dessinée dans un seul raster sur disque couvrant toute l'étendue, découpé directement en tuiles PNG
+# (pas de tuiles .tif intermédiaires ni de gdal2tiles). Réservé aux zooms maximaux jusqu'à zoom_max_canevas (le canevas du monde entier au zoom 8 occupe 4 Go)
+# et aux cartes de points, sans Cloud Optimized GeoTIFF, construction progressive ni calcul distribué
+mode_canevas = False
+zoom_max_canevas = 8
+
+## Statistiques : ##
+####
+
+# Zoom le plus précis de la pyramide des nombres de rapports par catégorie et par vitesse (dossier statistiques des résultats),
+# interrogée avec python Statistiques.py sans relire le fichier TSV. None : pas de pyramide
+# (14 par exemple : la pyramide compte toutes les positions du fichier, même avec une emprise, ce qui demande une projection de plus avec une emprise)
+zoom_statistiques = None
+
+## Mode trajectoire : ##
+####
+
+# Si True, les positions sont regroupées par navire (mmsi), ordonnées par date (datetime) et reliées par des segments
+# au lieu d'être dessinées comme des pixels isolés : la carte reste continue même avec des données peu denses
+mode_trajectoire = False
+
+# Ecart de temps maximal (en secondes) entre deux positions successives d'un navire pour les relier par un segment
+ecart_temps_max = 3600
+
+# Ecart de distance maximal (en mètres WebMercator) entre deux positions successives d'un navire pour les relier par un segment
+ecart_distance_max = 20000
+
+## Calcul distribué : ##
+####
+
+# Si True, les tuiles et les niveaux de zoom sont publiés comme tâches dans une file partagée au lieu d'être calculés par le seul multiprocessing de cette machine.
+# Les processus de calcul se lancent sur chaque machine (une ou plusieurs fois) avec : python File_de_taches.py [dossier_file_taches]
+mode_distribue = False
+
+# Dossier de la file de tâches, sur un système de fichiers partagé par toutes les machines (de même que PATH)
+dossier_file_taches = os.path.join(PATH, "file_taches")
+
+# Durée (en secondes) au bout de laquelle une tâche dont le processus ne donne plus de nouvelles est remise dans la file
+duree_bail = 600
+
+# Nombre d'essais d'une tâche avant de l'abandonner
+nb_essais_max = 3
+
+## Ingestion continue (python Flux_continu.py) : ##
+####
+
+# Temps maximal (en secondes) entre l'arrivée d'une position et la mise à jour des tuiles : les positions arrivées entre temps sont traitées ensemble
+duree_lot_flux = 60
+
+# Nombre maximal de positions traitées ensemble
+taille_lot_flux = 200000
+
+# Port local sur lequel les positions sont reçues (mode socket)
+port_flux = 5555
+
+# Arrêt après ce nombre de secondes sans nouvelle position (None : jamais)
+inactivite_max_flux = None
+
+## Trace d'exécution : ##
+####
+
+# Si True, la durée de chaque tâche (création d'une tuile, niveaux de zoom, fusion, écriture) de chaque processus est enregistrée
+# dans le dossier trace des résultats : trace.json s'ouvre dans chrome://tracing ou https://ui.perfetto.dev
+mode_trace = False
+
+## Ecriture des tuiles : ##
+####
+
+# Nombre de threads qui encodent et écrivent les tuiles en arrière-plan dans chaque processus, pendant que le processus calcule la tuile suivante
+nb_threads_ecriture = 2
+
+# Nombre maximal de tuiles en attente d'écriture dans chaque processus (borne la mémoire : une tuile de 3000 pixels de côté occupe 36 Mo)
+taille_file_ecriture = 4
+
 ############################################################################################################
 ## NE PAS MODIFIER
 ############################################################################################################
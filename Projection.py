@@ -0,0 +1,190 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+############################################################################################################
+
+## Projection des positions en WebMercator (EPSG:4326 -> EPSG:3857)
+
+############################################################################################################
+
+# La projection WebMercator a une formule exacte : x = R * lon, y = R * ln(tan(pi / 4 + lat / 2)) (angles en radians, R rayon de la sphère).
+# Elle est calculée par numpy sur place dans des tableaux alloués une seule fois, par blocs répartis sur plusieurs threads
+# (numpy libère le GIL pendant les calculs, les threads évitent de copier les données vers des processus).
+# Un échantillon des positions est comparé à pyproj : si l'écart dépasse tolerance_projection, toutes les positions sont projetées par pyproj.
+# Les pôles (latitude ±90°), où pyproj borne le résultat, sont écartés avant la projection par la validation des positions (voir Validation).
+#   python Projection.py [nombre de points] : écart avec pyproj et temps des deux méthodes
+
+# Rayon de la sphère de la projection WebMercator, en mètres
+rayon_mercator = 6378137.0
+
+# Nombre de positions projetées par bloc
+taille_bloc = 1_000_000
+
+# Nombre de positions comparées à pyproj à chaque projection
+taille_echantillon = 1000
+
+# Ecart maximal toléré avec pyproj, en mètres (un pixel du zoom 18 mesure 0,6 mètre)
+tolerance_projection = 0.001
+
+
+def _projeter_bloc(lat, lon, x, y, debut, fin):
+    # Calcul sur place dans les tableaux de sortie : aucun tableau intermédiaire
+    np.radians(lon[debut:fin], out=x[debut:fin])
+    x[debut:fin] *= rayon_mercator
+    np.radians(lat[debut:fin], out=y[debut:fin])
+    y[debut:fin] *= 0.5
+    y[debut:fin] += np.pi / 4
+    np.tan(y[debut:fin], out=y[debut:fin])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.log(y[debut:fin], out=y[debut:fin])
+    y[debut:fin] *= rayon_mercator
+
+
+@lru_cache(maxsize=None)
+def _transformer():
+    from pyproj import Transformer
+
+    # Créé une seule fois par processus : la vérification a lieu à chaque lot en ingestion continue
+    return Transformer.from_crs("EPSG:4326", "EPSG:3857")
+
+
+"""
+projeter_pyproj projects positions with pyproj.
+:param lat: latitudes in degrees
+:param lon: longitudes in degrees
+:return: (x, y) arrays in WebMercator
+"""
+
+
+def projeter_pyproj(lat, lon):
+    x, y = _transformer().transform(lat, lon)
+    return np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+
+"""
+ecart_pyproj gives the greatest distance between projected positions and the projection of a sample of them by pyproj.
+:param lat: latitudes in degrees
+:param lon: longitudes in degrees
+:param x: projected x
+:param y: projected y
+:param taille: number of positions of the sample
+:return: greatest distance in metres (inf if the finite positions differ)
+"""
+
+
+def ecart_pyproj(lat, lon, x, y, taille=taille_echantillon):
+    # Echantillon régulier, qui contient toujours la première et la dernière position
+    indices = np.unique(
+        np.linspace(0, len(lat) - 1, min(taille, len(lat))).astype(np.int64)
+    )
+    x_ref, y_ref = projeter_pyproj(np.asarray(lat)[indices], np.asarray(lon)[indices])
+    if not np.array_equal(np.isfinite(y[indices]), np.isfinite(y_ref)):
+        return np.inf
+    finies = np.isfinite(y_ref)
+    if not finies.any():
+        return 0.0
+    return float(
+        max(
+            np.max(np.abs(x[indices] - x_ref)),
+            np.max(np.abs(y[indices][finies] - y_ref[finies])),
+        )
+    )
+
+
+"""
+projeter projects positions from EPSG:4326 to EPSG:3857 with the closed-form formula, by blocks on several threads.
+:param lat: latitudes in degrees
+:param lon: longitudes in degrees
+:param nb_threads: number of threads, None for the number of processors
+:param verifier: True to compare a sample with pyproj and use pyproj if the distance is greater than tolerance_projection
+:return: (x, y) float64 arrays in WebMercator
+"""
+
+
+def projeter(lat, lon, nb_threads=None, verifier=True):
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    x = np.empty(len(lat), dtype=np.float64)
+    y = np.empty(len(lat), dtype=np.float64)
+    if len(lat) == 0:
+        return x, y
+
+    blocs = [
+        (debut, min(debut + taille_bloc, len(lat)))
+        for debut in range(0, len(lat), taille_bloc)
+    ]
+    nb_threads = min(nb_threads or os.cpu_count() or 1, len(blocs))
+    if nb_threads == 1:
+        for debut, fin in blocs:
+            _projeter_bloc(lat, lon, x, y, debut, fin)
+    else:
+        with ThreadPoolExecutor(max_workers=nb_threads) as executeur:
+            # list() fait remonter l'exception d'un bloc
+            list(
+                executeur.map(lambda bloc: _projeter_bloc(lat, lon, x, y, *bloc), blocs)
+            )
+
+    if verifier:
+        ecart = ecart_pyproj(lat, lon, x, y)
+        if ecart > tolerance_projection:
+            print(f"Projection : écart de {ecart} m avec pyproj, projection par pyproj")
+            return projeter_pyproj(lat, lon)
+    return x, y
+
+
+############################################################################################################
+
+## MAIN
+
+############################################################################################################
+
+if __name__ == "__main__":
+    nb_points = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-85.0511, 85.0511, nb_points)
+    lon = rng.uniform(-180, 180, nb_points)
+
+    debut = time.perf_counter()
+    x_ref, y_ref = projeter_pyproj(lat, lon)
+    duree_pyproj = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    x, y = projeter(lat, lon, nb_threads=1, verifier=False)
+    duree_un_thread = time.perf_counter() - debut
+
+    debut = time.perf_counter()
+    x, y = projeter(lat, lon, verifier=False)
+    duree_threads = time.perf_counter() - debut
+
+    ecart = max(np.max(np.abs(x - x_ref)), np.max(np.abs(y - y_ref)))
+    print(f"{nb_points} positions, écart maximal avec pyproj : {ecart:.2e} m")
+    print(f"  pyproj : {duree_pyproj:.2f} s")
+    print(
+        f"  formule, 1 thread : {duree_un_thread:.2f} s ({duree_pyproj / duree_un_thread:.1f} x)"
+    )
+    print(
+        f"  formule, {os.cpu_count()} threads : {duree_threads:.2f} s ({duree_pyproj / duree_threads:.1f} x)"
+    )
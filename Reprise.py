@@ -0,0 +1,162 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import json
+import os
+
+############################################################################################################
+
+## Manifeste d'exécution pour la reprise des longues exécutions
+
+############################################################################################################
+
+# Le manifeste (manifeste.json dans le dossier de travail) enregistre les étapes terminées :
+#   - "etapes" : étapes globales terminées ("tri_csv")
+#   - "categories" : pour chaque catégorie, les étapes terminées ("rasterisation", "niveaux_zoom", "termine") et les tuiles produites
+#   - "parametres" : paramètres de l'exécution, une reprise n'est possible qu'avec les mêmes paramètres
+# Les fichiers intermédiaires sont écrits dans un fichier .tmp puis renommés : un fichier présent sous son nom final est complet.
+
+nom_manifeste = "manifeste.json"
+
+
+"""
+nouveau_manifeste creates an empty manifest.
+:param parametres: dictionary of the parameters of the run
+:return: the manifest
+"""
+
+
+def nouveau_manifeste(parametres):
+    return {"parametres": parametres, "etapes": [], "categories": {}}
+
+
+"""
+charger_manifeste loads the manifest of a previous run.
+:param Path_work: path to the work directory
+:param parametres: dictionary of the parameters of the run
+:return: the manifest, empty if there is none or if it was written with other parameters
+"""
+
+
+def charger_manifeste(Path_work, parametres):
+    chemin = os.path.join(Path_work, nom_manifeste)
+    if not os.path.exists(chemin):
+        print("Pas de manifeste d'une exécution précédente, l'exécution repart de zéro")
+        return nouveau_manifeste(parametres)
+
+    with open(chemin, "r", encoding="utf-8") as f:
+        manifeste = json.load(f)
+
+    if manifeste["parametres"] != parametres:
+        print(
+            "Le manifeste a été écrit avec d'autres paramètres, l'exécution repart de zéro"
+        )
+        return nouveau_manifeste(parametres)
+    return manifeste
+
+
+"""
+enregistrer_manifeste writes the manifest atomically.
+:param Path_work: path to the work directory
+:param manifeste: the manifest
+"""
+
+
+def enregistrer_manifeste(Path_work, manifeste):
+    os.makedirs(Path_work, exist_ok=True)
+    chemin = os.path.join(Path_work, nom_manifeste)
+    temp_path = chemin + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifeste, f, indent=1)
+    os.replace(temp_path, chemin)
+
+
+"""
+etape_terminee tells whether a stage is recorded as finished in the manifest.
+:param manifeste: the manifest
+:param etape: name of the stage
+:param categorie: category of the stage, None for a global stage
+:return: True if the stage is finished
+"""
+
+
+def etape_terminee(manifeste, etape, categorie=None):
+    if categorie is None:
+        return etape in manifeste["etapes"]
+    return etape in manifeste["categories"].get(categorie, {}).get("etapes", [])
+
+
+"""
+marquer_etape records a finished stage in the manifest and saves it.
+:param Path_work: path to the work directory
+:param manifeste: the manifest
+:param etape: name of the stage
+:param categorie: category of the stage, None for a global stage
+:param tuiles: list of the tiles produced by the stage, if any
+"""
+
+
+def marquer_etape(Path_work, manifeste, etape, categorie=None, tuiles=None):
+    if categorie is None:
+        manifeste["etapes"].append(etape)
+    else:
+        etat = manifeste["categories"].setdefault(
+            categorie, {"etapes": [], "tuiles": []}
+        )
+        etat["etapes"].append(etape)
+        if tuiles is not None:
+            etat["tuiles"] = sorted(tuiles)
+    enregistrer_manifeste(Path_work, manifeste)
+
+
+"""
+charger_tuiles rebuilds the tiles dictionary of tri_CSV from the tiles information file.
+:param Path_work: path to the work directory
+:return: a dictionary where each key is a tuple representing the tile indices, and values are tuples representing the boundaries of each tile.
+"""
+
+
+def charger_tuiles(Path_work):
+    import pandas as pd
+
+    data_tiles = pd.read_csv(os.path.join(Path_work, "Data_tuiles_info.csv"))
+    return {
+        (int(row.x_coord_tile), int(row.y_coord_tile)): (
+            row.min_lon,
+            row.min_lat,
+            row.max_lon,
+            row.max_lat,
+        )
+        for row in data_tiles.itertuples()
+    }
+
+
+"""
+supprimer_fichiers_partiels deletes the partly written files (.tmp) of a directory and its subdirectories.
+:param directory: path to the directory
+:return: number of deleted files
+"""
+
+
+def supprimer_fichiers_partiels(directory):
+    nb_fichiers = 0
+    for racine, _, fichiers in os.walk(directory):
+        for nom in fichiers:
+            if nom.endswith(".tmp"):
+                os.remove(os.path.join(racine, nom))
+                nb_fichiers += 1
+    return nb_fichiers
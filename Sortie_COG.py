@@ -0,0 +1,213 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+
+import numpy as np
+import rasterio
+from rasterio.enums import ColorInterp, Resampling
+from rasterio.shutil import copy as rasterio_copy
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+from Couleurs import reduction_max
+
+############################################################################################################
+
+## Sortie Cloud Optimized GeoTIFF
+
+############################################################################################################
+
+# Un seul raster par catégorie pour l'analyse SIG : les tuiles .tif du niveau le plus précis sont recopiées une à une, par bandes de lignes,
+# dans une mosaïque sur le disque dont les blocs vides ne sont pas écrits (SPARSE_OK),
+# puis les aperçus internes (overviews) sont calculés par bandes de lignes en gardant la vitesse maximale, comme pour les niveaux de zoom.
+# GDAL ne propose pas de rééchantillonnage "max" pour les aperçus : ils sont calculés ici puis écrits dans le fichier.
+
+# Taille des blocs internes du COG (en pixels)
+taille_bloc = 512
+
+
+"""
+profil_raster gives the rasterio profile of an uncompressed tiled RGBA GeoTIFF.
+:param width: width of the raster
+:param height: height of the raster
+:param transform: affine transform of the raster
+:return: rasterio profile
+"""
+
+
+def profil_raster(width, height, transform):
+    return {
+        "driver": "GTiff",
+        "width": width,
+        "height": height,
+        "count": 4,
+        "dtype": rasterio.uint8,
+        "crs": "EPSG:3857",
+        "transform": transform,
+        "tiled": True,
+        "blockxsize": taille_bloc,
+        "blockysize": taille_bloc,
+        # Les blocs vides ne sont pas écrits sur le disque
+        "SPARSE_OK": True,
+    }
+
+
+"""
+mosaique_base copies every base tile into one tiled GeoTIFF covering the whole extent.
+:param fichiers_tif: list of paths of the base .tif tiles
+:param resolution: resolution of the tiles
+:param chemin_base: path of the mosaic to create
+:return: (width, height) of the mosaic
+"""
+
+
+def mosaique_base(fichiers_tif, resolution, chemin_base):
+    emprises = []
+    for chemin in fichiers_tif:
+        with rasterio.open(chemin) as src:
+            emprises.append(src.bounds)
+    left = min(b.left for b in emprises)
+    top = max(b.top for b in emprises)
+    width = int(round((max(b.right for b in emprises) - left) / resolution))
+    height = int(round((top - min(b.bottom for b in emprises)) / resolution))
+
+    transform = from_origin(left, top, resolution, resolution)
+    with rasterio.open(
+        chemin_base, "w+", **profil_raster(width, height, transform)
+    ) as dst:
+        dst.colorinterp = [
+            ColorInterp.red,
+            ColorInterp.green,
+            ColorInterp.blue,
+            ColorInterp.alpha,
+        ]
+        for chemin, emprise in zip(fichiers_tif, emprises):
+            colonne = int(round((emprise.left - left) / resolution))
+            ligne_tuile = int(round((top - emprise.top) / resolution))
+            with rasterio.open(chemin) as src:
+                # Recopie par bandes de taille_bloc lignes : une tuile n'est jamais lue en entier
+                for ligne in range(0, src.height, taille_bloc):
+                    hauteur = min(taille_bloc, src.height - ligne)
+                    bande = src.read(window=Window(0, ligne, src.width, hauteur))
+                    if not bande[3].any():
+                        continue
+                    window = Window(colonne, ligne_tuile + ligne, src.width, hauteur)
+                    # Les tuiles de la dernière ligne débordent sur leurs voisines : on garde la vitesse maximale
+                    existant = dst.read(window=window)
+                    bande = np.where(bande[2:3] > existant[2:3], bande, existant)
+                    dst.write(bande, window=window)
+    return width, height
+
+
+"""
+niveau_apercu computes one overview level from the previous one, by bands of rows.
+:param chemin_source: path of the previous level
+:param chemin_niveau: path of the level to create
+"""
+
+
+def niveau_apercu(chemin_source, chemin_niveau):
+    with rasterio.open(chemin_source) as src:
+        width = (src.width + 1) // 2
+        height = (src.height + 1) // 2
+        transform = src.transform * src.transform.scale(2, 2)
+        with rasterio.open(
+            chemin_niveau, "w", **profil_raster(width, height, transform)
+        ) as dst:
+            for ligne in range(0, height, taille_bloc):
+                hauteur = min(taille_bloc, height - ligne)
+                bande = src.read(
+                    window=Window(0, 2 * ligne, src.width, 2 * hauteur),
+                    boundless=True,
+                    fill_value=0,
+                ).transpose(1, 2, 0)
+                # Compléter à une largeur paire
+                if bande.shape[1] % 2:
+                    bande = np.pad(bande, ((0, 0), (0, 1), (0, 0)))
+                dst.write(
+                    reduction_max(bande).transpose(2, 0, 1),
+                    window=Window(0, ligne, width, hauteur),
+                )
+
+
+"""
+creer_cog creates one Cloud Optimized GeoTIFF from the base tiles of a category, with overviews keeping the maximum speed.
+:param tiles_producted_directory: path to the .tif files of the most precise zoom level
+:param resolution: resolution of the tiles
+:param chemin_cog: path of the COG to create
+"""
+
+
+def creer_cog(tiles_producted_directory, resolution, chemin_cog):
+    fichiers_tif = sorted(
+        os.path.join(tiles_producted_directory, nom)
+        for nom in os.listdir(tiles_producted_directory)
+        if nom.endswith(".tif")
+    )
+    if not fichiers_tif:
+        print(f"Aucune tuile dans {tiles_producted_directory}, pas de COG créé")
+        return
+
+    chemin_base = chemin_cog + ".base.tif"
+    width, height = mosaique_base(fichiers_tif, resolution, chemin_base)
+
+    # Niveaux d'aperçus jusqu'à ce que l'image tienne dans un bloc
+    chemins_niveaux = []
+    chemin_source = chemin_base
+    while width > taille_bloc or height > taille_bloc:
+        chemin_niveau = f"{chemin_cog}.apercu{len(chemins_niveaux) + 1}.tif"
+        niveau_apercu(chemin_source, chemin_niveau)
+        chemins_niveaux.append(chemin_niveau)
+        chemin_source = chemin_niveau
+        width = (width + 1) // 2
+        height = (height + 1) // 2
+
+    if chemins_niveaux:
+        # Réserver les aperçus dans la mosaïque puis y recopier les niveaux calculés, bande par bande
+        with rasterio.open(chemin_base, "r+") as dst:
+            dst.build_overviews(
+                [2**i for i in range(1, len(chemins_niveaux) + 1)],
+                Resampling.nearest,
+            )
+        for i, chemin_niveau in enumerate(chemins_niveaux):
+            with rasterio.open(chemin_niveau) as src, rasterio.open(
+                chemin_base, "r+", overview_level=i
+            ) as dst:
+                for ligne in range(0, dst.height, taille_bloc):
+                    window = Window(
+                        0, ligne, dst.width, min(taille_bloc, dst.height - ligne)
+                    )
+                    dst.write(
+                        src.read(window=window, boundless=True, fill_value=0),
+                        window=window,
+                    )
+
+    temp_path = chemin_cog + ".tmp"
+    rasterio_copy(
+        chemin_base,
+        temp_path,
+        driver="COG",
+        COMPRESS="DEFLATE",
+        BLOCKSIZE=taille_bloc,
+        OVERVIEWS="FORCE_USE_EXISTING",
+    )
+    os.replace(temp_path, chemin_cog)
+
+    for chemin in [chemin_base] + chemins_niveaux:
+        os.remove(chemin)
+    print(f"COG créé à l'emplacement : {chemin_cog}")
@@ -0,0 +1,558 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+import struct
+from multiprocessing import Pool
+
+import numpy as np
+
+from Ecriture_asynchrone import writer_processus, ecrire_octets
+from Execution_pool import executer_pool
+from Index_tuiles import supprimer_absents
+from Trace import mesure
+
+############################################################################################################
+
+## Sortie Mapbox Vector Tiles pour les niveaux de zoom les plus précis
+
+############################################################################################################
+
+# Aux zooms élevés, les tuiles raster sont très nombreuses et presque vides : les positions y sont écrites comme des points vectoriels
+# (format Mapbox Vector Tile 2.1, tuiles XYZ {z}/{x}/{y}.pbf), avec la vitesse, la catégorie et le nombre de rapports de chaque point.
+# L'encodage protobuf est fait à la main et vectorisé avec numpy : toutes les tuiles d'un groupe de tuiles sont encodées d'un coup.
+# Les points de chaque catégorie sont triés une fois dans l'ordre de Morton des tuiles du zoom le plus précis : à chaque niveau, les points
+# d'une tuile sont contigus, et les tuiles sont confiées aux processus par groupes d'au plus taille_groupe points, ce qui borne la mémoire de l'encodage.
+# Au-delà d'un budget de points par tuile, les points sont regroupés sur une grille de plus en plus grossière (en gardant le plus rapide) :
+# le résultat ne dépend que des données.
+
+# Demi-côté de la projection WebMercator (EPSG:3857), en mètres
+origine = 20037508.342789244
+
+# Nombre de positions par côté de tuile (résolution des coordonnées d'une tuile vectorielle)
+etendue = 4096
+
+# Attributs des points, dans l'ordre des clés de chaque couche
+cles = ["speed", "QO_category", "count"]
+
+# Nombre de points encodés d'un coup par un processus (une tuile plus chargée est encodée seule)
+taille_groupe = 1000000
+
+
+"""
+positions_entieres gives the position of points in units of 1 / etendue of a tile, counted from the north-west corner of the world.
+:param x, y: WebMercator coordinates of the points
+:param zoom: zoom level
+:return: (gx, gy) int64 arrays; the tile is (gx // etendue, gy // etendue), the position in the tile (gx % etendue, gy % etendue)
+"""
+
+
+def positions_entieres(x, y, zoom):
+    cote = etendue * 2**zoom
+    gx = np.clip(np.floor((x + origine) / (2 * origine) * cote), 0, cote - 1)
+    gy = np.clip(np.floor((origine - y) / (2 * origine) * cote), 0, cote - 1)
+    return gx.astype(np.int64), gy.astype(np.int64)
+
+
+"""
+cle_morton interleaves the bits of the tile indices: the tiles of a zoom level sorted by key are sorted by key >> 2 at the zoom level below.
+:param tx, ty: tile indices (lower than 2**31)
+:return: int64 array of the keys
+"""
+
+
+def cle_morton(tx, ty):
+    cle = np.zeros(len(tx), dtype=np.int64)
+    for bit in range(31):
+        cle |= ((tx >> bit) & 1) << (2 * bit + 1)
+        cle |= ((ty >> bit) & 1) << (2 * bit)
+    return cle
+
+
+"""
+varints encodes an array of non-negative integers as protobuf varints.
+:param valeurs: 2D array of non-negative integers (lower than 2**35)
+:return: (bytes array (rows, columns, 5), number of bytes of each varint)
+"""
+
+
+def varints(valeurs):
+    valeurs = valeurs.astype(np.uint64)
+    longueurs = np.ones(valeurs.shape, dtype=np.int64)
+    for k in range(1, 5):
+        longueurs += valeurs >= np.uint64(1 << (7 * k))
+    octets = np.empty(valeurs.shape + (5,), dtype=np.uint8)
+    for k in range(5):
+        octet = (valeurs >> np.uint64(7 * k)) & np.uint64(0x7F)
+        # Bit de continuation sur tous les octets sauf le dernier
+        octet |= np.where(k < longueurs - 1, np.uint64(0x80), np.uint64(0))
+        octets[..., k] = octet
+    return octets, longueurs
+
+
+"""
+varint encodes one non-negative integer as a protobuf varint.
+:param valeur: integer
+:return: bytes
+"""
+
+
+def varint(valeur):
+    octets = bytearray()
+    while valeur >= 0x80:
+        octets.append((valeur & 0x7F) | 0x80)
+        valeur >>= 7
+    octets.append(valeur)
+    return bytes(octets)
+
+
+"""
+champ_message encodes a length-delimited protobuf field.
+:param numero: number of the field
+:param contenu: encoded content of the field
+:return: bytes
+"""
+
+
+def champ_message(numero, contenu):
+    return varint((numero << 3) | 2) + varint(len(contenu)) + contenu
+
+
+"""
+encoder_valeur encodes a Value message of a layer.
+:param valeur: float (double_value), integer (uint_value) or string (string_value)
+:return: bytes of the field values of a layer
+"""
+
+
+def encoder_valeur(valeur):
+    if isinstance(valeur, str):
+        contenu = champ_message(1, valeur.encode("utf-8"))
+    elif isinstance(valeur, (int, np.integer)):
+        contenu = b"\x28" + varint(int(valeur))
+    else:
+        contenu = b"\x19" + struct.pack("<d", float(valeur))
+    return champ_message(4, contenu)
+
+
+"""
+rangs_par_tuile numbers the distinct values of each tile.
+:param tuile: number of the tile of each point
+:param valeur: value of each point
+:return:
+    - rang: index of the value of each point among the distinct values of its tile
+    - tuiles_uniques, valeurs_uniques: distinct (tile, value) pairs, sorted by tile then value
+"""
+
+
+def rangs_par_tuile(tuile, valeur):
+    ordre = np.lexsort((valeur, tuile))
+    t = tuile[ordre]
+    v = valeur[ordre]
+    nouveau = np.ones(len(t), dtype=bool)
+    nouveau[1:] = (t[1:] != t[:-1]) | (v[1:] != v[:-1])
+    debut_tuile = np.ones(len(t), dtype=bool)
+    debut_tuile[1:] = t[1:] != t[:-1]
+
+    numero = np.cumsum(nouveau) - 1
+    premier = np.maximum.accumulate(np.where(debut_tuile, numero, 0))
+    rang = np.empty(len(t), dtype=np.int64)
+    rang[ordre] = numero - premier
+    return rang, t[nouveau], v[nouveau]
+
+
+"""
+amincir keeps at most budget points per tile: the points are grouped on the coarsest grid needed, keeping in each cell the fastest point.
+:param tuile: number of the tile of each point
+:param ix, iy: position of each point in its tile (0 to etendue - 1)
+:param speed: speed of each point
+:param count: number of reports of each point
+:param budget: maximum number of points per tile
+:return: (indices of the points kept, number of reports of each point kept), sorted by tile
+"""
+
+
+def amincir(tuile, ix, iy, speed, count, budget):
+    # Pour chaque tuile, plus petit décalage (grille de etendue >> decalage cellules par côté) qui respecte le budget
+    decalage = np.full(len(tuile), -1, dtype=np.int64)
+    for d in range(int(np.log2(etendue)) + 1):
+        a_traiter = decalage < 0
+        if not a_traiter.any():
+            break
+        cellule = np.unique(
+            np.stack([tuile[a_traiter], ix[a_traiter] >> d, iy[a_traiter] >> d]), axis=1
+        )
+        tuiles_cellules, nb_cellules = np.unique(cellule[0], return_counts=True)
+        respecte = np.isin(tuile, tuiles_cellules[nb_cellules <= budget]) & a_traiter
+        decalage[respecte] = d
+    # Une tuile plus chargée que le budget sur une seule cellule n'existe pas : la dernière grille n'a qu'une cellule
+    cx = ix >> decalage
+    cy = iy >> decalage
+
+    # Dans chaque cellule, le point le plus rapide représente la cellule (à vitesse égale, le premier dans l'ordre des données)
+    ordre = np.lexsort((np.arange(len(tuile)), -speed, cy, cx, tuile))
+    t, x, y = tuile[ordre], cx[ordre], cy[ordre]
+    debut = np.ones(len(t), dtype=bool)
+    debut[1:] = (t[1:] != t[:-1]) | (x[1:] != x[:-1]) | (y[1:] != y[:-1])
+    groupes = np.flatnonzero(debut)
+    return ordre[groupes], np.add.reduceat(count[ordre], groupes)
+
+
+"""
+encoder_niveau encodes the vector tiles of one category at one zoom level.
+:param gx, gy: positions of the points at this zoom level (see positions_entieres)
+:param speed: speed of each point
+:param categorie: category of each point (strings)
+:param count: number of reports of each point
+:param zoom: zoom level
+:param nom_couche: name of the layer
+:param budget: maximum number of points per tile
+:return: dictionary {(x tile, y tile): encoded tile}
+"""
+
+
+def encoder_niveau(gx, gy, speed, categorie, count, zoom, nom_couche, budget):
+    nb_tuiles = 2**zoom
+
+    # Tuile XYZ (y vers le bas depuis le nord) et position du point dans la tuile
+    tx, ix = np.divmod(gx, etendue)
+    ty, iy = np.divmod(gy, etendue)
+    tuile = tx * nb_tuiles + ty
+
+    garde, count = amincir(tuile, ix, iy, speed, count, budget)
+    tuile, ix, iy, speed, categorie = (
+        tuile[garde],
+        ix[garde],
+        iy[garde],
+        speed[garde],
+        categorie[garde],
+    )
+
+    # Index des valeurs des attributs dans la table de valeurs de chaque tuile : vitesses, puis catégories, puis nombres de rapports
+    noms_categorie, codes_categorie = np.unique(categorie, return_inverse=True)
+    rang_speed, tuiles_speed, valeurs_speed = rangs_par_tuile(tuile, speed)
+    rang_cat, tuiles_cat, valeurs_cat = rangs_par_tuile(tuile, codes_categorie)
+    rang_count, tuiles_count, valeurs_count = rangs_par_tuile(tuile, count)
+
+    tuiles_uniques = np.unique(tuile)
+    position = np.searchsorted(tuiles_uniques, tuile)
+    nb_speed = np.bincount(np.searchsorted(tuiles_uniques, tuiles_speed))
+    nb_cat = np.bincount(np.searchsorted(tuiles_uniques, tuiles_cat))
+    index_cat = rang_cat + nb_speed[position]
+    index_count = rang_count + nb_speed[position] + nb_cat[position]
+
+    # Encodage de tous les points (Feature) : tags = [0, vitesse, 1, catégorie, 2, nombre], type = POINT, geometry = [MoveTo(1), x, y]
+    # (coordonnées positives : le codage zigzag revient à multiplier par 2)
+    variables, lv = varints(
+        np.stack([rang_speed, index_cat, index_count, 2 * ix, 2 * iy], axis=1)
+    )
+    longueur_tags = 3 + lv[:, 0] + lv[:, 1] + lv[:, 2]
+    longueur_geometrie = 1 + lv[:, 3] + lv[:, 4]
+    longueur_feature = 2 + longueur_tags + 2 + 2 + longueur_geometrie
+    entetes, le = varints(
+        np.stack([longueur_feature, longueur_tags, longueur_geometrie], axis=1)
+    )
+
+    n = len(tuile)
+
+    def constante(octet):
+        return np.full((n, 1, 5), octet, dtype=np.uint8), np.ones((n, 1), dtype=np.int64)
+
+    def colonne(octets, longueurs, i):
+        return octets[:, i : i + 1], longueurs[:, i : i + 1]
+
+    # Jetons d'un point dans l'ordre d'écriture, chacun étant un varint
+    jetons = [
+        constante(0x12),  # champ features de la couche
+        colonne(entetes, le, 0),
+        constante(0x12),  # champ tags
+        colonne(entetes, le, 1),
+        constante(0),
+        colonne(variables, lv, 0),
+        constante(1),
+        colonne(variables, lv, 1),
+        constante(2),
+        colonne(variables, lv, 2),
+        constante(0x18),  # champ type : POINT
+        constante(1),
+        constante(0x22),  # champ geometry
+        colonne(entetes, le, 2),
+        constante(9),  # MoveTo d'un point
+        colonne(variables, lv, 3),
+        colonne(variables, lv, 4),
+    ]
+    octets = np.concatenate([jeton[0] for jeton in jetons], axis=1)
+    longueurs = np.concatenate([jeton[1] for jeton in jetons], axis=1)
+    points = octets[np.arange(5) < longueurs[..., None]].tobytes()
+    fin_points = np.concatenate([[0], np.cumsum(longueurs.sum(axis=1))])
+
+    # Les points sont triés par tuile (amincir) : chaque tuile est une tranche des octets encodés
+    debut_tuiles = np.searchsorted(tuile, tuiles_uniques)
+    fin_tuiles = np.searchsorted(tuile, tuiles_uniques, side="right")
+
+    def tables_valeurs(tuiles_valeurs, valeurs_uniques, convertir):
+        debut = np.searchsorted(tuiles_valeurs, tuiles_uniques)
+        fin = np.searchsorted(tuiles_valeurs, tuiles_uniques, side="right")
+        return [
+            b"".join(encoder_valeur(convertir(v)) for v in valeurs_uniques[d:f])
+            for d, f in zip(debut, fin)
+        ]
+
+    tables_speed = tables_valeurs(tuiles_speed, valeurs_speed, float)
+    tables_cat = tables_valeurs(
+        tuiles_cat, valeurs_cat, lambda code: str(noms_categorie[code])
+    )
+    tables_count = tables_valeurs(tuiles_count, valeurs_count, int)
+
+    entete_couche = b"\x78\x02" + champ_message(1, nom_couche.encode("utf-8"))
+    table_cles = b"".join(champ_message(3, cle.encode("utf-8")) for cle in cles)
+    champ_etendue = b"\x28" + varint(etendue)
+
+    resultat = {}
+    for i, numero in enumerate(tuiles_uniques):
+        couche = (
+            entete_couche
+            + points[fin_points[debut_tuiles[i]] : fin_points[fin_tuiles[i]]]
+            + table_cles
+            + tables_speed[i]
+            + tables_cat[i]
+            + tables_count[i]
+            + champ_etendue
+        )
+        resultat[(int(numero // nb_tuiles), int(numero % nb_tuiles))] = champ_message(
+            3, couche
+        )
+    return resultat
+
+
+# Page de visualisation des tuiles vectorielles (OpenLayers), couleur de vert (0 noeud) à bleu (20 noeuds et plus) comme les tuiles raster
+modele_page = """<!DOCTYPE html>
+<html>
+<head>
+<title>{categorie} - tuiles vectorielles</title>
+<meta charset="utf-8">
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/ol@v9.2.4/ol.css">
+<script src="https://cdn.jsdelivr.net/npm/ol@v9.2.4/dist/ol.js"></script>
+<style>html, body, #map {{ margin: 0; width: 100%; height: 100%; }}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+function couleur(speed) {{
+    var t = Math.min(Math.max(speed, 0), 20) / 20;
+    return "rgb(" + Math.round(45 * (1 - t)) + "," + Math.round(255 * (1 - t)) + "," + Math.round(45 + 210 * t) + ")";
+}}
+var styles = {{}};
+var map = new ol.Map({{
+    target: "map",
+    layers: [
+        new ol.layer.Tile({{source: new ol.source.OSM()}}),
+        new ol.layer.VectorTile({{
+            declutter: false,
+            source: new ol.source.VectorTile({{
+                format: new ol.format.MVT(),
+                url: "mvt/{{z}}/{{x}}/{{y}}.pbf",
+                minZoom: {zoom_min},
+                maxZoom: {zoom_max}
+            }}),
+            minZoom: {zoom_min},
+            style: function (feature) {{
+                var speed = Math.round(feature.get("speed"));
+                if (!styles[speed]) {{
+                    styles[speed] = new ol.style.Style({{
+                        image: new ol.style.Circle({{radius: 3, fill: new ol.style.Fill({{color: couleur(speed)}})}})
+                    }});
+                }}
+                return styles[speed];
+            }}
+        }})
+    ],
+    view: new ol.View({{center: [0, 0], zoom: {zoom_min}}})
+}});
+</script>
+</body>
+</html>
+"""
+
+
+"""
+encoder_groupe encodes the vector tiles of a group of tiles at one zoom level and submits them to the writer.
+:param gx, gy: positions of the points of the tiles at the most precise zoom level (see positions_entieres)
+:param decalage: number of zoom levels between the most precise zoom level and this one
+:param speed: speed of each point
+:param categorie: category of each point (strings)
+:param count: number of reports of each point
+:param zoom: zoom level
+:param nom_couche: name of the layer
+:param budget: maximum number of points per tile
+:param mvt_directories: paths to the mvt directories where the tiles are written
+:return: ({mvt directory: paths of the tiles written}, number of tiles, number of bytes of the tiles)
+"""
+
+
+def encoder_groupe(
+    gx, gy, decalage, speed, categorie, count, zoom, nom_couche, budget, mvt_directories
+):
+    with mesure(f"{nom_couche} zoom {zoom}", "mvt", points=len(gx)) as infos:
+        tuiles = encoder_niveau(
+            gx >> decalage,
+            gy >> decalage,
+            speed,
+            categorie,
+            count,
+            zoom,
+            nom_couche,
+            budget,
+        )
+        infos["tuiles"] = len(tuiles)
+
+    writer = writer_processus()
+    ecrites = {mvt_directory: [] for mvt_directory in mvt_directories}
+    nb_octets = 0
+    for (tx, ty), contenu in tuiles.items():
+        nb_octets += len(contenu)
+        # Une même tuile est écrite dans chaque carte dont elle dépasse les niveaux raster
+        for mvt_directory in mvt_directories:
+            dossier = os.path.join(mvt_directory, str(zoom), str(tx))
+            os.makedirs(dossier, exist_ok=True)
+            chemin = os.path.join(dossier, f"{ty}.pbf")
+            ecrites[mvt_directory].append(chemin)
+            # Une tuile identique à celle de l'exécution précédente n'est pas réécrite
+            writer.soumettre(
+                chemin, ecrire_octets, contenu, os.path.dirname(mvt_directory)
+            )
+    return ecrites, len(tuiles), nb_octets
+
+
+"""
+groupes_tuiles splits points sorted by tile into groups of whole tiles of about taille_groupe points.
+:param cles: key of the tile of each point, sorted
+:return: list of (start, end) of the groups, the largest group first
+"""
+
+
+def groupes_tuiles(cles):
+    debuts_tuiles = np.flatnonzero(np.append(True, cles[1:] != cles[:-1]))
+    groupe = debuts_tuiles // taille_groupe
+    coupures = debuts_tuiles[np.append(True, groupe[1:] != groupe[:-1])]
+    bornes = list(zip(coupures, np.append(coupures[1:], len(cles))))
+    return sorted(bornes, key=lambda borne: borne[0] - borne[1])
+
+
+"""
+creer_mvt creates the vector tiles of every category, for the zoom levels above the raster zoom levels.
+:param data: points with the columns lon, lat (WebMercator), speed and QO_category
+:param Path_works: paths to the work directories of the maps
+:param zooms_min: first vector zoom level of each map
+:param zoom_max: last vector zoom level
+:param budget: maximum number of points per tile
+"""
+
+
+def creer_mvt(data, Path_works, zooms_min, zoom_max, budget):
+    if not any(zoom_min <= zoom_max for zoom_min in zooms_min):
+        return
+
+    # Les positions hors de la projection WebMercator (pôles) ne peuvent pas être placées dans une tuile
+    data = data[np.isfinite(data["lon"].values) & np.isfinite(data["lat"].values)]
+    categories = list(data["QO_category"].unique()) + ["All"]
+    # Tuiles écrites dans le dossier mvt de chaque catégorie de chaque carte
+    ecrites = {
+        os.path.join(Path_work, categorie, "mvt"): set()
+        for Path_work in Path_works
+        for categorie in categories
+    }
+
+    # Un seul pool pour tous les niveaux de toutes les catégories : chaque tâche attend la fin de ses écritures
+    with Pool() as pool:
+        for categorie in categories:
+            if categorie == "All":
+                data_cat = data
+            else:
+                data_cat = data[data["QO_category"].values == categorie]
+            gx, gy = positions_entieres(
+                data_cat["lon"].values, data_cat["lat"].values, zoom_max
+            )
+            # Points triés une fois pour toutes dans l'ordre de Morton des tuiles du zoom le plus précis
+            morton = cle_morton(gx // etendue, gy // etendue)
+            ordre = np.argsort(morton, kind="stable")
+            morton = morton[ordre]
+            gx = gx[ordre]
+            gy = gy[ordre]
+            speed = data_cat["speed"].values.astype(np.float64)[ordre]
+            categorie_points = data_cat["QO_category"].values.astype(str)[ordre]
+            count = np.ones(len(data_cat), dtype=np.int64)
+
+            for zoom in range(min(zooms_min), zoom_max + 1):
+                mvt_directories = [
+                    os.path.join(Path_work, categorie, "mvt")
+                    for Path_work, zoom_min in zip(Path_works, zooms_min)
+                    if zoom >= zoom_min
+                ]
+                decalage = zoom_max - zoom
+                resultats = executer_pool(
+                    encoder_groupe,
+                    [
+                        (
+                            gx[debut:fin],
+                            gy[debut:fin],
+                            decalage,
+                            speed[debut:fin],
+                            categorie_points[debut:fin],
+                            count[debut:fin],
+                            zoom,
+                            categorie,
+                            budget,
+                            mvt_directories,
+                        )
+                        for debut, fin in groupes_tuiles(morton >> (2 * decalage))
+                    ],
+                    pool,
+                )
+                nb_tuiles = 0
+                nb_octets = 0
+                for ecrites_groupe, tuiles_groupe, octets_groupe in resultats:
+                    for mvt_directory, chemins in ecrites_groupe.items():
+                        ecrites[mvt_directory].update(chemins)
+                    nb_tuiles += tuiles_groupe
+                    nb_octets += octets_groupe
+                print(
+                    f"Tuiles vectorielles de la catégorie {categorie} au zoom {zoom} : {nb_tuiles} tuiles, {nb_octets / 1e6:.1f} Mo"
+                )
+
+            for Path_work, zoom_min in zip(Path_works, zooms_min):
+                if zoom_min <= zoom_max:
+                    with open(
+                        os.path.join(Path_work, categorie, "mvt.html"),
+                        "w",
+                        encoding="utf-8",
+                    ) as f:
+                        f.write(
+                            modele_page.format(
+                                categorie=categorie,
+                                zoom_min=zoom_min,
+                                zoom_max=zoom_max,
+                            )
+                        )
+        # close + join (et non terminate) pour que les processus finissent leurs écritures en arrière-plan
+        pool.close()
+        pool.join()
+
+    # Les tuiles d'une exécution précédente qui n'ont plus de position sont supprimées
+    for mvt_directory, chemins in ecrites.items():
+        if os.path.exists(mvt_directory):
+            supprimer_absents(mvt_directory, chemins, os.path.dirname(mvt_directory))
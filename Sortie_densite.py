@@ -0,0 +1,355 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+import tempfile
+
+import numpy as np
+
+from Apercu_progressif import publier_page
+from Ecriture_asynchrone import writer_processus, vider_ecritures, ecrire_png
+from Index_tuiles import supprimer_absents
+from Sortie_MVT import origine
+from Trace import mesure
+
+############################################################################################################
+
+## Cartes de densité (heatmap)
+
+############################################################################################################
+
+# Les rapports AIS sont comptés par pixel des tuiles du zoom zoom_max_densite (une grille de 256 x 256 par tuile occupée),
+# puis chaque niveau moins précis est déduit du précédent en sommant les pixels 2 x 2 : le coût d'un niveau dépend du nombre de tuiles, pas du nombre de rapports.
+# Les comptes de chaque niveau sont gardés dans des fichiers temporaires projetés en mémoire (np.memmap) : la mémoire occupée ne dépend pas du nombre de tuiles.
+# Chaque niveau est lissé deux fois, tuile par tuile : une première fois pour le maximum qui fixe l'échelle des couleurs, une seconde pour colorer et écrire les tuiles
+# (recalculer un lissage coûte moins que d'écrire et relire les densités lissées sur le disque).
+# Chaque grille est lissée par un noyau gaussien séparable (deux produits matriciels), avec une marge prise dans les tuiles voisines
+# pour qu'il n'y ait pas de coupure aux bords des tuiles. La largeur du noyau (en pixels) augmente aux niveaux moins précis,
+# où les positions isolées seraient sinon invisibles. La densité est colorée sur une échelle logarithmique, normalisée par niveau.
+# Les tuiles sont écrites dans le dossier densite de chaque catégorie, avec la page densite.html.
+
+# Côté des tuiles en pixels
+taille_tuile = 256
+
+# Table de couleurs de la densité (faible -> forte) : transparent, bleu, cyan, vert, jaune, rouge
+points_couleurs = np.array([0, 0.15, 0.35, 0.55, 0.75, 1.0])
+couleurs = np.array(
+    [
+        [0, 0, 255, 0],
+        [0, 0, 255, 160],
+        [0, 255, 255, 190],
+        [0, 255, 0, 210],
+        [255, 255, 0, 230],
+        [255, 0, 0, 255],
+    ]
+)
+lut_densite = np.stack(
+    [
+        np.interp(np.linspace(0, 1, 256), points_couleurs, couleurs[:, c])
+        for c in range(4)
+    ],
+    axis=1,
+).astype(np.uint8)
+
+
+"""
+noyau_gaussien gives the matrix that smooths a grid with halo along one axis.
+:param sigma: standard deviation of the kernel in pixels
+:param marge: width of the halo on each side, in pixels
+:return: array (256, 256 + 2 * marge), row i holds the kernel centred on pixel i of the tile
+"""
+
+
+def noyau_gaussien(sigma, marge):
+    decalage = np.arange(-marge, marge + 1)
+    noyau = np.exp(-0.5 * (decalage / sigma) ** 2)
+    noyau /= noyau.sum()
+    matrice = np.zeros((taille_tuile, taille_tuile + 2 * marge), dtype=np.float32)
+    for i in range(taille_tuile):
+        matrice[i, i : i + 2 * marge + 1] = noyau
+    return matrice
+
+
+def _cle(tx, ty):
+    return (np.asarray(tx, dtype=np.int64) << 32) | np.asarray(ty, dtype=np.int64)
+
+
+def _grilles_disque(dossier, nom, nombre):
+    # Grilles d'un niveau dans un fichier projeté en mémoire : le système ne garde en mémoire que les pages utilisées
+    if nombre == 0:
+        return np.zeros((0, taille_tuile, taille_tuile), dtype=np.float32)
+    return np.memmap(
+        os.path.join(dossier, nom),
+        dtype=np.float32,
+        mode="w+",
+        shape=(nombre, taille_tuile, taille_tuile),
+    )
+
+
+def _supprimer(dossier, nom):
+    chemin = os.path.join(dossier, nom)
+    if os.path.exists(chemin):
+        os.remove(chemin)
+
+
+"""
+comptes_base counts the points in the pixels of the tiles of one zoom level.
+:param x: x of the points (WebMercator)
+:param y: y of the points (WebMercator)
+:param zoom: zoom level
+:param dossier: directory of the temporary file of the counts
+:return: (sorted keys x * 2**32 + y of the occupied tiles, y counted from the top, array (number of tiles, 256, 256) of the number of points of each pixel, on disk)
+"""
+
+
+def comptes_base(x, y, zoom, dossier):
+    cote = taille_tuile * 2**zoom
+    col = np.clip(((x + origine) / (2 * origine) * cote).astype(np.int64), 0, cote - 1)
+    row = np.clip(((origine - y) / (2 * origine) * cote).astype(np.int64), 0, cote - 1)
+
+    # Regroupement des points par tuile, puis un seul comptage par tuile
+    tuile = _cle(col // taille_tuile, row // taille_tuile)
+    ordre = np.argsort(tuile, kind="stable")
+    tuile = tuile[ordre]
+    pixel = (row[ordre] % taille_tuile) * taille_tuile + col[ordre] % taille_tuile
+    cles, debuts = np.unique(tuile, return_index=True)
+    fins = np.append(debuts[1:], len(tuile))
+
+    grilles = _grilles_disque(dossier, f"comptes_{zoom}.dat", len(cles))
+    for i, (debut, fin) in enumerate(zip(debuts, fins)):
+        grilles[i] = np.bincount(
+            pixel[debut:fin], minlength=taille_tuile * taille_tuile
+        ).reshape(taille_tuile, taille_tuile)
+    return cles, grilles
+
+
+"""
+reduire_comptes derives the counts of the zoom level below by summing the pixels 2 x 2.
+:param cles: keys of the tiles of a zoom level (see comptes_base)
+:param grilles: counts of the tiles of the zoom level (see comptes_base)
+:param zoom: zoom level below
+:param dossier: directory of the temporary file of the counts
+:return: (keys, counts) of the tiles of the zoom level below
+"""
+
+
+def reduire_comptes(cles, grilles, zoom, dossier):
+    tx = cles >> 32
+    ty = cles & 0xFFFFFFFF
+    parents = _cle(tx // 2, ty // 2)
+    cles_parents = np.unique(parents)
+    indices = np.searchsorted(cles_parents, parents)
+    demi = taille_tuile // 2
+
+    # Une tuile à la fois : chaque tuile réduite de moitié remplit un quart de sa tuile parente
+    reduites = _grilles_disque(dossier, f"comptes_{zoom}.dat", len(cles_parents))
+    for i in range(len(cles)):
+        ligne = int(ty[i] % 2) * demi
+        colonne = int(tx[i] % 2) * demi
+        reduites[indices[i], ligne : ligne + demi, colonne : colonne + demi] = (
+            grilles[i].reshape(demi, 2, demi, 2).sum(axis=(1, 3))
+        )
+    return cles_parents, reduites
+
+
+"""
+lisser_niveau smooths the counts of every tile of one zoom level, the halo of each tile coming from its neighbours.
+:param cles: keys of the tiles of the zoom level (see comptes_base)
+:param grilles: counts of the tiles of the zoom level (see comptes_base)
+:param zoom: zoom level
+:param sigma: standard deviation of the kernel in pixels
+:return: iterator of ((x, y) of the tile, smoothed array (256, 256)), for every tile of the level reached by the kernel
+"""
+
+
+def lisser_niveau(cles, grilles, zoom, sigma):
+    # Marge de 3 écarts-types, limitée aux tuiles voisines directes
+    marge = min(int(np.ceil(3 * sigma)), taille_tuile)
+    noyau = noyau_gaussien(sigma, marge)
+    vide = np.zeros((taille_tuile, taille_tuile), dtype=np.float32)
+
+    def grille(tx, ty):
+        if not 0 <= tx < 2**zoom or not 0 <= ty < 2**zoom:
+            return vide
+        cle = int(_cle(tx, ty))
+        i = int(np.searchsorted(cles, cle))
+        return grilles[i] if i < len(cles) and cles[i] == cle else vide
+
+    # Les tuiles vides voisines d'une tuile occupée reçoivent une partie de sa densité
+    tx = cles >> 32
+    ty = cles & 0xFFFFFFFF
+    voisins_x = (tx[:, None] + np.array([-1, 0, 1] * 3)).reshape(-1)
+    voisins_y = (ty[:, None] + np.repeat([-1, 0, 1], 3)).reshape(-1)
+    dans_niveau = (
+        (voisins_x >= 0)
+        & (voisins_x < 2**zoom)
+        & (voisins_y >= 0)
+        & (voisins_y < 2**zoom)
+    )
+    a_lisser = np.unique(_cle(voisins_x[dans_niveau], voisins_y[dans_niveau]))
+    for cle in a_lisser:
+        tx, ty = int(cle >> 32), int(cle & 0xFFFFFFFF)
+        voisinage = np.block(
+            [
+                [grille(tx + dx, ty + dy) for dx in (-1, 0, 1)]
+                for dy in (-1, 0, 1)
+            ]
+        )
+        zone = voisinage[
+            taille_tuile - marge : 2 * taille_tuile + marge,
+            taille_tuile - marge : 2 * taille_tuile + marge,
+        ]
+        yield (tx, ty), noyau @ zone @ noyau.T
+
+
+"""
+tuile_dans_emprise tells whether a tile of a zoom level meets the extent of the map.
+:param tx: x of the tile
+:param ty: y of the tile, counted from the top
+:param zoom: zoom level
+:param extent: extent of the map (min_x, min_y, max_x, max_y in WebMercator), None for the whole world
+:return: True if the tile meets the extent
+"""
+
+
+def tuile_dans_emprise(tx, ty, zoom, extent):
+    if extent is None:
+        return True
+    min_x, min_y, max_x, max_y = extent
+    cote = 2 * origine / 2**zoom
+    gauche = -origine + tx * cote
+    haut = origine - ty * cote
+    return (
+        gauche < max_x
+        and gauche + cote > min_x
+        and haut - cote < max_y
+        and haut > min_y
+    )
+
+
+"""
+colorer_densite converts a smoothed density into a RGBA image.
+:param densite: smoothed array (256, 256)
+:param echelle: log(1 + maximum density of the zoom level)
+:return: RGBA array (256, 256, 4)
+"""
+
+
+def colorer_densite(densite, echelle):
+    intensite = np.log1p(np.maximum(densite, 0)) / max(echelle, 1e-12)
+    return lut_densite[np.clip(intensite * 255, 0, 255).astype(np.uint8)]
+
+
+"""
+creer_densite creates the heatmap tiles of every category, for the zoom levels zoom_min to zoom_max.
+:param data: points with the columns lon, lat (WebMercator) and QO_category
+:param Path_works: paths to the work directories of the maps
+:param zoom_max: most precise zoom level of the heatmap
+:param rayon: standard deviation of the kernel in pixels at zoom_max
+:param croissance: factor applied to the standard deviation at each less precise zoom level
+:param extent: extent of the map (min_x, min_y, max_x, max_y in WebMercator), only the tiles meeting it are written; None for the whole world
+:param zoom_min: least precise zoom level of the heatmap
+"""
+
+
+def creer_densite(
+    data, Path_works, zoom_max, rayon, croissance, extent=None, zoom_min=0
+):
+    # Les positions hors de la projection WebMercator (pôles) ne peuvent pas être placées dans une tuile
+    data = data[np.isfinite(data["lon"].values) & np.isfinite(data["lat"].values)]
+    categories = list(data["QO_category"].unique()) + ["All"]
+    writer = writer_processus()
+    dossier_temp = os.path.normpath(Path_works[0])
+    os.makedirs(dossier_temp, exist_ok=True)
+
+    for categorie in categories:
+        if categorie == "All":
+            data_cat = data
+        else:
+            data_cat = data[data["QO_category"].values == categorie]
+        # Tuiles écrites dans le dossier densite de chaque carte
+        ecrites = {
+            os.path.join(Path_work, categorie, "densite"): set()
+            for Path_work in Path_works
+        }
+
+        # Comptes de chaque niveau sur le disque, supprimés une fois la catégorie terminée
+        with tempfile.TemporaryDirectory(prefix="densite_", dir=dossier_temp) as dossier:
+            cles, grilles = comptes_base(
+                data_cat["lon"].values, data_cat["lat"].values, zoom_max, dossier
+            )
+            for zoom in range(zoom_max, zoom_min - 1, -1):
+                if zoom < zoom_max:
+                    cles, grilles = reduire_comptes(cles, grilles, zoom, dossier)
+                    # Les comptes du niveau plus précis ne servent plus
+                    _supprimer(dossier, f"comptes_{zoom + 1}.dat")
+                sigma = min(rayon * croissance ** (zoom_max - zoom), taille_tuile / 3)
+
+                with mesure(
+                    f"{categorie} zoom {zoom}", "densite", tuiles=len(cles)
+                ) as infos:
+                    # Premier lissage : seulement le maximum du niveau, qui donne l'échelle des couleurs.
+                    # Le halo peut déborder de l'emprise : seules les tuiles qui la touchent sont gardées
+                    maximum = np.float32(0)
+                    for (tx, ty), densite in lisser_niveau(cles, grilles, zoom, sigma):
+                        if tuile_dans_emprise(tx, ty, zoom, extent):
+                            maximum = max(maximum, densite.max())
+                    echelle = np.log1p(maximum)
+
+                    # Second lissage : chaque tuile est colorée et confiée à l'écriture dès qu'elle est lissée
+                    nb_tuiles = 0
+                    for (tx, ty), densite in lisser_niveau(cles, grilles, zoom, sigma):
+                        if not tuile_dans_emprise(tx, ty, zoom, extent):
+                            continue
+                        image = colorer_densite(densite, echelle)
+                        if not image[..., 3].any():
+                            continue
+                        nb_tuiles += 1
+                        for densite_directory in ecrites:
+                            sous_dossier = os.path.join(
+                                densite_directory, str(zoom), str(tx)
+                            )
+                            os.makedirs(sous_dossier, exist_ok=True)
+                            # Numérotation TMS : la ligne 0 est en bas
+                            chemin = os.path.join(sous_dossier, f"{2**zoom - 1 - ty}.png")
+                            ecrites[densite_directory].add(chemin)
+                            writer.soumettre(
+                                chemin,
+                                ecrire_png,
+                                image,
+                                os.path.dirname(densite_directory),
+                            )
+                    infos["tuiles"] = nb_tuiles
+                print(
+                    f"Densité de la catégorie {categorie} au zoom {zoom} : {nb_tuiles} tuiles (écart-type {sigma:.1f} pixels)"
+                )
+            del grilles
+
+        vider_ecritures()
+        for densite_directory, chemins in ecrites.items():
+            page = os.path.join(densite_directory, "densite.html")
+            # Les tuiles d'une exécution précédente qui n'ont plus de position sont supprimées
+            if os.path.exists(densite_directory):
+                supprimer_absents(
+                    densite_directory,
+                    chemins | {page},
+                    os.path.dirname(densite_directory),
+                )
+            os.makedirs(densite_directory, exist_ok=True)
+            publier_page(
+                densite_directory, categorie, zoom_min, zoom_max, extent, "densite.html"
+            )
@@ -0,0 +1,258 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+############################################################################################################
+
+## Pyramide des nombres de rapports AIS, pour les statistiques par zone
+
+############################################################################################################
+
+# A l'ingestion, le nombre de rapports de chaque catégorie est compté par tuile de la pyramide (de 0 à zoom_statistiques) et par classe de vitesse
+# (une classe par noeud de 0 à 19, puis 20 noeuds et plus, comme les couleurs des cartes). Seules les tuiles occupées sont gardées :
+# pour chaque niveau de zoom, cles_{z}.npy contient les indices triés des tuiles (y * 2**z + x, y compté depuis le haut)
+# et comptes_{z}.npy leurs nombres de rapports par classe de vitesse.
+# Une requête sur une emprise descend la pyramide : une tuile entièrement dans l'emprise est comptée au niveau le moins précis possible,
+# seules les tuiles qui coupent le bord de l'emprise sont détaillées au niveau suivant. Les fichiers sont lus par np.memmap :
+# une requête ne lit que quelques tuiles par niveau, quelle que soit la taille des données.
+
+nom_statistiques = "statistiques"
+nom_description = "pyramide.json"
+
+# Nombre de classes de vitesse
+nb_classes = 21
+
+# Demi-côté de la projection WebMercator (EPSG:3857), en mètres
+origine = 20037508.342789244
+
+
+"""
+creer_pyramide counts the reports of every category by tile of the pyramid and by speed class, and saves the counts.
+:param data: points with the columns lon, lat (WebMercator), speed and QO_category
+:param dossier: directory where the statistics directory is created
+:param zoom_base: most precise zoom level of the pyramid
+"""
+
+
+def creer_pyramide(data, dossier, zoom_base):
+    import shutil
+
+    statistiques_directory = os.path.join(dossier, nom_statistiques)
+    if os.path.exists(statistiques_directory):
+        shutil.rmtree(statistiques_directory)
+
+    # Les positions hors de la projection WebMercator (pôles) ne peuvent pas être placées dans une tuile
+    data = data[np.isfinite(data["lon"].values) & np.isfinite(data["lat"].values)]
+    n = 2**zoom_base
+    tx = np.clip(
+        ((data["lon"].values + origine) / (2 * origine) * n).astype(np.int64), 0, n - 1
+    )
+    ty = np.clip(
+        ((origine - data["lat"].values) / (2 * origine) * n).astype(np.int64), 0, n - 1
+    )
+    classe = np.clip(data["speed"].values, 0, nb_classes - 1).astype(np.int64)
+    cle_classe = (ty * n + tx) * nb_classes + classe
+
+    for categorie in list(data["QO_category"].unique()) + ["All"]:
+        if categorie == "All":
+            valeurs, nombres = np.unique(cle_classe, return_counts=True)
+        else:
+            valeurs, nombres = np.unique(
+                cle_classe[data["QO_category"].values == categorie], return_counts=True
+            )
+        cles, indices = np.unique(valeurs // nb_classes, return_inverse=True)
+        comptes = np.zeros((len(cles), nb_classes), dtype=np.uint64)
+        comptes[indices, valeurs % nb_classes] = nombres
+
+        categorie_directory = os.path.join(statistiques_directory, str(categorie))
+        os.makedirs(categorie_directory)
+        for zoom in range(zoom_base, -1, -1):
+            np.save(os.path.join(categorie_directory, f"cles_{zoom}.npy"), cles)
+            np.save(os.path.join(categorie_directory, f"comptes_{zoom}.npy"), comptes)
+            if zoom == 0:
+                break
+            # Tuile parente au niveau moins précis : les tuiles de même parent sont sommées
+            cote = 2**zoom
+            parents = (cles // cote // 2) * (cote // 2) + (cles % cote) // 2
+            cles, indices = np.unique(parents, return_inverse=True)
+            somme = np.zeros((len(cles), nb_classes), dtype=np.uint64)
+            np.add.at(somme, indices, comptes)
+            comptes = somme
+
+    with open(
+        os.path.join(statistiques_directory, nom_description), "w", encoding="utf-8"
+    ) as f:
+        json.dump({"zoom_base": zoom_base, "nb_classes": nb_classes}, f)
+    print(
+        f"Pyramide des statistiques créée jusqu'au zoom {zoom_base} ({data.shape[0]} rapports)"
+    )
+
+
+"""
+histogramme_vitesses gives the number of reports of a category in an area, by speed class.
+The area is rounded to the tiles of the most precise zoom level of the pyramid: a tile on its edge is counted if its center is inside.
+:param dossier: directory holding the statistics directory (PATH/<database name>)
+:param emprise: (lon_min, lat_min, lon_max, lat_max) in degrees
+:param categorie: category, "All" for every category
+:return: array of the number of reports by speed class (index = speed in knots, the last class for 20 knots and more)
+"""
+
+
+def histogramme_vitesses(dossier, emprise, categorie="All"):
+    statistiques_directory = os.path.join(dossier, nom_statistiques)
+    with open(
+        os.path.join(statistiques_directory, nom_description), "r", encoding="utf-8"
+    ) as f:
+        zoom_base = json.load(f)["zoom_base"]
+    categorie_directory = os.path.join(statistiques_directory, str(categorie))
+    if not os.path.isdir(categorie_directory):
+        raise ValueError(f"Catégorie {categorie} absente des statistiques")
+
+    # Emprise en fraction du côté du monde (u vers l'est, v vers le sud, comme les indices de tuiles)
+    lon_min, lat_min, lon_max, lat_max = emprise
+    u0, u1 = (lon_min + 180) / 360, (lon_max + 180) / 360
+    v0, v1 = (
+        0.5 - math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) / (2 * math.pi)
+        for lat in (min(lat_max, 85.0511), max(lat_min, -85.0511))
+    )
+
+    total = np.zeros(nb_classes, dtype=np.int64)
+    tx = np.zeros(1, dtype=np.int64)
+    ty = np.zeros(1, dtype=np.int64)
+    for zoom in range(zoom_base + 1):
+        cote = 2**zoom
+        if zoom > 0:
+            # Les 4 tuiles filles des tuiles qui coupent le bord de l'emprise
+            tx = (2 * tx[:, None] + np.array([0, 1, 0, 1])).reshape(-1)
+            ty = (2 * ty[:, None] + np.array([0, 0, 1, 1])).reshape(-1)
+        dedans = (
+            (tx >= u0 * cote)
+            & (tx + 1 <= u1 * cote)
+            & (ty >= v0 * cote)
+            & (ty + 1 <= v1 * cote)
+        )
+        dehors = (
+            (tx + 1 <= u0 * cote)
+            | (tx >= u1 * cote)
+            | (ty + 1 <= v0 * cote)
+            | (ty >= v1 * cote)
+        )
+        if zoom == zoom_base:
+            # Niveau le plus précis : une tuile du bord est comptée si son centre est dans l'emprise
+            dedans = (
+                ~dehors
+                & (tx + 0.5 >= u0 * cote)
+                & (tx + 0.5 < u1 * cote)
+                & (ty + 0.5 >= v0 * cote)
+                & (ty + 0.5 < v1 * cote)
+            )
+
+        cles = np.load(
+            os.path.join(categorie_directory, f"cles_{zoom}.npy"), mmap_mode="r"
+        )
+        comptes = np.load(
+            os.path.join(categorie_directory, f"comptes_{zoom}.npy"), mmap_mode="r"
+        )
+        indices = np.minimum(
+            np.searchsorted(cles, ty * cote + tx), max(len(cles) - 1, 0)
+        )
+        occupee = (
+            (cles[indices] == ty * cote + tx)
+            if len(cles)
+            else np.zeros(len(tx), dtype=bool)
+        )
+        total += comptes[indices[dedans & occupee]].sum(axis=0, dtype=np.int64)
+
+        # Seules les tuiles occupées du bord sont détaillées au niveau suivant
+        bord = ~dedans & ~dehors & occupee
+        tx, ty = tx[bord], ty[bord]
+        if len(tx) == 0:
+            break
+    return total
+
+
+"""
+compter_rapports gives the number of reports of a category in an area, optionally for a range of speeds.
+:param dossier: directory holding the statistics directory (PATH/<database name>)
+:param emprise: (lon_min, lat_min, lon_max, lat_max) in degrees
+:param categorie: category, "All" for every category
+:param vitesse_min: least speed class counted (knots)
+:param vitesse_max: greatest speed class counted (knots, 20 for 20 knots and more)
+:return: number of reports
+"""
+
+
+def compter_rapports(
+    dossier, emprise, categorie="All", vitesse_min=0, vitesse_max=nb_classes - 1
+):
+    return int(
+        histogramme_vitesses(dossier, emprise, categorie)[
+            vitesse_min : vitesse_max + 1
+        ].sum()
+    )
+
+
+"""
+categories_statistiques lists the categories of the statistics.
+:param dossier: directory holding the statistics directory (PATH/<database name>)
+:return: list of the categories
+"""
+
+
+def categories_statistiques(dossier):
+    statistiques_directory = os.path.join(dossier, nom_statistiques)
+    return sorted(
+        nom
+        for nom in os.listdir(statistiques_directory)
+        if os.path.isdir(os.path.join(statistiques_directory, nom))
+    )
+
+
+############################################################################################################
+
+## MAIN
+
+############################################################################################################
+
+# python Statistiques.py <dossier> lon_min lat_min lon_max lat_max [catégorie] : nombre de rapports de la zone et histogramme des vitesses
+# (dossier : PATH/<nom de la base>, qui contient le dossier statistiques)
+if __name__ == "__main__":
+    if len(sys.argv) < 6:
+        print(
+            "Usage : python Statistiques.py <dossier> lon_min lat_min lon_max lat_max [catégorie]"
+        )
+        sys.exit(1)
+
+    emprise = [float(v) for v in sys.argv[2:6]]
+    categories = sys.argv[6:] or categories_statistiques(sys.argv[1])
+    for categorie in categories:
+        histogramme = histogramme_vitesses(sys.argv[1], emprise, categorie)
+        print(f"{categorie} : {int(histogramme.sum())} rapports")
+        print(
+            "    "
+            + ", ".join(
+                f"{vitesse}{'+' if vitesse == nb_classes - 1 else ''} nd : {int(nombre)}"
+                for vitesse, nombre in enumerate(histogramme)
+                if nombre
+            )
+        )
@@ -0,0 +1,182 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+############################################################################################################
+
+## Stockage en colonnes des lignes à dessiner dans chaque tuile
+
+############################################################################################################
+
+# Les lignes (pixels ou segments) de toutes les tuiles d'une catégorie sont rangées dans un seul dossier tiles_npy :
+# un fichier .npy par colonne (lon.npy, lat.npy, speed.npy...), avec les lignes triées par tuile,
+# cles.npy les indices triés des tuiles occupées (x * 2**32 + y) et bornes.npy le début des lignes de chaque tuile (plus la fin de la dernière).
+# Un processus de calcul lit les lignes de sa tuile par np.memmap : il ne lit que ces lignes, sans passer par du texte.
+# La catégorie "All" n'est pas une copie : son fichier partition.json liste les dossiers des catégories, dont les lignes de la tuile sont mises bout à bout.
+
+nom_stockage = "tiles_npy"
+nom_description = "partition.json"
+
+
+def _cle(x, y):
+    return (np.asarray(x, dtype=np.int64) << 32) | np.asarray(y, dtype=np.int64)
+
+
+def _description(dossier):
+    with open(os.path.join(dossier, nom_description), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _vider(dossier):
+    if os.path.exists(dossier):
+        shutil.rmtree(dossier)
+    os.makedirs(dossier)
+
+
+"""
+ecrire_partition writes the rows of every tile of a category, sorted by tile.
+:param dossier: path to the store directory of the category (see nom_stockage)
+:param x: x tile index of each row
+:param y: y tile index of each row
+:param colonnes: dictionary {column name: array of the values of each row}
+"""
+
+
+def ecrire_partition(dossier, x, y, colonnes):
+    _vider(dossier)
+    cle = _cle(x, y)
+    ordre = np.argsort(cle, kind="stable")
+    cles, debuts = np.unique(cle[ordre], return_index=True)
+    np.save(os.path.join(dossier, "cles.npy"), cles)
+    np.save(os.path.join(dossier, "bornes.npy"), np.append(debuts, len(cle)))
+    for nom, valeurs in colonnes.items():
+        np.save(os.path.join(dossier, f"{nom}.npy"), np.asarray(valeurs)[ordre])
+    with open(os.path.join(dossier, nom_description), "w", encoding="utf-8") as f:
+        json.dump({"colonnes": list(colonnes)}, f)
+
+
+"""
+ecrire_vue writes a store made of the rows of other stores, without copying them.
+:param dossier: path to the store directory of the view
+:param sources: paths to the store directories whose rows are put end to end
+"""
+
+
+def ecrire_vue(dossier, sources):
+    _vider(dossier)
+    # Chemins relatifs : le dossier de la carte peut être déplacé ou monté ailleurs (mode distribué)
+    with open(os.path.join(dossier, nom_description), "w", encoding="utf-8") as f:
+        json.dump({"vue": [os.path.relpath(source, dossier) for source in sources]}, f)
+
+
+def _sources(dossier, description):
+    return [
+        os.path.normpath(os.path.join(dossier, source)) for source in description["vue"]
+    ]
+
+
+def _lignes(dossier, x, y):
+    # Début et fin des lignes de la tuile, None si la tuile n'a pas de ligne
+    cles = np.load(os.path.join(dossier, "cles.npy"), mmap_mode="r")
+    cle = int(_cle(x, y))
+    i = int(np.searchsorted(cles, cle))
+    if i == len(cles) or cles[i] != cle:
+        return None
+    bornes = np.load(os.path.join(dossier, "bornes.npy"), mmap_mode="r")
+    return int(bornes[i]), int(bornes[i + 1])
+
+
+"""
+tuile_presente tells if a tile has rows to draw.
+:param dossier: path to the store directory of the category
+:param x: x tile index
+:param y: y tile index
+:return: True if the tile has at least one row
+"""
+
+
+def tuile_presente(dossier, x, y):
+    description = _description(dossier)
+    if "vue" in description:
+        return any(
+            tuile_presente(source, x, y) for source in _sources(dossier, description)
+        )
+    return _lignes(dossier, x, y) is not None
+
+
+"""
+lire_tuile reads the rows of a tile.
+:param dossier: path to the store directory of the category
+:param x: x tile index
+:param y: y tile index
+:return: pandas DataFrame of the rows of the tile, None if the tile has no row
+"""
+
+
+def lire_tuile(dossier, x, y):
+    import pandas as pd
+
+    description = _description(dossier)
+    if "vue" in description:
+        parties = [
+            lire_tuile(source, x, y) for source in _sources(dossier, description)
+        ]
+        parties = [partie for partie in parties if partie is not None]
+        return pd.concat(parties, ignore_index=True) if parties else None
+
+    lignes = _lignes(dossier, x, y)
+    if lignes is None:
+        return None
+    debut, fin = lignes
+    return pd.DataFrame(
+        {
+            nom: np.array(
+                np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r")[debut:fin]
+            )
+            for nom in description["colonnes"]
+        }
+    )
+
+
+"""
+couts_partition gives the number of rows to draw in each tile.
+:param dossier: path to the store directory of the category
+:return: dictionary {(x, y): number of rows}, empty if the store does not exist
+"""
+
+
+def couts_partition(dossier):
+    if not os.path.exists(os.path.join(dossier, nom_description)):
+        return {}
+    description = _description(dossier)
+    couts = {}
+    if "vue" in description:
+        for source in _sources(dossier, description):
+            for tuile, nombre in couts_partition(source).items():
+                couts[tuile] = couts.get(tuile, 0) + nombre
+        return couts
+    cles = np.load(os.path.join(dossier, "cles.npy"))
+    nombres = np.diff(np.load(os.path.join(dossier, "bornes.npy")))
+    return {
+        (int(cle >> 32), int(cle & 0xFFFFFFFF)): int(nombre)
+        for cle, nombre in zip(cles, nombres)
+    }
@@ -0,0 +1,206 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import glob
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+############################################################################################################
+
+## Traces d'exécution des tâches (format Chrome trace / Perfetto)
+
+############################################################################################################
+
+# Quand la trace est activée, chaque tâche (création d'une tuile, niveaux de zoom, fusion, écriture) enregistre son début et sa durée,
+# avec le processus, la tuile, le nombre de points et d'octets : une ligne JSON par tâche dans un fichier par processus (trace_{machine}_{pid}.jsonl).
+# exporter_trace rassemble ces fichiers en un seul fichier à ouvrir dans chrome://tracing ou https://ui.perfetto.dev
+# Le dossier de la trace est transmis aux processus de calcul par la variable d'environnement TRACE_DOSSIER :
+# elle doit être définie avant la création des processus (ou au lancement des processus de calcul distribués).
+
+variable_environnement = "TRACE_DOSSIER"
+
+# Fichier de trace du processus courant, ouvert au premier enregistrement
+_fichier = None
+_fichier_pid = None
+_verrou = threading.Lock()
+
+
+"""
+activer_trace enables the trace in the current process and in the processes it creates afterwards.
+:param dossier: directory of the trace files, emptied of the trace files of a previous run
+"""
+
+
+def activer_trace(dossier):
+    os.makedirs(dossier, exist_ok=True)
+    for chemin in glob.glob(os.path.join(dossier, "trace_*.jsonl")):
+        os.remove(chemin)
+    os.environ[variable_environnement] = dossier
+
+
+"""
+desactiver_trace disables the trace in the current process and in the processes it creates afterwards.
+"""
+
+
+def desactiver_trace():
+    global _fichier
+    os.environ.pop(variable_environnement, None)
+    with _verrou:
+        if _fichier is not None and _fichier_pid == os.getpid():
+            _fichier.close()
+        _fichier = None
+
+
+"""
+enregistrer writes one record in the trace file of the current process.
+:param evenement: Chrome trace event (dictionary)
+"""
+
+
+def enregistrer(evenement):
+    global _fichier, _fichier_pid
+    dossier = os.environ.get(variable_environnement)
+    if dossier is None:
+        return
+    ligne = json.dumps(evenement) + "\n"
+    with _verrou:
+        # Après un fork, le fichier hérité du processus parent n'est pas celui de ce processus
+        if _fichier is None or _fichier_pid != os.getpid():
+            _fichier = open(
+                os.path.join(
+                    dossier, f"trace_{socket.gethostname()}_{os.getpid()}.jsonl"
+                ),
+                "a",
+                encoding="utf-8",
+            )
+            _fichier_pid = os.getpid()
+        _fichier.write(ligne)
+        _fichier.flush()
+
+
+"""
+mesure records the duration of a block of code as a task of the trace (does nothing if the trace is disabled).
+:param nom: name of the task (ex : name of the tile)
+:param etape: stage of the task (rasterisation, zoom, fusion, ecriture, ...)
+:param args: information of the task (tile, points, octets, ...), can be completed inside the block through the dictionary given by the with statement
+"""
+
+
+@contextmanager
+def mesure(nom, etape, **args):
+    if variable_environnement not in os.environ:
+        yield args
+        return
+    debut = time.time()
+    try:
+        yield args
+    finally:
+        fin = time.time()
+        enregistrer(
+            {
+                "name": nom,
+                "cat": etape,
+                "ph": "X",
+                "ts": debut * 1e6,
+                "dur": (fin - debut) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "args": args,
+            }
+        )
+
+
+"""
+exporter_trace merges the trace files of every process into one Chrome trace file and prints the slowest tasks.
+:param dossier: directory of the trace files
+:param chemin: path of the Chrome trace file to create
+:param nb_plus_lentes: number of slowest tasks of each stage to print
+"""
+
+
+def exporter_trace(dossier, chemin, nb_plus_lentes=10):
+    evenements = []
+    for fichier in sorted(glob.glob(os.path.join(dossier, "trace_*.jsonl"))):
+        machine = os.path.basename(fichier)[len("trace_") : -len(".jsonl")]
+        with open(fichier, "r", encoding="utf-8") as f:
+            lignes = [json.loads(ligne) for ligne in f if ligne.strip()]
+        if not lignes:
+            continue
+        evenements += lignes
+        # Nom du processus affiché par la visionneuse
+        evenements.append(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": lignes[0]["pid"],
+                "args": {"name": machine},
+            }
+        )
+    if not evenements:
+        print(f"Aucune trace dans {dossier}")
+        return
+
+    temp_path = chemin + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": evenements, "displayTimeUnit": "ms"}, f)
+    os.replace(temp_path, chemin)
+    print(f"Trace de {len(evenements)} tâches créée à l'emplacement : {chemin}")
+
+    taches = [e for e in evenements if e["ph"] == "X"]
+    debut = min(e["ts"] for e in taches)
+    fin = max(e["ts"] + e["dur"] for e in taches)
+    for etape in sorted({e["cat"] for e in taches}):
+        taches_etape = sorted(
+            (e for e in taches if e["cat"] == etape), key=lambda e: -e["dur"]
+        )
+        print(
+            f"{etape} : {len(taches_etape)} tâches, {sum(e['dur'] for e in taches_etape) / 1e6:.2f} s au total, les plus lentes :"
+        )
+        for e in taches_etape[:nb_plus_lentes]:
+            print(f"  {e['dur'] / 1e6:8.3f} s  {e['name']}  (processus {e['pid']}) {e['args']}")
+
+    # Temps d'occupation de chaque processus par les tâches de son thread principal (les écritures en arrière-plan se recouvrent avec les calculs)
+    occupation = {}
+    for e in taches:
+        if e["cat"] != "ecriture" and e["cat"] != "etape":
+            occupation[e["pid"]] = occupation.get(e["pid"], 0) + e["dur"]
+    duree = fin - debut
+    for pid, temps in sorted(occupation.items()):
+        print(
+            f"Processus {pid} : occupé {temps / 1e6:.2f} s sur {duree / 1e6:.2f} s ({100 * temps / duree:.0f} %)"
+        )
+
+
+############################################################################################################
+
+## MAIN
+
+############################################################################################################
+
+# Rassembler les traces d'un dossier : python Trace.py dossier_trace [trace.json]
+if __name__ == "__main__":
+    dossier = sys.argv[1]
+    exporter_trace(
+        dossier,
+        sys.argv[2] if len(sys.argv) > 2 else os.path.join(dossier, "trace.json"),
+    )
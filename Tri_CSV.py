@@ -17,9 +17,12 @@
 
 import pandas as pd
 import numpy as np
-from pyproj import Transformer
 import os
-import shutil
+
+# Les sorties optionnelles (statistiques, aperçu, canevas, tuiles vectorielles, densité) ne sont importées que dans les branches qui s'en servent
+from Validation import valider_positions
+from Projection import projeter
+from Stockage_tuiles import nom_stockage, ecrire_partition, ecrire_vue
 
 ############################################################################################################
 
@@ -29,47 +32,264 @@ import shutil
 """
 tri_CSV processes the database
 :param Path: path where the file of the database is
-:param Path_work: path where the tile CSV files will be stored.
+:param Path_work: path where the store of the tiles (see Stockage_tuiles) will be created.
 :param Database_Name: name of the file
 :param resolution_max: maximum resolution.
 :param pixels: size in pixels used to calculate the tile size.
+:param mode_trajectoire: if True, positions are linked into segments per vessel (mmsi) instead of isolated points.
+:param ecart_temps_max: maximum time gap (seconds) between two positions of a vessel to link them.
+:param ecart_distance_max: maximum distance gap (WebMercator metres) between two positions of a vessel to link them.
 :return: 
     - tile_size: the physical size of each tile.
     - tuiles: a dictionary of tiles.
 """
 
 
-def tri_CSV(Path, Path_work, Database_Name, resolution_max, pixels):
+def tri_CSV(
+    Path,
+    Path_work,
+    Database_Name,
+    resolution_max,
+    pixels,
+    mode_trajectoire=False,
+    ecart_temps_max=3600,
+    ecart_distance_max=20000,
+):
+    return tri_CSV_multi(
+        Path,
+        [Path_work],
+        Database_Name,
+        [resolution_max],
+        pixels,
+        mode_trajectoire,
+        ecart_temps_max,
+        ecart_distance_max,
+    )[0]
+
+
+"""
+tri_CSV_multi processes the database once for several maximum resolutions (one map per resolution).
+The file is read and projected once. The points are aggregated on the finest pixel grid, and the coarser grids are derived from it.
+:param Path: path where the file of the database is
+:param Path_works: list of the paths where the store of the tiles (see Stockage_tuiles) of each resolution will be created.
+:param Database_Name: name of the file
+:param resolutions: list of the maximum resolutions, in the same order as Path_works.
+:param pixels: size in pixels used to calculate the tile size.
+:param mode_trajectoire: if True, positions are linked into segments per vessel (mmsi) instead of isolated points.
+:param ecart_temps_max: maximum time gap (seconds) between two positions of a vessel to link them.
+:param ecart_distance_max: maximum distance gap (WebMercator metres) between two positions of a vessel to link them.
+:param zooms_min_mvt: first vector tile zoom level of each map (see Sortie_MVT), None for no vector tiles.
+:param zoom_max_mvt: last vector tile zoom level.
+:param budget_mvt: maximum number of points per vector tile.
+:param emprise: (lon_min, lat_min, lon_max, lat_max) in degrees, only the positions inside are kept and the tiles cover this box; None for the extent of the data.
+:param zoom_min: least precise zoom level of the maps.
+:param zooms_max_apercu: most precise zoom level drawn directly from the positions for each map (see Apercu_progressif), None for no preview.
+:param zooms_canevas: most precise zoom level of each map whose positions are placed in a canvas instead of the store of the tiles (see Canevas), None for the store of the tiles.
+:param zoom_statistiques: most precise zoom level of the pyramid of report counts (see Statistiques), None for no pyramid.
+:param zoom_max_densite: most precise zoom level of the heatmap (see Sortie_densite), None for no heatmap.
+:param rayon_densite: standard deviation of the heatmap kernel in pixels at zoom_max_densite.
+:param croissance_rayon_densite: factor applied to the standard deviation at each less precise zoom level.
+:return: 
+    - a list of (tile_size, tuiles) for each resolution, in the same order as resolutions.
+"""
+
+
+def tri_CSV_multi(
+    Path,
+    Path_works,
+    Database_Name,
+    resolutions,
+    pixels,
+    mode_trajectoire=False,
+    ecart_temps_max=3600,
+    ecart_distance_max=20000,
+    zooms_min_mvt=None,
+    zoom_max_mvt=None,
+    budget_mvt=4096,
+    emprise=None,
+    zoom_min=0,
+    zooms_max_apercu=None,
+    zooms_canevas=None,
+    zoom_statistiques=None,
+    zoom_max_densite=None,
+    rayon_densite=2.0,
+    croissance_rayon_densite=1.3,
+):
 
     data = pd.read_csv(os.path.join(Path, Database_Name), sep="\t")
 
-    # Transformation des coordonnées géographiques du dataset en coordonnées WebMercator
-    transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857")
-    data["x"], data["y"] = transformer.transform(data["lat"].values, data["lon"].values)
+    # Les lignes invalides (valeurs manquantes, valeurs AIS "non disponible", hors limites) sont écartées avant toute autre étape,
+    # et gardées dans le dossier des résultats du fichier
+    data = valider_positions(
+        data,
+        os.path.dirname(os.path.normpath(Path_works[0])),
+        mode_trajectoire=mode_trajectoire,
+    )
+    if data.shape[0] == 0:
+        raise ValueError(f"Aucune position valide dans {Database_Name}")
+
+    projection = None
+    if zoom_statistiques is not None:
+        from Statistiques import creer_pyramide
+
+        # Nombres de rapports par catégorie et par vitesse, gardés avec les résultats du fichier :
+        # la pyramide compte tout le fichier, avant le filtre de l'emprise, pour qu'un rendu limité à une emprise ne la remplace pas par un extrait
+        projection = projeter(data["lat"].values, data["lon"].values)
+        creer_pyramide(
+            pd.DataFrame(
+                {
+                    "lon": projection[0],
+                    "lat": projection[1],
+                    "speed": data["sog"].values,
+                    "QO_category": data["QO_category"].values,
+                }
+            ),
+            os.path.dirname(os.path.normpath(Path_works[0])),
+            zoom_statistiques,
+        )
+
+    if emprise is not None:
+        # Seules les positions de l'emprise sont gardées, avant la projection et toutes les étapes suivantes
+        lon_min, lat_min, lon_max, lat_max = emprise
+        data = data[
+            (data["lon"].values >= lon_min)
+            & (data["lon"].values <= lon_max)
+            & (data["lat"].values >= lat_min)
+            & (data["lat"].values <= lat_max)
+        ].copy()
+        if data.shape[0] == 0:
+            raise ValueError(f"Aucune position dans l'emprise {emprise}")
+        print(f"{data.shape[0]} positions dans l'emprise {emprise}")
+        projection = None
+
+    # Transformation des coordonnées géographiques du dataset en coordonnées WebMercator (formule exacte, vérifiée sur un échantillon par pyproj)
+    if projection is None:
+        projection = projeter(data["lat"].values, data["lon"].values)
+    data["x"], data["y"] = projection
 
     # Suppression des colonnes "datetime", "mmsi", "cog", "lon" et "lat"
-    data = data.drop(columns=["datetime", "mmsi", "cog", "lon", "lat"])
+    # (en mode trajectoire on garde "mmsi" et "datetime" pour reconstituer les routes des navires)
+    if mode_trajectoire:
+        data = data.drop(columns=["cog", "lon", "lat"])
+    else:
+        data = data.drop(columns=["datetime", "mmsi", "cog", "lon", "lat"])
 
     # Renommer les colonnes "x" en "lon" et "y" en "lat"
     data = data.rename(columns={"sog": "speed", "x": "lon", "y": "lat"})
 
-    data = data.sort_values(by="lon")
-
     ## Définition des variables
-    max_lon = max(data["lon"])
-    min_lon = min(data["lon"])
-    max_lat = max(data["lat"])
-    min_lat = min(data["lat"])
-
-    tile_size = resolution_max * pixels
-
-    # Création des CSV des tuiles
-    tuiles, nb_tuiles = tiles_creator(tile_size, min_lon, max_lon, min_lat, max_lat)
-    print(f"Il y a au plus {nb_tuiles} cvs à produire dans chaque catégorie de bateaux")
-    data_ti = data_tiles_info_creator(tuiles)
-    tiles_sort_to_csv(data, data_ti, tuiles, Path_work)
-
-    return tile_size, tuiles
+    if emprise is not None:
+        # La grille des tuiles couvre l'emprise demandée
+        (min_lon, max_lon), (min_lat, max_lat) = projeter(
+            [emprise[1], emprise[3]], [emprise[0], emprise[2]]
+        )
+    else:
+        max_lon = max(data["lon"])
+        min_lon = min(data["lon"])
+        max_lat = max(data["lat"])
+        min_lat = min(data["lat"])
+
+    if zooms_max_apercu is not None:
+        from Apercu_progressif import creer_apercu
+
+        # Les niveaux les moins précis sont publiés avant toutes les étapes suivantes
+        creer_apercu(
+            data,
+            Path_works,
+            zoom_min,
+            zooms_max_apercu,
+            None if emprise is None else [min_lon, min_lat, max_lon, max_lat],
+        )
+
+    if mode_trajectoire:
+        # Les segments ne dépendent pas de la résolution, seule leur longueur maximale est bornée par la plus petite tuile
+        segments = segments_creator(
+            data, ecart_temps_max, min(ecart_distance_max, min(resolutions) * pixels)
+        )
+        print(f"{segments.shape[0]} segments de trajectoire à dessiner")
+    elif zooms_canevas is None:
+        # Les rapports AIS qui tombent sur un même pixel du niveau le plus précis sont regroupés dès maintenant :
+        # toutes les étapes suivantes ne voient plus qu'une ligne par pixel occupé
+        resolution_fine = min(resolutions)
+        resolutions_grossieres = sorted(set(resolutions) - {resolution_fine})
+        pixels_fins = pixels_aggregation(
+            data, resolution_fine, min_lon, min_lat, resolutions_grossieres
+        )
+        print(
+            f"{data.shape[0]} rapports AIS regroupés en {pixels_fins.shape[0]} pixels occupés"
+        )
+
+    resultats = []
+    for numero, (Path_work, resolution_max) in enumerate(zip(Path_works, resolutions)):
+        tile_size = resolution_max * pixels
+
+        if zooms_canevas is not None:
+            from Canevas import preparer_canevas
+
+            # Ni grille de tuiles ni stockage des tuiles : les positions sont placées directement dans les pixels du canevas de la carte
+            tuiles = preparer_canevas(
+                data,
+                Path_work,
+                zooms_canevas[numero],
+                [min_lon, min_lat, max_lon, max_lat],
+            )
+            data_tiles_info_creator(tuiles).to_csv(
+                os.path.join(Path_work, "Data_tuiles_info.csv"), index=False
+            )
+            resultats.append((tile_size, tuiles))
+            continue
+
+        # Rangement des lignes à dessiner par tuile
+        tuiles, nb_tuiles = tiles_creator(tile_size, min_lon, max_lon, min_lat, max_lat)
+        print(
+            f"Il y a au plus {nb_tuiles} tuiles à produire dans chaque catégorie de bateaux pour une résolution de {resolution_max} m/pixel"
+        )
+        data_ti = data_tiles_info_creator(tuiles)
+        if mode_trajectoire:
+            segments_sort_to_npy(
+                segments, data_ti, tuiles, tile_size, min_lon, min_lat, Path_work
+            )
+        else:
+            # Les grilles plus grossières sont déduites de la grille la plus fine, sans repasser par les rapports AIS
+            if resolution_max != resolution_fine:
+                pixels_occupes = pixels_reaggregation(pixels_fins, resolution_max)
+            elif resolutions_grossieres:
+                pixels_occupes = pixels_reaggregation(pixels_fins)
+            else:
+                pixels_occupes = pixels_fins
+            tiles_sort_to_npy(
+                pixels_occupes,
+                data_ti,
+                tuiles,
+                Path_work,
+                resolution_max,
+                pixels,
+                min_lon,
+                min_lat,
+            )
+        resultats.append((tile_size, tuiles))
+
+    if zooms_min_mvt is not None:
+        from Sortie_MVT import creer_mvt
+
+        # Les tuiles vectorielles sont faites à partir des positions elles-mêmes, pas des pixels regroupés
+        creer_mvt(data, Path_works, zooms_min_mvt, zoom_max_mvt, budget_mvt)
+
+    if zoom_max_densite is not None:
+        from Sortie_densite import creer_densite
+
+        # La densité est calculée à partir des rapports eux-mêmes : chaque rapport compte, pas seulement chaque pixel occupé
+        creer_densite(
+            data,
+            Path_works,
+            zoom_max_densite,
+            rayon_densite,
+            croissance_rayon_densite,
+            None if emprise is None else [min_lon, min_lat, max_lon, max_lat],
+            zoom_min,
+        )
+
+    return resultats
 
 
 ############################################################################################################
@@ -132,6 +352,85 @@ def tiles_creator(tile_size, min_lon, max_lon, min_lat, max_lat):
     return tuiles, nb_tuiles
 
 
+"""
+pixels_aggregation quantizes the points to the pixels of the most precise zoom level and keeps one row per category and pixel.
+With coarser grids, the pixel of each point in these grids is kept too: a fine pixel across the edge of a coarse pixel then has one row per coarse pixel.
+:param data: Dataset with the columns lon, lat (WebMercator), speed and QO_category
+:param resolution_max: maximum resolution.
+:param min_lon: minimum longitude of the pixel grid
+:param min_lat: minimum latitude of the pixel grid
+:param resolutions_grossieres: resolutions of the coarser grids with the same origin (see pixels_reaggregation)
+:return:
+    - pixels_occupes: a pandas DataFrame with the columns QO_category, px, py (pixel indices from the bottom left corner), px_{resolution} and py_{resolution} for each coarser grid,
+    speed (maximum speed on the pixel) and count (number of reports on the pixel)
+"""
+
+
+def pixels_aggregation(
+    data, resolution_max, min_lon, min_lat, resolutions_grossieres=()
+):
+    lon = data["lon"].values - min_lon
+    lat = data["lat"].values - min_lat
+    colonnes = {
+        "QO_category": data["QO_category"].values,
+        "px": (lon // resolution_max).astype(np.int64),
+        "py": (lat // resolution_max).astype(np.int64),
+    }
+    # Les grilles ne sont pas emboîtées (les résolutions ne sont pas multiples les unes des autres) :
+    # le pixel grossier de chaque rapport est calculé ici, pas déduit du centre du pixel fin
+    for resolution in resolutions_grossieres:
+        colonnes[f"px_{resolution}"] = (lon // resolution).astype(np.int64)
+        colonnes[f"py_{resolution}"] = (lat // resolution).astype(np.int64)
+    pixels_occupes = (
+        pd.DataFrame({**colonnes, "speed": data["speed"].values})
+        .groupby(list(colonnes), sort=False)
+        .agg(speed=("speed", "max"), count=("speed", "size"))
+        .reset_index()
+    )
+    return pixels_occupes
+
+
+"""
+pixels_reaggregation derives the occupied pixels of a grid from the rows of pixels_aggregation, without reading the points again.
+The result is the same as pixels_aggregation of the points at the resolution of the grid.
+:param pixels_fins: occupied pixels of the fine grid (see pixels_aggregation)
+:param resolution_grossiere: resolution of a coarser grid given to pixels_aggregation, None for the fine grid itself
+:return:
+    - pixels_occupes: occupied pixels of the grid, with the columns QO_category, px, py, speed and count
+"""
+
+
+def pixels_reaggregation(pixels_fins, resolution_grossiere=None):
+    if resolution_grossiere is None:
+        px, py = "px", "py"
+    else:
+        px, py = f"px_{resolution_grossiere}", f"py_{resolution_grossiere}"
+    pixels_occupes = (
+        pixels_fins.groupby(["QO_category", px, py], sort=False)
+        .agg(speed=("speed", "max"), count=("count", "sum"))
+        .reset_index()
+        .rename(columns={px: "px", py: "py"})
+    )
+    return pixels_occupes
+
+
+"""
+pixels_centers gives the WebMercator coordinates of the center of pixels.
+:param pixels_occupes: pandas DataFrame with the columns px and py (see pixels_aggregation)
+:param resolution_max: maximum resolution.
+:param min_lon: minimum longitude of the pixel grid
+:param min_lat: minimum latitude of the pixel grid
+:return: pandas DataFrame with the columns lon and lat added
+"""
+
+
+def pixels_centers(pixels_occupes, resolution_max, min_lon, min_lat):
+    return pixels_occupes.assign(
+        lon=min_lon + (pixels_occupes["px"].values + 0.5) * resolution_max,
+        lat=min_lat + (pixels_occupes["py"].values + 0.5) * resolution_max,
+    )
+
+
 """
 data_tiles_info_creator Creates a structured dataset containing information about tiles.
 :param tuiles: a dictionary where each key is a tuple representing the tile indices, and values are tuples representing the boundaries of each tile.
@@ -153,97 +452,214 @@ def data_tiles_info_creator(tuiles):
 
 
 """
-prepare_directory Prepares a directory for storing files
-:param tiles_directory: The path to the directory to prepare. 
+tiles_sort_to_npy sorts the occupied pixels of every category into the columnar store of the tiles (see Stockage_tuiles).
+The "All" category is a view over the stores of the categories.
+:param pixels_occupes: Occupied pixels to sort (see pixels_aggregation)
+:param data_tiles: Information about the tile
+:param tuiles: A dictionary where each key is a tuple representing the tile indices, and values are tuples representing the boundaries of each tile.
+:param Path_work: Path where the category directories are created.
+:param resolution_max: maximum resolution.
+:param pixels: size in pixels of the tiles.
+:param min_lon: minimum longitude of the tile grid
+:param min_lat: minimum latitude of the tile grid
 """
 
 
-def prepare_directory(tiles_directory):
-    # Si le dossier existe, le vider
-    if os.path.exists(tiles_directory):
-        shutil.rmtree(tiles_directory)
-        os.makedirs(tiles_directory)
-    ##        print(f"Dossier '{tiles_directory}' vidé et recréé.")
-    else:
-        os.makedirs(tiles_directory)
+def tiles_sort_to_npy(
+    pixels_occupes,
+    data_tiles,
+    tuiles,
+    Path_work,
+    resolution_max,
+    pixels,
+    min_lon,
+    min_lat,
+):
+    # Indice de la tuile de chaque pixel (les pixels du bord maximal appartiennent à la dernière tuile)
+    nb_x = max(key[0] for key in tuiles) + 1
+    nb_y = max(key[1] for key in tuiles) + 1
+    data = pixels_centers(pixels_occupes, resolution_max, min_lon, min_lat)
+    x_tile = np.minimum(data["px"].values // pixels, nb_x - 1)
+    y_tile = np.minimum(data["py"].values // pixels, nb_y - 1)
+    dans_grille = tuiles_de_la_grille(x_tile, y_tile, tuiles, nb_y)
+
+    categories = data["QO_category"].values
+    for cat in data["QO_category"].unique():
+        garde = dans_grille & (categories == cat)
+        ecrire_partition(
+            os.path.join(Path_work, cat, nom_stockage),
+            x_tile[garde],
+            y_tile[garde],
+            {
+                "speed": data["speed"].values[garde],
+                "count": data["count"].values[garde],
+                "lon": data["lon"].values[garde],
+                "lat": data["lat"].values[garde],
+            },
+        )
+    ecrire_vue_all(Path_work, data["QO_category"].unique())
+
+    marquer_tuiles_occupees(data_tiles, x_tile[dans_grille], y_tile[dans_grille], nb_y)
+    chemin_fichier = os.path.join(Path_work, "Data_tuiles_info.csv")
+    data_tiles.to_csv(chemin_fichier, index=False)
+
 
+"""
+tuiles_de_la_grille tells which rows fall in a tile of the grid.
+:param x_tile: x tile index of each row
+:param y_tile: y tile index of each row
+:param tuiles: A dictionary where each key is a tuple representing the tile indices, and values are tuples representing the boundaries of each tile.
+:param nb_y: number of tile rows of the grid
+:return: boolean array, True for the rows in a tile of the grid
+"""
 
-##        print(f"Dossier '{tiles_directory}' créé.")
+
+def tuiles_de_la_grille(x_tile, y_tile, tuiles, nb_y):
+    cles_grille = np.array([x * nb_y + y for x, y in tuiles], dtype=np.int64)
+    return np.isin(x_tile * nb_y + y_tile, cles_grille)
 
 
 """
-tiles_sort_to_csv sort data into .csv tile
-:param data: Dataset to sort
+marquer_tuiles_occupees sets HasBoat to 1 for the tiles holding at least one row.
+:param data_tiles: Information about the tile
+:param x_tile: x tile index of each row
+:param y_tile: y tile index of each row
+:param nb_y: number of tile rows of the grid
+"""
+
+
+def marquer_tuiles_occupees(data_tiles, x_tile, y_tile, nb_y):
+    occupees = np.unique(x_tile * nb_y + y_tile)
+    data_tiles["HasBoat"] = np.isin(
+        data_tiles["x_coord_tile"].values * nb_y + data_tiles["y_coord_tile"].values,
+        occupees,
+    ).astype(int)
+
+
+"""
+ecrire_vue_all writes the store of the "All" category as a view over the stores of the other categories.
+:param Path_work: Path where the category directories are.
+:param categories: categories found in the database
+"""
+
+
+def ecrire_vue_all(Path_work, categories):
+    ecrire_vue(
+        os.path.join(Path_work, "All", nom_stockage),
+        [os.path.join(Path_work, cat, nom_stockage) for cat in categories],
+    )
+
+
+"""
+segments_creator links the successive positions of each vessel into segments.
+:param data: Dataset with the columns mmsi, datetime, lon, lat (WebMercator), speed and QO_category
+:param ecart_temps_max: maximum time gap (seconds) between two linked positions
+:param ecart_distance_max: maximum distance gap (WebMercator metres) between two linked positions
+:return:
+    - segments: a pandas DataFrame with the columns lon0, lat0, lon1, lat1, speed and QO_category. A position which is not linked to any other one is kept as a segment of length 0.
+"""
+
+
+def segments_creator(data, ecart_temps_max, ecart_distance_max):
+    data = data.assign(datetime=pd.to_datetime(data["datetime"]))
+    data = data.sort_values(by=["mmsi", "datetime"], kind="stable")
+
+    mmsi = data["mmsi"].values
+    temps = data["datetime"].values.astype("datetime64[s]").astype(np.int64)
+    lon = data["lon"].values
+    lat = data["lat"].values
+    speed = data["speed"].values
+    categorie = data["QO_category"].values
+
+    # Deux positions successives sont reliées si elles appartiennent au même navire et ne sont séparées ni par un trou de temps ni par un saut de distance
+    lien = (
+        (mmsi[1:] == mmsi[:-1])
+        & (temps[1:] - temps[:-1] <= ecart_temps_max)
+        & (np.hypot(lon[1:] - lon[:-1], lat[1:] - lat[:-1]) <= ecart_distance_max)
+    )
+
+    # Les positions isolées (sans segment ni avant ni après) sont gardées comme des segments de longueur nulle
+    relie = np.zeros(len(data), dtype=bool)
+    relie[:-1] |= lien
+    relie[1:] |= lien
+    isole = ~relie
+
+    segments = pd.DataFrame(
+        {
+            "lon0": np.concatenate([lon[:-1][lien], lon[isole]]),
+            "lat0": np.concatenate([lat[:-1][lien], lat[isole]]),
+            "lon1": np.concatenate([lon[1:][lien], lon[isole]]),
+            "lat1": np.concatenate([lat[1:][lien], lat[isole]]),
+            # Comme pour les points, la vitesse la plus rapide est prioritaire
+            "speed": np.concatenate(
+                [np.maximum(speed[:-1], speed[1:])[lien], speed[isole]]
+            ),
+            "QO_category": np.concatenate([categorie[:-1][lien], categorie[isole]]),
+        }
+    )
+    return segments
+
+
+"""
+segments_sort_to_npy sorts segments into the columnar store of the tiles (see Stockage_tuiles). A segment is stored in every tile its bounding box touches.
+The "All" category is a view over the stores of the categories.
+:param segments: Segments to sort (see segments_creator)
 :param data_tiles: Information about the tile
 :param tuiles: A dictionary where each key is a tuple representing the tile indices, and values are tuples representing the boundaries of each tile.
-:param Path_work: Path where the tile CSV files will be stored.
-"""
-
-
-def tiles_sort_to_csv(data, data_tiles, tuiles, Path_work):
-    # Sélectionner la colonne 'QO_category' et obtenir les valeurs uniques
-    categories = data["QO_category"].unique()
-    # Ajouter "All" au tableau NumPy => représentant la catégorie avec tout les bateaux
-    categories = np.append(categories, "All")
-
-    paths = {}
-    # Trie des bateaux par catégories et par tuiles
-    for cat in categories:
-        tiles_csv_cat_files = os.path.join(os.path.join(Path_work, cat), "tiles_csv")
-        paths[cat] = tiles_csv_cat_files
-        prepare_directory(tiles_csv_cat_files)
-
-    last_xtiles_min = 0
-    for (x, y), (x_tiles_min, y_tiles_min, x_tiles_max, y_tiles_max) in tuiles.items() :
-        if last_xtiles_min != x_tiles_min:
-            data_filtre_lon = data[
-                (data["lon"] >= x_tiles_min) & (data["lon"] <= x_tiles_max)
-            ]
-            last_xtiles_min = x_tiles_min
-        data_filtre_lon_lat = data_filtre_lon[
-            (data_filtre_lon["lat"] >= y_tiles_min)
-            & (data_filtre_lon["lat"] <= y_tiles_max)
-        ]
-
-        for cat in categories:
-
-            if cat == "All":
-
-                data_filtre_final = data_filtre_lon_lat
-
-                if data_filtre_final.shape[0] > 0:
-                    # print(f"nous avons {data_filtre_final.shape[0]} instances dans la tuile {numero} de catégorie {cat}")
-                    sous_dossier = paths[cat]
-                    chemin_fichier = os.path.join(
-                        sous_dossier, f"{x}_{y}.csv"
-                    )
-                    data_filtre_final.to_csv(chemin_fichier, index=False)
-                    data_tiles.loc[
-                        (data_tiles["x_coord_tile"] == x)
-                        & (data_tiles["y_coord_tile"] == y),
-                        "HasBoat",
-                    ] = 1
+:param tile_size: the physical size of each tile, must be greater than the length of the segments
+:param min_lon: minimum longitude of the tile grid
+:param min_lat: minimum latitude of the tile grid
+:param Path_work: Path where the category directories are created.
+"""
 
-            else:
-                data_filtre_final = data_filtre_lon_lat[
-                    (data_filtre_lon_lat["QO_category"] == cat)
-                ]
-                # Enregistrement d'un CSV d'une tuile seulement si un bateau minimun est présent dans la tuile
-                if data_filtre_final.shape[0] > 0:
-                    # print(f"nous avons {data_filtre_final.shape[0]} instances dans la tuile {numero} de catégorie {cat}")
-                    sous_dossier = paths[cat]
-                    chemin_fichier = os.path.join(
-                        sous_dossier, f"{x}_{y}.csv"
-                    )
-                    data_filtre_final.to_csv(chemin_fichier, index=False)
-                    data_tiles.loc[
-                        (data_tiles["x_coord_tile"] == x)
-                        & (data_tiles["y_coord_tile"] == y),
-                        "HasBoat",
-                    ] = 1
-
-    # Enregistrement du csv contenant les informations des tuiles
 
+def segments_sort_to_npy(
+    segments, data_tiles, tuiles, tile_size, min_lon, min_lat, Path_work
+):
+    nb_x = max(key[0] for key in tuiles) + 1
+    nb_y = max(key[1] for key in tuiles) + 1
+
+    # Indices des tuiles touchées par la boîte englobante de chaque segment (au plus 2 par axe car un segment est plus court qu'une tuile)
+    x_min = np.minimum(segments["lon0"].values, segments["lon1"].values)
+    x_max = np.maximum(segments["lon0"].values, segments["lon1"].values)
+    y_min = np.minimum(segments["lat0"].values, segments["lat1"].values)
+    y_max = np.maximum(segments["lat0"].values, segments["lat1"].values)
+    i_min = np.clip(((x_min - min_lon) // tile_size).astype(int), 0, nb_x - 1)
+    i_max = np.clip(((x_max - min_lon) // tile_size).astype(int), 0, nb_x - 1)
+    j_min = np.clip(((y_min - min_lat) // tile_size).astype(int), 0, nb_y - 1)
+    j_max = np.clip(((y_max - min_lat) // tile_size).astype(int), 0, nb_y - 1)
+
+    numero = np.arange(segments.shape[0])
+    affectation = pd.DataFrame(
+        {
+            "segment": np.concatenate([numero] * 4),
+            "x": np.concatenate([i_min, i_max, i_min, i_max]),
+            "y": np.concatenate([j_min, j_min, j_max, j_max]),
+        }
+    ).drop_duplicates()
+    affectation = affectation[
+        tuiles_de_la_grille(
+            affectation["x"].values, affectation["y"].values, tuiles, nb_y
+        )
+    ]
+
+    segment = affectation["segment"].values
+    categories = segments["QO_category"].values[segment]
+    for cat in segments["QO_category"].unique():
+        garde = categories == cat
+        ecrire_partition(
+            os.path.join(Path_work, cat, nom_stockage),
+            affectation["x"].values[garde],
+            affectation["y"].values[garde],
+            {
+                colonne: segments[colonne].values[segment[garde]]
+                for colonne in ["lon0", "lat0", "lon1", "lat1", "speed"]
+            },
+        )
+    ecrire_vue_all(Path_work, segments["QO_category"].unique())
+
+    marquer_tuiles_occupees(
+        data_tiles, affectation["x"].values, affectation["y"].values, nb_y
+    )
     chemin_fichier = os.path.join(Path_work, "Data_tuiles_info.csv")
     data_tiles.to_csv(chemin_fichier, index=False)
-
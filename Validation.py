@@ -0,0 +1,144 @@
+# /**
+#  * Copyright 2024 Abdelkefi Mohamed, Balland Nolan, Bottin Elodie, Cancouët Titouan,
+# Laudereau Louis, Le Mentec Jonathan et Noël Mathieu
+#  *
+#  * Licensed under the Apache License, Version 2.0 (the "License");
+#  * you may not use this file except in compliance with the License.
+#  * You may obtain a copy of the License at
+#  *
+#  *     http://www.apache.org/licenses/LICENSE-2.0
+#  *
+#  * Unless required by applicable law or agreed to in writing, software
+#  * distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+#  */
+
+import os
+
+import numpy as np
+
+############################################################################################################
+
+## Validation des positions AIS à l'ingestion
+
+############################################################################################################
+
+# Toutes les lignes sont vérifiées d'un coup, avant la projection : une seule ligne invalide ne doit ni arrêter un processus de calcul
+# (vitesse négative) ni étendre la grille des tuiles (latitude 91 ou longitude 181 projetées en WebMercator).
+# Les lignes rejetées sont écrites dans quarantaine.tsv avec le code de la première raison de rejet,
+# et le nombre de lignes de chaque raison dans quarantaine_raisons.csv.
+
+# Valeurs AIS "non disponible"
+lat_sentinelle = 91
+lon_sentinelle = 181
+sog_sentinelle = 102.3
+
+# Vitesse maximale codable en AIS (noeuds)
+sog_max = 102.2
+
+# Latitude maximale de la projection WebMercator (EPSG:3857)
+lat_max_mercator = 85.0511
+
+nom_quarantaine = "quarantaine.tsv"
+nom_raisons = "quarantaine_raisons.csv"
+
+
+"""
+raisons_rejet gives the reason why each row is rejected, all rows being checked at once.
+:param data: pandas DataFrame with at least the columns lat, lon, sog and QO_category (and mmsi and datetime in trajectory mode)
+:param mode_trajectoire: True to check the columns mmsi and datetime too, which link the positions into segments
+:return: array of the reason codes, "" for the valid rows
+"""
+
+
+def raisons_rejet(data, mode_trajectoire=False):
+    import pandas as pd
+
+    lat = pd.to_numeric(data["lat"], errors="coerce").values
+    lon = pd.to_numeric(data["lon"], errors="coerce").values
+    sog = pd.to_numeric(data["sog"], errors="coerce").values
+
+    # Par ordre de priorité : une ligne reçoit le code du premier test qui la rejette
+    tests = [
+        ("lat_manquante", np.isnan(lat)),
+        ("lon_manquante", np.isnan(lon)),
+        ("sog_manquante", np.isnan(sog)),
+        ("categorie_manquante", data["QO_category"].isna().values),
+    ]
+    if mode_trajectoire:
+        # Une position sans navire ou sans date valide ne peut pas être reliée aux autres
+        mmsi = pd.to_numeric(data["mmsi"], errors="coerce").values
+        datetime = pd.to_datetime(data["datetime"], errors="coerce")
+        tests += [
+            ("mmsi_manquant", np.isnan(mmsi)),
+            ("datetime_invalide", datetime.isna().values),
+        ]
+    tests += [
+        ("lat_sentinelle", lat == lat_sentinelle),
+        ("lon_sentinelle", lon == lon_sentinelle),
+        ("sog_sentinelle", sog == sog_sentinelle),
+        ("lat_hors_limites", np.abs(lat) > 90),
+        ("lon_hors_limites", np.abs(lon) > 180),
+        ("sog_negative", sog < 0),
+        ("sog_hors_limites", sog > sog_max),
+        ("lat_hors_mercator", np.abs(lat) > lat_max_mercator),
+    ]
+    raisons = np.full(len(data), "", dtype=object)
+    for code, rejet in reversed(tests):
+        raisons[rejet] = code
+    return raisons
+
+
+"""
+valider_positions keeps the valid rows of the database and writes the rejected rows in quarantine.
+:param data: pandas DataFrame read from the database file
+:param dossier_quarantaine: directory of the quarantine files, None to only drop the rejected rows
+:param ajouter: True to append to the quarantine files of a previous call (continuous ingest), False to replace them
+:param mode_trajectoire: True to check the columns mmsi and datetime too (see raisons_rejet)
+:return: the valid rows, with numeric lat, lon and sog columns
+"""
+
+
+def valider_positions(
+    data, dossier_quarantaine=None, ajouter=False, mode_trajectoire=False
+):
+    import pandas as pd
+
+    raisons = raisons_rejet(data, mode_trajectoire)
+    valide = raisons == ""
+    rejets = data[~valide].assign(raison=raisons[~valide])
+
+    if rejets.shape[0]:
+        codes, nombres = np.unique(rejets["raison"].values.astype(str), return_counts=True)
+        print(
+            f"{rejets.shape[0]} positions rejetées sur {data.shape[0]} : "
+            + ", ".join(f"{code} {nombre}" for code, nombre in zip(codes, nombres))
+        )
+    else:
+        codes, nombres = [], []
+
+    if dossier_quarantaine is not None and (rejets.shape[0] or not ajouter):
+        os.makedirs(dossier_quarantaine, exist_ok=True)
+        chemin = os.path.join(dossier_quarantaine, nom_quarantaine)
+        chemin_raisons = os.path.join(dossier_quarantaine, nom_raisons)
+        compte = pd.DataFrame({"raison": codes, "nombre": nombres})
+        if ajouter and os.path.exists(chemin_raisons):
+            compte = (
+                pd.concat([pd.read_csv(chemin_raisons), compte])
+                .groupby("raison", as_index=False)["nombre"]
+                .sum()
+            )
+        entete = not (ajouter and os.path.exists(chemin))
+        rejets.to_csv(
+            chemin, sep="\t", index=False, mode="w" if entete else "a", header=entete
+        )
+        compte.to_csv(chemin_raisons, index=False)
+
+    data = data[valide]
+    return data.assign(
+        lat=pd.to_numeric(data["lat"]),
+        lon=pd.to_numeric(data["lon"]),
+        sog=pd.to_numeric(data["sog"]),
+    )
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from MAIN import burn_speeds
+from Tri_CSV import pixels_aggregation, pixels_centers, pixels_reaggregation
+
+colonnes = ["QO_category", "px", "py", "speed", "count"]
+
+
+def rapports(nombre):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "lon": rng.uniform(-5000, 5000, nombre),
+            "lat": rng.uniform(6000000, 6010000, nombre),
+            "speed": rng.uniform(0, 30, nombre),
+            "QO_category": rng.choice(["Cargo", "Tanker"], nombre),
+        }
+    )
+
+
+def trier(pixels):
+    return (
+        pixels[colonnes].sort_values(["QO_category", "px", "py"]).reset_index(drop=True)
+    )
+
+
+def test_vitesse_max_egale_au_raster_des_rapports():
+    data = rapports(20000)
+    resolution, min_lon, min_lat, taille = 100, -5000.0, 6000000.0, 100
+    pixels = pixels_aggregation(data, resolution, min_lon, min_lat)
+
+    for categorie in ["Cargo", "Tanker"]:
+        bruts = data[data["QO_category"] == categorie]
+        agreges = pixels_centers(
+            pixels[pixels["QO_category"] == categorie], resolution, min_lon, min_lat
+        )
+
+        # Vitesse maximale et nombre de rapports de chaque pixel, comptés rapport par rapport
+        px = ((bruts["lon"].values - min_lon) // resolution).astype(np.int64)
+        py = ((bruts["lat"].values - min_lat) // resolution).astype(np.int64)
+        vitesse = np.full((taille, taille), -1.0)
+        nombre = np.zeros((taille, taille), dtype=np.int64)
+        np.maximum.at(vitesse, (px, py), bruts["speed"].values)
+        np.add.at(nombre, (px, py), 1)
+        occupes = nombre > 0
+        assert occupes.sum() == len(agreges)
+        np.testing.assert_array_equal(
+            vitesse[agreges["px"], agreges["py"]], agreges["speed"]
+        )
+        np.testing.assert_array_equal(
+            nombre[agreges["px"], agreges["py"]], agreges["count"]
+        )
+
+        # Même tuile dessinée à partir des rapports et à partir des pixels regroupés
+        max_y = min_lat + taille * resolution
+        rasters = []
+        for lignes in [bruts, agreges]:
+            raster = np.zeros((taille, taille, 4), dtype=np.uint8)
+            burn_speeds(
+                raster,
+                ((max_y - lignes["lat"].values) // resolution).astype(np.int64),
+                ((lignes["lon"].values - min_lon) // resolution).astype(np.int64),
+                lignes["speed"].values,
+            )
+            rasters.append(raster)
+        np.testing.assert_array_equal(rasters[0], rasters[1])
+
+
+def test_reagregation_egale_a_l_ingestion_directe():
+    data = rapports(50000)
+    min_lon, min_lat = -5000.0, 6000000.0
+    # Résolutions comme celles de Parametres_a_modifier (int de 90 % de la résolution du zoom) : les grilles ne sont pas emboîtées
+    fine = 137
+    grossieres = [275, 550, 2201]
+    pixels_fins = pixels_aggregation(data, fine, min_lon, min_lat, grossieres)
+
+    directs = pixels_aggregation(data, fine, min_lon, min_lat)
+    pd.testing.assert_frame_equal(
+        trier(pixels_reaggregation(pixels_fins)), trier(directs)
+    )
+    for resolution in grossieres:
+        directs = pixels_aggregation(data, resolution, min_lon, min_lat)
+        reagreges = pixels_reaggregation(pixels_fins, resolution)
+        pd.testing.assert_frame_equal(trier(reagreges), trier(directs))
+        assert reagreges["count"].sum() == len(data)
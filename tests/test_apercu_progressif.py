@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from Apercu_progressif import binning_niveau, niveau_depuis_stockage
+from Configuration import Configuration
+from Stockage_tuiles import couts_partition, ecrire_partition, nom_stockage
+from Tri_CSV import tiles_creator, tri_CSV_multi
+
+
+def lire_niveau(categorie_directory, zoom):
+    tuiles = {}
+    dossier_zoom = os.path.join(categorie_directory, str(zoom))
+    for tx in os.listdir(dossier_zoom):
+        for nom in os.listdir(os.path.join(dossier_zoom, tx)):
+            if nom.endswith(".png"):
+                chemin = os.path.join(dossier_zoom, tx, nom)
+                tuiles[(int(tx), int(nom[: -len(".png")]))] = np.array(
+                    Image.open(chemin).convert("RGBA")
+                )
+    return tuiles
+
+
+def test_niveaux_du_stockage_identiques_a_l_apercu(tmp_path):
+    rng = np.random.default_rng(0)
+    # Positions autour de Brest, rangées dans une grille de tuiles de base de 5 km
+    x = rng.uniform(-520000, -470000, 5000)
+    y = rng.uniform(6140000, 6180000, 5000)
+    speed = rng.uniform(0, 25, 5000)
+    tile_size = 5000.0
+    tuiles, _ = tiles_creator(tile_size, x.min(), x.max(), y.min(), y.max())
+    nb_x = max(cle[0] for cle in tuiles) + 1
+    nb_y = max(cle[1] for cle in tuiles) + 1
+    categorie_directory = str(tmp_path / "Cargo")
+    tsv_directory = os.path.join(categorie_directory, nom_stockage)
+    ecrire_partition(
+        tsv_directory,
+        np.minimum((x - x.min()) // tile_size, nb_x - 1).astype(np.int64),
+        np.minimum((y - y.min()) // tile_size, nb_y - 1).astype(np.int64),
+        {"speed": speed, "count": np.ones(len(x)), "lon": x, "lat": y},
+    )
+    # Tuile d'une exécution précédente, qui n'est plus couverte
+    os.makedirs(os.path.join(categorie_directory, "8", "0"))
+    Image.fromarray(np.zeros((256, 256, 4), dtype=np.uint8)).save(
+        os.path.join(categorie_directory, "8", "0", "0.png")
+    )
+
+    for zoom in range(8, 12):
+        niveau_depuis_stockage(
+            categorie_directory,
+            tsv_directory,
+            tuiles,
+            couts_partition(tsv_directory),
+            zoom,
+            False,
+        )
+        attendu = binning_niveau(x, y, speed, zoom)
+        obtenu = lire_niveau(categorie_directory, zoom)
+        assert sorted(obtenu) == sorted(attendu)
+        for tuile, image in attendu.items():
+            np.testing.assert_array_equal(obtenu[tuile], image)
+
+
+def test_page_publiee_un_niveau_a_la_fois(tmp_path, monkeypatch):
+    import Apercu_progressif
+    import MAIN
+
+    rng = np.random.default_rng(0)
+    nombre = 5000
+    pd.DataFrame(
+        {
+            "mmsi": rng.integers(1, 50, nombre),
+            "datetime": "2023-07-01 00:00:00",
+            "lat": rng.uniform(48.2, 48.5, nombre),
+            "lon": rng.uniform(-4.8, -4.3, nombre),
+            "sog": np.round(rng.uniform(0, 25, nombre), 1),
+            "cog": 0.0,
+            "QO_category": "Cargo",
+        }
+    ).to_csv(tmp_path / "base.tsv", sep="\t", index=False)
+    config = Configuration(
+        PATH=str(tmp_path),
+        Database_Name="base.tsv",
+        max_zoom=12,
+        zoom_min=6,
+        mode_progressif=True,
+        zoom_apercu=8,
+        sortie_mvt=False,
+        sortie_densite=False,
+        zoom_statistiques=None,
+        mode_distribue=False,
+        mode_trace=False,
+    )
+    Path_work = config.Path_work(12)
+    [(_, tuiles)] = tri_CSV_multi(
+        config.PATH,
+        [Path_work],
+        config.Database_Name,
+        [config.resolution(12)],
+        300,
+        zoom_min=config.zoom_min,
+        zooms_max_apercu=[config.zoom_max_apercu(12)],
+    )
+
+    # Pages publiées : zoom maximal de la page et niveaux présents sur le disque à ce moment
+    publiees = []
+
+    def publier_page(categorie_directory, categorie, zoom_min, zoom_max, extent=None):
+        niveaux = sorted(
+            int(nom) for nom in os.listdir(categorie_directory) if nom.isdigit()
+        )
+        publiees.append((categorie, zoom_max, niveaux))
+
+    # Le niveau le plus précis vient de gdal2tiles : il est remplacé par le dessin depuis le stockage
+    def niveaux_zoom_categorie(
+        categorie,
+        tiles_producted_directory,
+        categorie_directory,
+        zoom_levels,
+        config,
+        pool=None,
+        couts=None,
+    ):
+        niveau_depuis_stockage(
+            categorie_directory,
+            os.path.join(categorie_directory, nom_stockage),
+            tuiles,
+            couts,
+            int(zoom_levels),
+            False,
+        )
+
+    monkeypatch.setattr(Apercu_progressif, "publier_page", publier_page)
+    monkeypatch.setattr(MAIN, "niveaux_zoom_categorie", niveaux_zoom_categorie)
+    manifeste = {"etapes": [], "categories": {}}
+    for categorie in ["All", "Cargo"]:
+        os.makedirs(os.path.join(Path_work, categorie, "tiles_producted"))
+        manifeste["categories"][categorie] = {"etapes": ["rasterisation"], "tuiles": []}
+    MAIN.produire_carte(
+        Path_work, tuiles, config.resolution(12), 12, manifeste, False, 0, 0, config
+    )
+
+    for categorie in ["All", "Cargo"]:
+        pages = [(zoom, niveaux) for nom, zoom, niveaux in publiees if nom == categorie]
+        # Un niveau de plus à chaque page, et chaque niveau publié est sur le disque
+        assert [zoom for zoom, _ in pages] == [9, 10, 11, 12]
+        for zoom, niveaux in pages:
+            assert niveaux == list(range(6, zoom + 1))
@@ -0,0 +1,153 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from Apercu_progressif import binning_niveau
+from Canevas import (
+    geometrie,
+    nom_geometrie,
+    ouvrir_niveau,
+    preparer_canevas,
+    produire_canevas,
+    taille_tuile,
+)
+from Couleurs import color_lut
+from Sortie_MVT import origine
+
+zoom = 5
+
+
+def bornes_tuiles(tx0, ty0, tx1, ty1):
+    # Etendue WebMercator des tuiles tx0..tx1, ty0..ty1 (comptées depuis le haut) du zoom du canevas,
+    # réduite d'un mètre pour ne pas toucher les tuiles voisines
+    taille = 2 * origine / 2**zoom
+    return (
+        -origine + tx0 * taille + 1,
+        origine - (ty1 + 1) * taille + 1,
+        -origine + (tx1 + 1) * taille - 1,
+        origine - ty0 * taille - 1,
+    )
+
+
+def positions(bornes, nombre, graine=0):
+    rng = np.random.default_rng(graine)
+    min_x, min_y, max_x, max_y = bornes
+    # Positions aléatoires, plus un coin de l'étendue (premier pixel du canevas)
+    return pd.DataFrame(
+        {
+            "lon": np.append(rng.uniform(min_x, max_x, nombre), min_x),
+            "lat": np.append(rng.uniform(min_y, max_y, nombre), max_y),
+            "speed": np.append(rng.uniform(0, 25, nombre), 7.5),
+            "QO_category": "Cargo",
+        }
+    )
+
+
+def carte(tmp_path, data, bornes):
+    Path_work = str(tmp_path / "carte")
+    preparer_canevas(data, Path_work, zoom, bornes)
+    categorie_directory = os.path.join(Path_work, "Cargo")
+    produire_canevas(Path_work, categorie_directory, 0)
+    with open(os.path.join(Path_work, nom_geometrie), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return categorie_directory, meta
+
+
+def tuiles_png(categorie_directory, z):
+    resultat = {}
+    dossier_zoom = os.path.join(categorie_directory, str(z))
+    if os.path.isdir(dossier_zoom):
+        for tx in os.listdir(dossier_zoom):
+            for nom in os.listdir(os.path.join(dossier_zoom, tx)):
+                chemin = os.path.join(dossier_zoom, tx, nom)
+                resultat[(int(tx), int(nom[: -len(".png")]))] = np.array(
+                    Image.open(chemin)
+                )
+    return resultat
+
+
+def test_bande_du_zoom_maximal(tmp_path):
+    # Tuiles 9 à 11 en x et 3 à 4 en y : le canevas ne commence pas au coin du monde
+    data = positions(bornes_tuiles(9, 3, 11, 4), 3000)
+    categorie_directory, meta = carte(tmp_path, data, bornes_tuiles(9, 3, 11, 4))
+    assert (meta["tx0"], meta["ty0"], meta["nx"], meta["ny"]) == (9, 3, 3, 2)
+
+    # Vitesse maximale + 1 dans le pixel de chaque position
+    resolution = 2 * origine / 2**zoom / taille_tuile
+    col = ((data["lon"].values + origine) // resolution).astype(int) - 9 * taille_tuile
+    row = ((origine - data["lat"].values) // resolution).astype(int) - 3 * taille_tuile
+    attendu = np.zeros((2 * taille_tuile, 3 * taille_tuile), dtype=np.uint8)
+    np.maximum.at(
+        attendu, (row, col), np.minimum(data["speed"].values, 20).astype(np.uint8) + 1
+    )
+    canevas = ouvrir_niveau(
+        os.path.join(categorie_directory, "canevas"), meta, zoom, "r"
+    )
+    np.testing.assert_array_equal(np.asarray(canevas), attendu)
+    assert canevas[0, 0] == 8
+
+    # Tuile PNG de chaque bloc de 256 x 256 pixels du canevas
+    tuiles = tuiles_png(categorie_directory, zoom)
+    assert len(tuiles) == 6
+    for (tx, ty), image in tuiles.items():
+        ligne = (2**zoom - 1 - ty - 3) * taille_tuile
+        colonne = (tx - 9) * taille_tuile
+        bloc = attendu[ligne : ligne + taille_tuile, colonne : colonne + taille_tuile]
+        np.testing.assert_array_equal(image[bloc > 0], color_lut[bloc[bloc > 0] - 1])
+        assert not image[bloc == 0].any()
+
+
+def test_reduction_au_bord_du_canevas(tmp_path):
+    # Premières tuiles impaires : les tuiles du niveau moins précis débordent du canevas du niveau suivant
+    bornes = bornes_tuiles(9, 3, 11, 4)
+    categorie_directory, meta = carte(tmp_path, positions(bornes, 3000), bornes)
+    canevas_directory = os.path.join(categorie_directory, "canevas")
+    for z in range(zoom - 1, -1, -1):
+        fin = np.asarray(ouvrir_niveau(canevas_directory, meta, z + 1, "r"))
+        tx0, ty0, nx, ny = geometrie(meta, z)
+        sx0, sy0, _, _ = geometrie(meta, z + 1)
+        # Niveau suivant placé dans la grille de ce niveau, complété par des zéros
+        complet = np.zeros(
+            (2 * ny * taille_tuile, 2 * nx * taille_tuile), dtype=np.uint8
+        )
+        r0 = (sy0 - 2 * ty0) * taille_tuile
+        c0 = (sx0 - 2 * tx0) * taille_tuile
+        complet[r0 : r0 + fin.shape[0], c0 : c0 + fin.shape[1]] = fin
+        attendu = complet.reshape(ny * taille_tuile, 2, nx * taille_tuile, 2).max(
+            axis=(1, 3)
+        )
+        np.testing.assert_array_equal(
+            np.asarray(ouvrir_niveau(canevas_directory, meta, z, "r")), attendu
+        )
+
+
+def test_numerotation_tms_egale_a_l_apercu(tmp_path):
+    # Les tuiles de l'aperçu suivent la numérotation TMS de gdal2tiles
+    bornes = bornes_tuiles(9, 3, 11, 4)
+    data = positions(bornes, 3000)
+    categorie_directory, _ = carte(tmp_path, data, bornes)
+    for z in range(zoom + 1):
+        attendues = binning_niveau(
+            data["lon"].values, data["lat"].values, data["speed"].values, z
+        )
+        tuiles = tuiles_png(categorie_directory, z)
+        assert set(tuiles) == set(attendues)
+        for cle, image in tuiles.items():
+            np.testing.assert_array_equal(image, attendues[cle])
+
+
+def test_tuiles_absentes_supprimees(tmp_path):
+    bornes = bornes_tuiles(9, 3, 11, 4)
+    categorie_directory, _ = carte(tmp_path, positions(bornes, 3000), bornes)
+    assert len(tuiles_png(categorie_directory, zoom)) == 6
+
+    # Nouveau rendu avec les seules positions de la tuile (9, 3) : les autres tuiles disparaissent
+    categorie_directory, _ = carte(
+        tmp_path, positions(bornes_tuiles(9, 3, 9, 3), 100, graine=1), bornes
+    )
+    assert set(tuiles_png(categorie_directory, zoom)) == {(9, 2**zoom - 1 - 3)}
+    for z in range(zoom + 1):
+        assert len(tuiles_png(categorie_directory, z)) == 1
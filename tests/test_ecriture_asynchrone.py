@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from Ecriture_asynchrone import TileWriter, remplacer
+from Execution_pool import executer_pool
+
+
+def test_ecritures_d_un_meme_fichier_dans_l_ordre(tmp_path):
+    writer = TileWriter(4, 8)
+    chemin = str(tmp_path / "tuile.png")
+    for i in range(20):
+        writer.soumettre(chemin, remplacer, str(i).encode())
+    writer.attendre(chemin)
+    # La dernière soumission l'emporte, quel que soit le thread qui l'a écrite
+    assert open(chemin, "rb").read() == b"19"
+    writer.fermer()
+
+
+def test_file_bornee_bloque_le_processus_de_calcul(tmp_path):
+    writer = TileWriter(1, 1)
+    libere = threading.Event()
+
+    def ecrire_bloque(chemin, donnees):
+        libere.wait()
+        return remplacer(chemin, donnees)
+
+    # Une écriture en cours dans le thread, une dans la file : la troisième soumission attend
+    writer.soumettre(str(tmp_path / "a"), ecrire_bloque, b"a")
+    writer.soumettre(str(tmp_path / "b"), ecrire_bloque, b"b")
+    soumis = threading.Event()
+
+    def soumettre():
+        writer.soumettre(str(tmp_path / "c"), ecrire_bloque, b"c")
+        soumis.set()
+
+    thread = threading.Thread(target=soumettre)
+    thread.start()
+    assert not soumis.wait(0.5)
+    libere.set()
+    assert soumis.wait(5)
+    thread.join()
+    writer.vider()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "b", "c"]
+    writer.fermer()
+
+
+def ecrire_en_erreur(chemin, donnees):
+    raise OSError("disque plein")
+
+
+def test_erreur_d_ecriture_signalee(tmp_path):
+    writer = TileWriter(2, 4)
+    writer.soumettre(str(tmp_path / "a"), remplacer, b"a")
+    writer.soumettre(str(tmp_path / "b"), ecrire_en_erreur, b"b")
+    with pytest.raises(RuntimeError, match="disque plein"):
+        writer.vider()
+    # L'erreur n'est signalée qu'une fois, les écritures suivantes continuent
+    writer.soumettre(str(tmp_path / "c"), remplacer, b"c")
+    writer.vider()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "c"]
+    writer.fermer()
+
+
+def soumettre_en_erreur(chemin):
+    from Ecriture_asynchrone import writer_processus
+
+    writer_processus().soumettre(chemin, ecrire_en_erreur, b"")
+
+
+def test_erreur_d_ecriture_fait_echouer_le_pool(tmp_path):
+    with pytest.raises(RuntimeError, match="disque plein"):
+        executer_pool(soumettre_en_erreur, [(str(tmp_path / "a"),)])
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+from Configuration import Configuration
+from Projection import projeter
+from Sortie_MVT import etendue, origine
+from Stockage_tuiles import lire_tuile, nom_stockage
+from Tri_CSV import tri_CSV_multi
+
+# Rade de Brest, dans un fichier qui couvre toute la pointe de la Bretagne
+emprise = (-4.6, 48.3, -4.4, 48.45)
+zoom_min, zoom_apercu, zoom_max_densite = 9, 10, 11
+zoom_min_mvt, zoom_max_mvt = 12, 13
+resolution = 30
+pixels = 500
+
+
+def carte_emprise(tmp_path):
+    rng = np.random.default_rng(0)
+    nombre = 20000
+    pd.DataFrame(
+        {
+            "mmsi": rng.integers(1, 50, nombre),
+            "datetime": "2023-07-01 00:00:00",
+            "lat": rng.uniform(48.0, 48.8, nombre),
+            "lon": rng.uniform(-5.0, -4.0, nombre),
+            "sog": np.round(rng.uniform(0, 25, nombre), 1),
+            "cog": 0.0,
+            "QO_category": rng.choice(["Cargo", "Tanker"], nombre),
+        }
+    ).to_csv(tmp_path / "base.tsv", sep="\t", index=False)
+
+    Path_work = str(tmp_path / "carte")
+    [(_, tuiles)] = tri_CSV_multi(
+        str(tmp_path),
+        [Path_work],
+        "base.tsv",
+        [resolution],
+        pixels,
+        zooms_min_mvt=[zoom_min_mvt],
+        zoom_max_mvt=zoom_max_mvt,
+        emprise=emprise,
+        zoom_min=zoom_min,
+        zooms_max_apercu=[zoom_apercu],
+        zoom_max_densite=zoom_max_densite,
+    )
+    (min_x, max_x), (min_y, max_y) = projeter(
+        [emprise[1], emprise[3]], [emprise[0], emprise[2]]
+    )
+    return Path_work, tuiles, (min_x, min_y, max_x, max_y)
+
+
+def tuiles_png(dossier):
+    # {zoom: [(x, y TMS)]} des tuiles d'un dossier de niveaux
+    niveaux = {}
+    for zoom in os.listdir(dossier):
+        if not zoom.isdigit():
+            continue
+        for tx in os.listdir(os.path.join(dossier, zoom)):
+            for nom in os.listdir(os.path.join(dossier, zoom, tx)):
+                niveaux.setdefault(int(zoom), []).append(
+                    (int(tx), int(nom.split(".")[0]))
+                )
+    return niveaux
+
+
+def bornes_tuile(tx, ty, zoom):
+    # (min_x, min_y, max_x, max_y) d'une tuile en numérotation TMS (la ligne 0 est en bas)
+    cote = 2 * origine / 2**zoom
+    return (
+        -origine + tx * cote,
+        -origine + ty * cote,
+        -origine + (tx + 1) * cote,
+        -origine + (ty + 1) * cote,
+    )
+
+
+def touche(bornes, extent):
+    return (
+        bornes[0] < extent[2]
+        and bornes[2] > extent[0]
+        and bornes[1] < extent[3]
+        and bornes[3] > extent[1]
+    )
+
+
+def test_emprise_et_niveaux_respectes(tmp_path):
+    Path_work, tuiles, extent = carte_emprise(tmp_path)
+
+    for categorie in ["Cargo", "Tanker", "All"]:
+        categorie_directory = os.path.join(Path_work, categorie)
+
+        # Stockage des tuiles : seuls les pixels de l'emprise (centres à une demi-résolution près)
+        for x, y in tuiles:
+            df = lire_tuile(os.path.join(categorie_directory, nom_stockage), x, y)
+            if df is None:
+                continue
+            assert (df["lon"] >= extent[0] - resolution).all()
+            assert (df["lon"] <= extent[2] + resolution).all()
+            assert (df["lat"] >= extent[1] - resolution).all()
+            assert (df["lat"] <= extent[3] + resolution).all()
+
+        # Aperçu et densité : seulement les niveaux demandés, et des tuiles qui touchent l'emprise
+        for dossier, zoom_max in [
+            (categorie_directory, zoom_apercu),
+            (os.path.join(categorie_directory, "densite"), zoom_max_densite),
+        ]:
+            niveaux = tuiles_png(dossier)
+            assert sorted(niveaux) == list(range(zoom_min, zoom_max + 1))
+            for zoom, liste in niveaux.items():
+                for tx, ty in liste:
+                    assert touche(bornes_tuile(tx, ty, zoom), extent)
+
+        # Tuiles vectorielles : seulement les niveaux demandés, et chaque point dans l'emprise
+        mvt_directory = os.path.join(categorie_directory, "mvt")
+        assert sorted(int(z) for z in os.listdir(mvt_directory) if z.isdigit()) == list(
+            range(zoom_min_mvt, zoom_max_mvt + 1)
+        )
+        for zoom in range(zoom_min_mvt, zoom_max_mvt + 1):
+            unite = 2 * origine / (etendue * 2**zoom)
+            dossier_zoom = os.path.join(mvt_directory, str(zoom))
+            for tx in os.listdir(dossier_zoom):
+                for nom in os.listdir(os.path.join(dossier_zoom, tx)):
+                    # Numérotation XYZ des tuiles vectorielles : la ligne 0 est en haut
+                    ty = int(nom[: -len(".pbf")])
+                    with open(os.path.join(dossier_zoom, tx, nom), "rb") as f:
+                        couches = mapbox_vector_tile.decode(
+                            f.read(), default_options={"y_coord_down": True}
+                        )
+                    for couche in couches.values():
+                        for feature in couche["features"]:
+                            ix, iy = feature["geometry"]["coordinates"]
+                            x = -origine + (int(tx) * etendue + ix) * unite
+                            y = origine - (ty * etendue + iy) * unite
+                            assert extent[0] - unite <= x <= extent[2] + unite
+                            assert extent[1] - unite <= y <= extent[3] + unite
+
+
+def test_zoom_densite_sous_le_zoom_minimal_refuse():
+    with pytest.raises(ValueError):
+        Configuration(
+            max_zoom=14, zoom_min=12, sortie_densite=True, zoom_max_densite=10
+        )
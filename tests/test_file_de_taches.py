@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import File_de_taches
+from File_de_taches import (
+    arreter_travailleurs,
+    executer_par_file,
+    prepare_file,
+    publier_tache,
+    recuperer_baux_expires,
+    reserver_tache,
+    travailleur,
+)
+
+
+def tache_test(dossier_sortie, nom, duree):
+    # Un fichier par exécution : {nom}.{pid du processus qui l'a exécutée}
+    open(os.path.join(dossier_sortie, f"{nom}.{os.getpid()}"), "w").close()
+    time.sleep(duree)
+
+
+def lancer_travailleur(dossier_file, duree_bail):
+    processus = multiprocessing.get_context("fork").Process(
+        target=travailleur,
+        args=(dossier_file, duree_bail, 3, 0.05),
+        kwargs={"fonctions": {"tache_test": tache_test}},
+    )
+    processus.start()
+    return processus
+
+
+def test_bail_neuf_apres_reservation(tmp_path, monkeypatch):
+    dossier_file = str(tmp_path / "file")
+    prepare_file(dossier_file)
+    publier_tache(dossier_file, "t0", "tache_test", [])
+    # Tâche publiée il y a longtemps
+    os.utime(os.path.join(dossier_file, "pending", "t0.json"), (0, 0))
+
+    # Un autre processus cherche les baux expirés juste après le renommage, avant que la tâche ne soit réécrite
+    ecrire_tache = File_de_taches.ecrire_tache
+
+    def ecrire_tache_concurrente(chemin, tache):
+        recuperer_baux_expires(dossier_file, 60, 3)
+        ecrire_tache(chemin, tache)
+
+    monkeypatch.setattr(File_de_taches, "ecrire_tache", ecrire_tache_concurrente)
+    chemin, _ = reserver_tache(dossier_file, "a")
+    assert os.path.exists(chemin)
+    assert os.listdir(os.path.join(dossier_file, "pending")) == []
+
+
+def test_travailleur_tue_tache_reprise(tmp_path):
+    dossier_file = str(tmp_path / "file")
+    sortie = tmp_path / "sortie"
+    sortie.mkdir()
+    duree_bail = 1.0
+    taches = {f"t{i}": [str(sortie), f"t{i}", 0.5] for i in range(6)}
+
+    resultat = {}
+    coordinateur = threading.Thread(
+        target=lambda: resultat.update(
+            echecs=executer_par_file(
+                dossier_file, "tache_test", taches, duree_bail, 3, attente=0.05
+            )
+        )
+    )
+    coordinateur.start()
+    while not os.path.isdir(os.path.join(dossier_file, "pending")):
+        time.sleep(0.01)
+
+    a = lancer_travailleur(dossier_file, duree_bail)
+    b = lancer_travailleur(dossier_file, duree_bail)
+    try:
+        # Le premier processus est tué pendant sa première tâche
+        debut = time.time()
+        while not any(nom.endswith(f".{a.pid}") for nom in os.listdir(sortie)):
+            assert time.time() - debut < 30
+            time.sleep(0.01)
+        a.kill()
+        a.join()
+
+        coordinateur.join(timeout=60)
+        assert not coordinateur.is_alive()
+        assert resultat["echecs"] == []
+    finally:
+        arreter_travailleurs(dossier_file)
+        b.join(timeout=30)
+        if b.is_alive():
+            b.kill()
+
+    executions = os.listdir(sortie)
+    for nom in taches:
+        assert any(execution.startswith(f"{nom}.") for execution in executions)
+    # La tâche interrompue a été refaite par le processus survivant
+    interrompue = next(e for e in executions if e.endswith(f".{a.pid}")).split(".")[0]
+    assert f"{interrompue}.{b.pid}" in executions
+    assert sorted(os.listdir(os.path.join(dossier_file, "done"))) == sorted(
+        f"{nom}.json" for nom in taches
+    )
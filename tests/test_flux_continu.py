@@ -0,0 +1,57 @@
+import queue
+import threading
+import time
+
+from Flux_continu import colonnes, lire_fichier, lire_lot, rejouer
+
+
+def test_rejouer_positions_et_latence(tmp_path):
+    nb_lignes = 1000
+    lignes_par_seconde = 2000
+    enregistrement = tmp_path / "enregistrement.tsv"
+    with open(enregistrement, "w", encoding="utf-8") as f:
+        f.write("\t".join(colonnes) + "\n")
+        for i in range(nb_lignes):
+            f.write(f"2023-07-01 00:00:00\t{i}\t48.3\t-4.5\t{i % 20}\t0\tCargo\n")
+    cible = tmp_path / "positions.tsv"
+
+    file_lignes = queue.Queue()
+    arret = threading.Event()
+    lecteur = threading.Thread(
+        target=lire_fichier,
+        args=(str(cible), file_lignes, 0, arret, 0.05),
+        daemon=True,
+    )
+    lecteur.start()
+    debut = time.time()
+    rejeu = threading.Thread(
+        target=rejouer, args=(str(enregistrement), str(cible), lignes_par_seconde)
+    )
+    rejeu.start()
+
+    # Des lots plus petits que les paquets du rejeu : un lot s'arrête au milieu des données lues
+    lots = []
+    while True:
+        lot = lire_lot(file_lignes, 0.2, 37, 1)
+        if lot is None:
+            break
+        lots.append(lot)
+    rejeu.join()
+    arret.set()
+
+    recues = [entree for lot in lots for entree in lot]
+    with open(cible, "rb") as f:
+        contenu = f.read()
+    attendues = contenu.decode("utf-8").split("\n")[:-1]
+    assert [ligne for _, ligne, _ in recues] == attendues
+
+    # Chaque ligne porte la position du fichier juste après elle : une reprise depuis la fin d'un lot relit la ligne suivante
+    for _, ligne, position in recues:
+        assert contenu[:position].decode("utf-8").endswith(ligne + "\n")
+    for numero, lot in enumerate(lots[:-1]):
+        suite = contenu[lot[-1][2] :].decode("utf-8").split("\n", 1)[0]
+        assert suite == lots[numero + 1][0][1]
+
+    # Latence : une ligne est lue peu après l'instant où le rejeu l'écrit
+    for i, (reception, _, _) in enumerate(recues[1:]):
+        assert reception - (debut + (i + 1) / lignes_par_seconde) < 1.0
@@ -0,0 +1,68 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import MAIN
+from Couleurs import color_lut
+from Ecriture_asynchrone import vider_ecritures
+
+
+def ecrire_tuile(chemin, vitesse):
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    image = np.zeros((256, 256, 4), dtype=np.uint8)
+    image[:16, :16] = color_lut[vitesse]
+    Image.fromarray(image).save(chemin)
+
+
+def faux_gdal2tiles(group, tiles_producted_directory, Gdal_directory, zoom_levels):
+    # Chaque tuile de base donne une seule tuile PNG lente au zoom 11
+    temp_dir = os.path.join(Gdal_directory, f"temp_{os.getpid()}")
+    for nom in group:
+        x, y = nom[: -len(".tif")].split("_")
+        ecrire_tuile(os.path.join(temp_dir, "11", x, f"{y}.png"), 0)
+
+
+def test_nouveau_rendu_remplace_et_supprime(tmp_path, monkeypatch):
+    monkeypatch.setattr(MAIN, "process_tile_group", faux_gdal2tiles)
+    categorie_directory = str(tmp_path / "Cargo")
+    tiles_producted_directory = os.path.join(categorie_directory, "tiles_producted")
+    os.makedirs(tiles_producted_directory)
+    open(os.path.join(tiles_producted_directory, "0_0.tif"), "w").close()
+
+    # Rendu précédent : une tuile plus rapide, une tuile et un niveau qui n'existent plus
+    ecrire_tuile(os.path.join(categorie_directory, "11", "0", "0.png"), 20)
+    ecrire_tuile(os.path.join(categorie_directory, "11", "5", "5.png"), 20)
+    ecrire_tuile(os.path.join(categorie_directory, "10", "0", "0.png"), 20)
+
+    MAIN.niveaux_zoom_categorie(
+        "Cargo",
+        tiles_producted_directory,
+        categorie_directory,
+        "10-11",
+        SimpleNamespace(mode_distribue=False),
+    )
+    vider_ecritures()
+
+    assert not os.path.exists(os.path.join(categorie_directory, "10"))
+    assert os.listdir(os.path.join(categorie_directory, "11")) == ["0"]
+    image = np.array(
+        Image.open(os.path.join(categorie_directory, "11", "0", "0.png")).convert("RGBA")
+    )
+    np.testing.assert_array_equal(image[0, 0], color_lut[0])
+
+
+def test_mise_a_jour_garde_le_maximum(tmp_path):
+    source = tmp_path / "source"
+    cible = tmp_path / "Cargo"
+    ecrire_tuile(str(source / "11" / "0" / "0.png"), 0)
+    ecrire_tuile(str(cible / "11" / "0" / "0.png"), 20)
+
+    MAIN.parallel_merge([str(source)], str(cible), garder_existant=True)
+    vider_ecritures()
+
+    image = np.array(Image.open(cible / "11" / "0" / "0.png").convert("RGBA"))
+    np.testing.assert_array_equal(image[0, 0], color_lut[20])
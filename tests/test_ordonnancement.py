@@ -0,0 +1,84 @@
+from multiprocessing import Pool
+from types import SimpleNamespace
+
+import pytest
+
+import MAIN
+from Execution_pool import executer_pool
+
+couts = {(0, 0): 5, (0, 1): 300, (1, 0): 40, (1, 1): 1000, (2, 0): 0}
+ordre_attendu = [(1, 1), (0, 1), (1, 0), (0, 0), (2, 0)]
+
+
+class Soumises(Exception):
+    pass
+
+
+def capturer(monkeypatch):
+    soumises = []
+
+    def faux_executer_pool(fonction, arguments, pool=None, chunksize=1, nom=None):
+        soumises.append(list(arguments))
+        raise Soumises()
+
+    monkeypatch.setattr(MAIN, "executer_pool", faux_executer_pool)
+    return soumises
+
+
+def test_rasterisation_des_tuiles_les_plus_chargees_d_abord(monkeypatch):
+    soumises = capturer(monkeypatch)
+    # Tuiles données dans l'ordre des clés, la tuile sans coût connu en dernier
+    tuiles = {cle: (0, 0, 1, 1) for cle in sorted(couts)}
+    tuiles[(3, 3)] = (0, 0, 1, 1)
+    with pytest.raises(Soumises):
+        MAIN.rasterisation_categorie(
+            "Cargo",
+            tuiles,
+            "sortie",
+            "stockage",
+            10.0,
+            SimpleNamespace(
+                mode_distribue=False,
+                pixels=100,
+                mode_trajectoire=False,
+                hauteur_bande=0,
+            ),
+            couts=couts,
+        )
+    assert [args[0] for args in soumises[0]] == ordre_attendu + [(3, 3)]
+
+
+def test_niveaux_de_zoom_des_tuiles_les_plus_chargees_d_abord(tmp_path, monkeypatch):
+    soumises = capturer(monkeypatch)
+    for x, y in sorted(couts):
+        open(tmp_path / f"{x}_{y}.tif", "w").close()
+    with pytest.raises(Soumises):
+        MAIN.niveaux_zoom_categorie(
+            "Cargo",
+            str(tmp_path),
+            str(tmp_path / "Cargo"),
+            "0-6",
+            SimpleNamespace(mode_distribue=False),
+            couts=couts,
+        )
+    assert [args[0] for args in soumises[0]] == [
+        [f"{x}_{y}.tif"] for x, y in ordre_attendu
+    ]
+
+
+def noter(chemin, numero):
+    with open(chemin, "a", encoding="utf-8") as f:
+        f.write(f"{numero}\n")
+
+
+def test_pool_prend_les_taches_dans_l_ordre(tmp_path):
+    # Un seul processus : les tâches sont exécutées dans l'ordre de la liste
+    chemin = str(tmp_path / "ordre.txt")
+    numeros = [7, 3, 9, 1, 5]
+    with Pool(1) as pool:
+        resultats = executer_pool(noter, [(chemin, n) for n in numeros], pool)
+        pool.close()
+        pool.join()
+    with open(chemin, "r", encoding="utf-8") as f:
+        assert [int(ligne) for ligne in f] == numeros
+    assert resultats == [None] * len(numeros)
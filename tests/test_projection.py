@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pyproj")
+
+from Projection import projeter, projeter_pyproj, tolerance_projection
+
+# Limite en latitude de WebMercator (les positions au-delà sont écartées par Validation)
+latitude_max = 85.0511
+
+
+def positions_test(nombre):
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(-latitude_max, latitude_max, nombre)
+    lon = rng.uniform(-180, 180, nombre)
+    # Bords de la projection : près de ±85° et de ±180°, bornes comprises
+    bord_lat = np.concatenate(
+        [
+            rng.uniform(84.9, latitude_max, nombre // 10),
+            rng.uniform(-latitude_max, -84.9, nombre // 10),
+            [latitude_max, -latitude_max, 0.0, 0.0],
+        ]
+    )
+    bord_lon = np.concatenate(
+        [
+            rng.uniform(179.9, 180, nombre // 10),
+            rng.uniform(-180, -179.9, nombre // 10),
+            [180.0, -180.0, 180.0, -180.0],
+        ]
+    )
+    return np.concatenate([lat, bord_lat]), np.concatenate([lon, bord_lon])
+
+
+def test_projeter_egal_pyproj():
+    lat, lon = positions_test(100_000)
+    x, y = projeter(lat, lon, verifier=False)
+    x_ref, y_ref = projeter_pyproj(lat, lon)
+    assert np.max(np.abs(x - x_ref)) < tolerance_projection
+    assert np.max(np.abs(y - y_ref)) < tolerance_projection
+
+
+def test_projeter_plusieurs_threads(monkeypatch):
+    # Blocs plus petits que le nombre de positions : le calcul est réparti sur plusieurs threads
+    monkeypatch.setattr("Projection.taille_bloc", 10_000)
+    lat, lon = positions_test(100_000)
+    x, y = projeter(lat, lon, nb_threads=4, verifier=False)
+    x_un, y_un = projeter(lat, lon, nb_threads=1, verifier=False)
+    np.testing.assert_array_equal(x, x_un)
+    np.testing.assert_array_equal(y, y_un)
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+
+from Ecriture_asynchrone import vider_ecritures
+from MAIN import create_subraster
+from Stockage_tuiles import nom_stockage
+from Tri_CSV import (
+    data_tiles_info_creator,
+    pixels_aggregation,
+    segments_creator,
+    segments_sort_to_npy,
+    tiles_creator,
+    tiles_sort_to_npy,
+)
+
+resolution = 10.0
+pixels = 100
+
+
+def positions(nombre):
+    # Deux tuiles de 1000 m côte à côte (x de 0 à 2000, y de 0 à 1000)
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "mmsi": rng.integers(0, 20, nombre),
+            "datetime": pd.Timestamp("2023-07-01")
+            + pd.to_timedelta(rng.integers(0, 3600, nombre), unit="s"),
+            "lon": rng.uniform(0, 2000, nombre),
+            "lat": rng.uniform(0, 1000, nombre),
+            "speed": rng.uniform(0, 30, nombre),
+            "QO_category": "Cargo",
+        }
+    )
+
+
+def stockage(tmp_path, mode_trajectoire):
+    data = positions(500)
+    tuiles, _ = tiles_creator(1000.0, 0.0, 2000.0, 0.0, 1000.0)
+    data_tiles = data_tiles_info_creator(tuiles)
+    if mode_trajectoire:
+        segments = segments_creator(data, 3600, 500)
+        segments_sort_to_npy(
+            segments, data_tiles, tuiles, 1000.0, 0.0, 0.0, str(tmp_path)
+        )
+    else:
+        pixels_occupes = pixels_aggregation(data, resolution, 0.0, 0.0)
+        tiles_sort_to_npy(
+            pixels_occupes,
+            data_tiles,
+            tuiles,
+            str(tmp_path),
+            resolution,
+            pixels,
+            0.0,
+            0.0,
+        )
+    return tuiles, str(tmp_path / "Cargo" / nom_stockage)
+
+
+def rasters(tuiles, dossier_stockage, sortie, mode_trajectoire, hauteur_bande):
+    sortie.mkdir()
+    for cle, valeurs in tuiles.items():
+        create_subraster(
+            cle,
+            valeurs,
+            str(sortie),
+            dossier_stockage,
+            resolution,
+            pixels,
+            mode_trajectoire,
+            hauteur_bande,
+        )
+    vider_ecritures()
+    resultat = {}
+    for x, y in tuiles:
+        with rasterio.open(sortie / f"{x}_{y}.tif") as src:
+            resultat[(x, y)] = (src.read(), src.transform)
+    return resultat
+
+
+@pytest.mark.parametrize("mode_trajectoire", [False, True])
+def test_bandes_egales_a_la_tuile_entiere(tmp_path, mode_trajectoire):
+    tuiles, dossier_stockage = stockage(tmp_path, mode_trajectoire)
+    entieres = rasters(
+        tuiles, dossier_stockage, tmp_path / "entiere", mode_trajectoire, 0
+    )
+    assert all(raster[3].any() for raster, _ in entieres.values())
+
+    # Hauteurs qui divisent ou non la hauteur de la tuile, et plus grande que la tuile
+    for hauteur_bande in [1, 7, 25, 64, 100, 150]:
+        bandes = rasters(
+            tuiles,
+            dossier_stockage,
+            tmp_path / f"bandes_{hauteur_bande}",
+            mode_trajectoire,
+            hauteur_bande,
+        )
+        for cle, (raster, transform) in entieres.items():
+            np.testing.assert_array_equal(bandes[cle][0], raster)
+            assert bandes[cle][1] == transform
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.transform import from_origin
+
+import Sortie_COG
+from Sortie_COG import creer_cog, reduction_max
+
+
+def ecrire_tuile(chemin, image, x, y, resolution):
+    height, width = image.shape[1:]
+    with rasterio.open(
+        chemin,
+        "w",
+        driver="GTiff",
+        width=width,
+        height=height,
+        count=4,
+        dtype="uint8",
+        crs="EPSG:3857",
+        transform=from_origin(
+            x * width * resolution, (y + 1) * height * resolution, resolution, resolution
+        ),
+    ) as dst:
+        dst.write(image)
+
+
+def test_creer_cog_apercus_max(tmp_path, monkeypatch):
+    # Petits blocs : plusieurs bandes par tuile et plusieurs niveaux d'aperçus
+    monkeypatch.setattr(Sortie_COG, "taille_bloc", 128)
+    rng = np.random.default_rng(0)
+    resolution = 10.0
+    taille = 200
+    dossier = tmp_path / "tuiles"
+    dossier.mkdir()
+    attendu = np.zeros((4, 2 * taille, 3 * taille), dtype=np.uint8)
+    for x in range(3):
+        for y in range(2):
+            image = np.zeros((4, taille, taille), dtype=np.uint8)
+            lignes, colonnes = rng.integers(0, taille, (2, 500))
+            image[:3, lignes, colonnes] = rng.integers(1, 255, (3, 500))
+            image[3, lignes, colonnes] = 255
+            ecrire_tuile(str(dossier / f"{x}_{y}.tif"), image, x, y, resolution)
+            attendu[
+                :, (1 - y) * taille : (2 - y) * taille, x * taille : (x + 1) * taille
+            ] = image
+
+    chemin_cog = str(tmp_path / "carte.tif")
+    creer_cog(str(dossier), resolution, chemin_cog)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["carte.tif", "tuiles"]
+    with rasterio.open(chemin_cog) as src:
+        assert src.overviews(1) == [2, 4, 8]
+        np.testing.assert_array_equal(src.read(), attendu)
+
+    # Chaque aperçu garde, dans chaque bloc 2x2, le pixel de vitesse maximale du niveau précédent
+    niveau = attendu.transpose(1, 2, 0)
+    for i in range(3):
+        niveau = reduction_max(niveau)
+        with rasterio.open(chemin_cog, overview_level=i) as src:
+            np.testing.assert_array_equal(src.read().transpose(1, 2, 0), niveau)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from Sortie_densite import (
+    colorer_densite,
+    comptes_base,
+    creer_densite,
+    lisser_niveau,
+    reduire_comptes,
+    taille_tuile,
+)
+
+
+def test_reduction_egale_au_comptage_direct(tmp_path):
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-600000, -400000, 10000)
+    y = rng.uniform(6100000, 6200000, 10000)
+
+    # Les comptes directs sont dans un autre dossier : les fichiers portent le numéro du niveau
+    directs = tmp_path / "directs"
+    directs.mkdir()
+    cles, grilles = comptes_base(x, y, 10, str(tmp_path))
+    for zoom in range(9, 6, -1):
+        cles, grilles = reduire_comptes(cles, grilles, zoom, str(tmp_path))
+        cles_directes, grilles_directes = comptes_base(x, y, zoom, str(directs))
+        np.testing.assert_array_equal(cles, cles_directes)
+        np.testing.assert_array_equal(np.asarray(grilles), np.asarray(grilles_directes))
+        assert grilles.sum() == len(x)
+
+
+def test_tuiles_de_densite_lissees_tuile_par_tuile(tmp_path, monkeypatch):
+    import Sortie_densite
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "lon": rng.normal(-500000, 300000, 5000),
+            "lat": rng.normal(6150000, 300000, 5000),
+            "QO_category": rng.choice(["Cargo", "Tanker"], 5000),
+        }
+    )
+    # Seuls les comptes de chaque niveau passent par le disque, pas les densités lissées
+    fichiers = []
+    grilles_disque = Sortie_densite._grilles_disque
+
+    def grilles_notees(dossier, nom, nombre):
+        fichiers.append(nom)
+        return grilles_disque(dossier, nom, nombre)
+
+    monkeypatch.setattr(Sortie_densite, "_grilles_disque", grilles_notees)
+    Path_work = tmp_path / "carte"
+    creer_densite(data, [str(Path_work)], 6, 2.0, 1.3)
+    assert all(nom.startswith("comptes_") for nom in fichiers)
+
+    # Mêmes tuiles qu'un lissage de tout le niveau en mémoire
+    cles, grilles = comptes_base(
+        data["lon"].values, data["lat"].values, 6, str(tmp_path)
+    )
+    for zoom in range(6, -1, -1):
+        if zoom < 6:
+            cles, grilles = reduire_comptes(cles, grilles, zoom, str(tmp_path))
+        sigma = min(2.0 * 1.3 ** (6 - zoom), taille_tuile / 3)
+        lissees = dict(lisser_niveau(cles, grilles, zoom, sigma))
+        echelle = np.log1p(max(densite.max() for densite in lissees.values()))
+        for (tx, ty), densite in lissees.items():
+            image = colorer_densite(densite, echelle)
+            chemin = (
+                Path_work
+                / "All"
+                / "densite"
+                / str(zoom)
+                / str(tx)
+                / f"{2**zoom - 1 - ty}.png"
+            )
+            if image[..., 3].any():
+                np.testing.assert_array_equal(np.asarray(Image.open(chemin)), image)
+            else:
+                assert not chemin.exists()
+    # Le dossier temporaire des comptes est supprimé
+    assert sorted(p.name for p in Path_work.iterdir()) == ["All", "Cargo", "Tanker"]
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+import Sortie_MVT
+from Sortie_MVT import creer_mvt, etendue, origine
+
+zoom_min, zoom_max = 9, 11
+
+
+def positions(nombre, graine=0):
+    rng = np.random.default_rng(graine)
+    return pd.DataFrame(
+        {
+            "lon": rng.uniform(-520000, -480000, nombre),
+            "lat": rng.uniform(6130000, 6170000, nombre),
+            # Vitesses au dixième de noeud, comme dans les données AIS
+            "speed": np.round(rng.uniform(0, 25, nombre), 1),
+            "QO_category": rng.choice(["Cargo", "Tanker"], nombre),
+        }
+    )
+
+
+def lire_tuiles(mvt_directory, zoom):
+    tuiles = {}
+    dossier_zoom = os.path.join(mvt_directory, str(zoom))
+    for tx in os.listdir(dossier_zoom):
+        for nom in os.listdir(os.path.join(dossier_zoom, tx)):
+            with open(os.path.join(dossier_zoom, tx, nom), "rb") as f:
+                tuiles[(int(tx), int(nom[: -len(".pbf")]))] = f.read()
+    return tuiles
+
+
+def decoder(contenu):
+    # Coordonnées brutes de la tuile (0 à etendue - 1, y vers le bas)
+    return mapbox_vector_tile.decode(contenu, default_options={"y_coord_down": True})
+
+
+def points_attendus(data, zoom):
+    # Position de chaque point en 1 / etendue de tuile, depuis le coin nord-ouest du monde
+    cote = etendue * 2**zoom
+    gx = np.floor((data["lon"].values + origine) / (2 * origine) * cote).astype(int)
+    gy = np.floor((origine - data["lat"].values) / (2 * origine) * cote).astype(int)
+    return (
+        data.assign(
+            tx=gx // etendue, ty=gy // etendue, ix=gx % etendue, iy=gy % etendue
+        )
+        .groupby(["tx", "ty", "ix", "iy"])
+        .agg(speed=("speed", "max"), count=("speed", "size"))
+    )
+
+
+def test_tuiles_decodees(tmp_path):
+    data = positions(2000)
+    Path_work = str(tmp_path / "carte")
+    creer_mvt(data, [Path_work], [zoom_min], zoom_max, 4096)
+
+    for categorie in ["Cargo", "Tanker", "All"]:
+        data_cat = (
+            data if categorie == "All" else data[data["QO_category"] == categorie]
+        )
+        for zoom in range(zoom_min, zoom_max + 1):
+            attendus = points_attendus(data_cat, zoom)
+            tuiles = lire_tuiles(os.path.join(Path_work, categorie, "mvt"), zoom)
+            assert set(tuiles) == set(
+                zip(
+                    attendus.index.get_level_values(0),
+                    attendus.index.get_level_values(1),
+                )
+            )
+            for (tx, ty), contenu in tuiles.items():
+                couches = decoder(contenu)
+                assert list(couches) == [categorie]
+                couche = couches[categorie]
+                assert couche["extent"] == etendue
+                dans_tuile = attendus.loc[(tx, ty)]
+                assert len(couche["features"]) == len(dans_tuile)
+                for feature in couche["features"]:
+                    assert feature["geometry"]["type"] == "Point"
+                    ix, iy = feature["geometry"]["coordinates"]
+                    proprietes = feature["properties"]
+                    assert proprietes["speed"] == dans_tuile.loc[(ix, iy), "speed"]
+                    assert proprietes["count"] == dans_tuile.loc[(ix, iy), "count"]
+                    if categorie != "All":
+                        assert proprietes["QO_category"] == categorie
+                    else:
+                        assert proprietes["QO_category"] in ("Cargo", "Tanker")
+
+
+def test_budget_par_tuile(tmp_path):
+    data = positions(20000)
+    Path_work = str(tmp_path / "carte")
+    budget = 100
+    creer_mvt(data, [Path_work], [zoom_min], zoom_max, budget)
+
+    for zoom in range(zoom_min, zoom_max + 1):
+        attendus = points_attendus(data, zoom)
+        for (tx, ty), contenu in lire_tuiles(
+            os.path.join(Path_work, "All", "mvt"), zoom
+        ).items():
+            features = decoder(contenu)["All"]["features"]
+            dans_tuile = attendus.loc[(tx, ty)]
+            assert len(features) <= budget
+            # Les points regroupés gardent tous leurs rapports et le plus rapide d'entre eux
+            assert (
+                sum(f["properties"]["count"] for f in features)
+                == dans_tuile["count"].sum()
+            )
+            assert (
+                max(f["properties"]["speed"] for f in features)
+                == dans_tuile["speed"].max()
+            )
+            if len(dans_tuile) > budget:
+                assert len(features) < len(dans_tuile)
+
+
+def test_groupes_de_tuiles_identiques_au_niveau_entier(tmp_path, monkeypatch):
+    data = positions(5000)
+    creer_mvt(data, [str(tmp_path / "entier")], [zoom_min], zoom_max, 200)
+    # Groupes de quelques points : chaque tuile est encodée seule
+    monkeypatch.setattr(Sortie_MVT, "taille_groupe", 7)
+    creer_mvt(data, [str(tmp_path / "groupes")], [zoom_min], zoom_max, 200)
+    for zoom in range(zoom_min, zoom_max + 1):
+        assert lire_tuiles(
+            str(tmp_path / "entier" / "All" / "mvt"), zoom
+        ) == lire_tuiles(str(tmp_path / "groupes" / "All" / "mvt"), zoom)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from Projection import projeter
+from Statistiques import compter_rapports, creer_pyramide, histogramme_vitesses
+
+zoom_base = 10
+
+
+def rapports(nombre):
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(-10, 10, nombre)
+    lat = rng.uniform(40, 55, nombre)
+    x, y = projeter(lat, lon, verifier=False)
+    return (
+        lon,
+        lat,
+        pd.DataFrame(
+            {
+                "lon": x,
+                "lat": y,
+                "speed": rng.uniform(0, 25, nombre),
+                "QO_category": rng.choice(["Cargo", "Tanker"], nombre),
+            }
+        ),
+    )
+
+
+def bords_tuile(tx, ty):
+    # Longitude et latitude d'un point d'une tuile du zoom de base (tx, ty entiers : coin nord-ouest)
+    cote = 2**zoom_base
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(ty) / cote))))
+    return -180 + 360 * np.asarray(tx) / cote, lat
+
+
+def test_emprise_egale_au_comptage_des_rapports(tmp_path):
+    lon, lat, data = rapports(200000)
+    creer_pyramide(data, str(tmp_path), zoom_base)
+
+    # Emprise alignée sur les tuiles du zoom de base : le comptage est exact
+    lon_min, lat_max = bords_tuile(500, 340)
+    lon_max, lat_min = bords_tuile(530, 370)
+    emprise = (lon_min, lat_min, lon_max, lat_max)
+    dedans = (lon >= lon_min) & (lon < lon_max) & (lat > lat_min) & (lat <= lat_max)
+    assert dedans.sum() > 1000
+
+    for categorie in ["All", "Cargo", "Tanker"]:
+        garde = dedans & (
+            (categorie == "All") | (data["QO_category"].values == categorie)
+        )
+        classes = np.minimum(data["speed"].values[garde], 20).astype(int)
+        np.testing.assert_array_equal(
+            histogramme_vitesses(str(tmp_path), emprise, categorie),
+            np.bincount(classes, minlength=21),
+        )
+        assert (
+            compter_rapports(
+                str(tmp_path), emprise, categorie, vitesse_min=0, vitesse_max=20
+            )
+            == garde.sum()
+        )
+        assert (
+            compter_rapports(
+                str(tmp_path), emprise, categorie, vitesse_min=5, vitesse_max=9
+            )
+            == ((classes >= 5) & (classes <= 9)).sum()
+        )
+
+
+def test_emprise_quelconque_arrondie_aux_tuiles(tmp_path):
+    lon, lat, data = rapports(100000)
+    creer_pyramide(data, str(tmp_path), zoom_base)
+
+    # Une tuile du bord de l'emprise est comptée si son centre est dans l'emprise
+    cote = 2**zoom_base
+    origine = 20037508.342789244
+    tx = ((data["lon"].values + origine) / (2 * origine) * cote).astype(np.int64)
+    ty = ((origine - data["lat"].values) / (2 * origine) * cote).astype(np.int64)
+    centre_lon, centre_lat = bords_tuile(tx + 0.5, ty + 0.5)
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        lon_min, lon_max = np.sort(rng.uniform(-10, 10, 2))
+        lat_min, lat_max = np.sort(rng.uniform(40, 55, 2))
+        dedans = (
+            (centre_lon >= lon_min)
+            & (centre_lon < lon_max)
+            & (centre_lat > lat_min)
+            & (centre_lat <= lat_max)
+        )
+        assert (
+            compter_rapports(str(tmp_path), (lon_min, lat_min, lon_max, lat_max))
+            == dedans.sum()
+        )
+
+
+def test_comptes_sur_64_bits(tmp_path):
+    # Les tuiles peu précises d'un grand fichier dépassent 2**32 rapports
+    _, _, data = rapports(10)
+    creer_pyramide(data, str(tmp_path), 2)
+    for zoom in range(3):
+        comptes = np.load(tmp_path / "statistiques" / "All" / f"comptes_{zoom}.npy")
+        assert comptes.dtype == np.uint64
@@ -0,0 +1,71 @@
+import numpy as np
+
+from Stockage_tuiles import (
+    couts_partition,
+    ecrire_partition,
+    ecrire_vue,
+    lire_tuile,
+    tuile_presente,
+)
+
+
+def lignes(rng, nombre, tuiles):
+    choix = rng.integers(0, len(tuiles), nombre)
+    return (
+        np.array([tuiles[i][0] for i in choix]),
+        np.array([tuiles[i][1] for i in choix]),
+        {"speed": rng.uniform(0, 30, nombre), "count": rng.integers(1, 10, nombre)},
+    )
+
+
+def test_vue_all_egale_au_contenu_des_categories(tmp_path):
+    rng = np.random.default_rng(0)
+    # Indices de tuile au-delà de 2**16 et y = 0 : la clé x << 32 | y ne doit pas mélanger deux tuiles
+    tuiles = [(0, 0), (0, 1), (1, 0), (3, 2**20), (2**20, 3)]
+    categories = {
+        "Cargo": lignes(rng, 200, tuiles),
+        "Tanker": lignes(rng, 100, tuiles[1:4]),
+    }
+    for nom, (x, y, colonnes) in categories.items():
+        ecrire_partition(str(tmp_path / nom), x, y, colonnes)
+    ecrire_vue(str(tmp_path / "All"), [str(tmp_path / nom) for nom in categories])
+
+    couts_all = couts_partition(str(tmp_path / "All"))
+    for tuile in tuiles:
+        attendu = {"speed": [], "count": []}
+        for nom, (x, y, colonnes) in categories.items():
+            garde = (x == tuile[0]) & (y == tuile[1])
+            df = lire_tuile(str(tmp_path / nom), *tuile)
+            if not garde.any():
+                assert df is None
+                assert tuile not in couts_partition(str(tmp_path / nom))
+                continue
+            # Lignes de la tuile, dans l'ordre d'écriture
+            for colonne in attendu:
+                np.testing.assert_array_equal(
+                    df[colonne].values, colonnes[colonne][garde]
+                )
+                attendu[colonne].append(colonnes[colonne][garde])
+            assert couts_partition(str(tmp_path / nom))[tuile] == garde.sum()
+
+        # La vue "All" met bout à bout les lignes des catégories
+        df = lire_tuile(str(tmp_path / "All"), *tuile)
+        assert tuile_presente(str(tmp_path / "All"), *tuile)
+        for colonne, valeurs in attendu.items():
+            np.testing.assert_array_equal(df[colonne].values, np.concatenate(valeurs))
+        assert couts_all[tuile] == len(df)
+
+    assert set(couts_all) == set(tuiles)
+
+    # Clés x << 32 | y triées et bornes des lignes de chaque tuile
+    x, y, _ = categories["Cargo"]
+    cles = np.load(tmp_path / "Cargo" / "cles.npy")
+    bornes = np.load(tmp_path / "Cargo" / "bornes.npy")
+    np.testing.assert_array_equal(
+        cles, np.unique((x.astype(np.int64) << 32) | y.astype(np.int64))
+    )
+    assert bornes[0] == 0 and bornes[-1] == len(x)
+    for cle, nombre in zip(cles, np.diff(bornes)):
+        assert nombre == ((x == cle >> 32) & (y == cle & 0xFFFFFFFF)).sum()
+    assert lire_tuile(str(tmp_path / "All"), 2, 2) is None
+    assert not tuile_presente(str(tmp_path / "All"), 0, 2**20)
@@ -0,0 +1,101 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("rasterio")
+
+from Configuration import Configuration
+from MAIN import rasterisation_categorie
+from Stockage_tuiles import couts_partition, nom_stockage
+from Trace import activer_trace, desactiver_trace, exporter_trace
+from Tri_CSV import (
+    data_tiles_info_creator,
+    pixels_aggregation,
+    tiles_creator,
+    tiles_sort_to_npy,
+)
+
+resolution = 10.0
+pixels = 100
+
+
+def stockage(tmp_path):
+    # Quatre tuiles de 1000 m, dont une vide
+    rng = np.random.default_rng(0)
+    lon = rng.uniform(0, 2000, 3000)
+    lat = rng.uniform(0, 2000, 3000)
+    garde = (lon < 1000) | (lat < 1000)
+    data = pd.DataFrame(
+        {
+            "lon": lon[garde],
+            "lat": lat[garde],
+            "speed": rng.uniform(0, 25, garde.sum()),
+            "QO_category": "Cargo",
+        }
+    )
+    tuiles, _ = tiles_creator(1000.0, 0.0, 2000.0, 0.0, 2000.0)
+    tiles_sort_to_npy(
+        pixels_aggregation(data, resolution, 0.0, 0.0),
+        data_tiles_info_creator(tuiles),
+        tuiles,
+        str(tmp_path),
+        resolution,
+        pixels,
+        0.0,
+        0.0,
+    )
+    return tuiles, str(tmp_path / "Cargo" / nom_stockage)
+
+
+def test_trace_d_une_etape(tmp_path):
+    tuiles, dossier_stockage = stockage(tmp_path)
+    couts = couts_partition(dossier_stockage)
+    sortie = tmp_path / "tiles_producted"
+    sortie.mkdir()
+    dossier_trace = str(tmp_path / "trace")
+
+    activer_trace(dossier_trace)
+    try:
+        rasterisation_categorie(
+            "Cargo",
+            tuiles,
+            str(sortie),
+            dossier_stockage,
+            resolution,
+            Configuration(pixels=pixels, mode_distribue=False, hauteur_bande=0),
+            couts=couts,
+        )
+    finally:
+        desactiver_trace()
+    chemin = os.path.join(dossier_trace, "trace.json")
+    exporter_trace(dossier_trace, chemin)
+
+    with open(chemin, "r", encoding="utf-8") as f:
+        evenements = json.load(f)["traceEvents"]
+    taches = [e for e in evenements if e["ph"] == "X"]
+    for e in taches:
+        assert set(e) == {"name", "cat", "ph", "ts", "dur", "pid", "tid", "args"}
+        assert e["ts"] > 0 and e["dur"] >= 0
+        assert isinstance(e["pid"], int) and isinstance(e["tid"], int)
+
+    # Une tâche de rasterisation par tuile occupée, avec son nombre de pixels
+    rasterisation = {
+        tuple(e["args"]["tuile"]): e for e in taches if e["cat"] == "rasterisation"
+    }
+    assert set(rasterisation) == set(couts)
+    for tuile, e in rasterisation.items():
+        assert e["name"] == f"{tuile[0]}_{tuile[1]}"
+        assert e["args"]["points"] == couts[tuile]
+
+    # Une écriture par tuile .tif, avec sa taille
+    ecritures = {e["name"]: e for e in taches if e["cat"] == "ecriture"}
+    assert set(ecritures) == set(os.listdir(sortie))
+    for nom, e in ecritures.items():
+        assert e["args"]["octets"] == os.path.getsize(sortie / nom)
+
+    # Chaque processus est nommé pour la visionneuse
+    noms = {e["pid"] for e in evenements if e["ph"] == "M"}
+    assert {e["pid"] for e in taches} <= noms
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from MAIN import burn_segments
+from Stockage_tuiles import lire_tuile, nom_stockage
+from Tri_CSV import (
+    data_tiles_info_creator,
+    segments_creator,
+    segments_sort_to_npy,
+    tiles_creator,
+)
+
+resolution = 10.0
+pixels = 100
+
+
+def rasters_trajectoire(tmp_path):
+    # Deux tuiles de 1000 m côte à côte (x de 0 à 2000, y de 0 à 1000)
+    data = pd.DataFrame(
+        {
+            "mmsi": [1, 1, 2, 3, 3],
+            "datetime": [
+                "2023-07-01 00:00:00",
+                "2023-07-01 00:01:00",
+                "2023-07-01 00:00:30",
+                "2023-07-01 00:00:00",
+                "2023-07-01 02:00:00",
+            ],
+            # Navire 1 : traverse la limite des deux tuiles. Navire 2 : une seule position, juste après le navire 1.
+            # Navire 3 : deux positions séparées par un trou de deux heures
+            "lon": [500.0, 1500.0, 1500.0, 200.0, 800.0],
+            "lat": [500.0, 500.0, 800.0, 100.0, 100.0],
+            "speed": [10.0, 10.0, 5.0, 3.0, 3.0],
+            "QO_category": ["Cargo"] * 5,
+        }
+    )
+    segments = segments_creator(data, 3600, 1000)
+    tuiles, _ = tiles_creator(1000.0, 0.0, 2000.0, 0.0, 1000.0)
+    segments_sort_to_npy(
+        segments, data_tiles_info_creator(tuiles), tuiles, 1000.0, 0.0, 0.0, str(tmp_path)
+    )
+
+    rasters = {}
+    for (x, y), (min_x, _, _, max_y) in tuiles.items():
+        raster = np.zeros((pixels, pixels, 4), dtype=np.uint8)
+        df = lire_tuile(str(tmp_path / "Cargo" / nom_stockage), x, y)
+        if df is not None:
+            burn_segments(raster, df, min_x, max_y, resolution)
+        rasters[(x, y)] = raster[..., 3] > 0
+    return segments, rasters
+
+
+def test_segments_entre_positions_d_un_meme_navire(tmp_path):
+    segments, _ = rasters_trajectoire(tmp_path)
+    # Un seul segment relié (navire 1), les trois autres positions restent isolées (segments de longueur nulle)
+    relies = segments[
+        (segments["lon0"] != segments["lon1"]) | (segments["lat0"] != segments["lat1"])
+    ]
+    assert relies[["lon0", "lat0", "lon1", "lat1"]].values.tolist() == [
+        [500.0, 500.0, 1500.0, 500.0]
+    ]
+    assert len(segments) == 4
+
+
+def test_segments_traces_dans_les_deux_tuiles(tmp_path):
+    _, rasters = rasters_trajectoire(tmp_path)
+    gauche, droite = rasters[(0, 0)], rasters[(1, 0)]
+
+    # Navire 1 (y = 500, ligne 50) : de la colonne 50 de la tuile de gauche à la colonne 50 de celle de droite, sans trou à la limite
+    assert gauche[50, 50:].all()
+    assert droite[50, :51].all()
+    assert not gauche[50, :50].any()
+    assert not droite[50, 51:].any()
+
+    # Pas de segment entre deux navires : la colonne x = 1500 est vide entre le navire 1 et le navire 2
+    assert droite[20, 50]
+    assert not droite[21:50, 50].any()
+
+    # Pas de segment à travers un trou de temps : seules les deux positions du navire 3 sont dessinées (ligne 90)
+    assert gauche[90, 20] and gauche[90, 80]
+    assert not gauche[90, 21:80].any()
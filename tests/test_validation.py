@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from Validation import raisons_rejet, valider_positions
+
+
+def positions():
+    # Une ligne valide puis une ligne par raison de rejet, dans l'ordre de priorité des tests
+    lignes = [
+        ("valide", 1, "2023-07-01 00:00:00", 48.0, -4.0, 10.0, "Cargo"),
+        ("lat_manquante", 1, "2023-07-01 00:00:00", None, -4.0, 10.0, "Cargo"),
+        ("lon_manquante", 1, "2023-07-01 00:00:00", 48.0, "abc", 10.0, "Cargo"),
+        ("sog_manquante", 1, "2023-07-01 00:00:00", 48.0, -4.0, None, "Cargo"),
+        ("categorie_manquante", 1, "2023-07-01 00:00:00", 48.0, -4.0, 10.0, None),
+        ("mmsi_manquant", None, "2023-07-01 00:00:00", 48.0, -4.0, 10.0, "Cargo"),
+        ("datetime_invalide", 1, "pas une date", 48.0, -4.0, 10.0, "Cargo"),
+        ("lat_sentinelle", 1, "2023-07-01 00:00:00", 91.0, -4.0, 10.0, "Cargo"),
+        ("lon_sentinelle", 1, "2023-07-01 00:00:00", 48.0, 181.0, 10.0, "Cargo"),
+        ("sog_sentinelle", 1, "2023-07-01 00:00:00", 48.0, -4.0, 102.3, "Cargo"),
+        ("lat_hors_limites", 1, "2023-07-01 00:00:00", -95.0, -4.0, 10.0, "Cargo"),
+        ("lon_hors_limites", 1, "2023-07-01 00:00:00", 48.0, 200.0, 10.0, "Cargo"),
+        ("sog_negative", 1, "2023-07-01 00:00:00", 48.0, -4.0, -1.0, "Cargo"),
+        ("sog_hors_limites", 1, "2023-07-01 00:00:00", 48.0, -4.0, 102.25, "Cargo"),
+        ("lat_hors_mercator", 1, "2023-07-01 00:00:00", 88.0, -4.0, 10.0, "Cargo"),
+        # Plusieurs raisons : seule la première est gardée
+        ("lat_manquante", None, "pas une date", None, 181.0, -1.0, "Cargo"),
+    ]
+    attendu = [ligne[0] for ligne in lignes]
+    data = pd.DataFrame(
+        [ligne[1:] for ligne in lignes],
+        columns=["mmsi", "datetime", "lat", "lon", "sog", "QO_category"],
+    )
+    return data, np.array(["" if code == "valide" else code for code in attendu])
+
+
+def test_codes_de_rejet():
+    data, attendu = positions()
+    np.testing.assert_array_equal(raisons_rejet(data, mode_trajectoire=True), attendu)
+
+    # Hors mode trajectoire, mmsi et datetime ne sont pas vérifiés
+    sans_trajectoire = raisons_rejet(data)
+    trajectoire = np.isin(attendu, ["mmsi_manquant", "datetime_invalide"])
+    assert (sans_trajectoire[trajectoire] == "").all()
+    np.testing.assert_array_equal(sans_trajectoire[~trajectoire], attendu[~trajectoire])
+
+
+def test_fichiers_de_quarantaine(tmp_path):
+    data, attendu = positions()
+    valides = valider_positions(data, str(tmp_path), mode_trajectoire=True)
+    assert len(valides) == 1
+    assert valides["lat"].dtype == np.float64
+    assert valides["lon"].tolist() == [-4.0]
+
+    quarantaine = pd.read_csv(tmp_path / "quarantaine.tsv", sep="\t")
+    assert quarantaine["raison"].tolist() == list(attendu[1:])
+    # Les lignes rejetées sont gardées telles qu'elles ont été lues
+    assert pd.isna(quarantaine["sog"][2])
+    assert quarantaine["lon"][1] == "abc"
+    assert quarantaine["datetime"].tolist()[5] == "pas une date"
+
+    raisons = pd.read_csv(tmp_path / "quarantaine_raisons.csv")
+    compte = dict(zip(raisons["raison"], raisons["nombre"]))
+    assert compte.pop("lat_manquante") == 2
+    assert compte == {code: 1 for code in attendu[2:-1]}
+
+    # En ingestion continue, les rejets d'un nouveau lot sont ajoutés aux précédents
+    valider_positions(data.iloc[[0, 1]], str(tmp_path), ajouter=True)
+    quarantaine = pd.read_csv(tmp_path / "quarantaine.tsv", sep="\t")
+    assert len(quarantaine) == len(attendu)
+    raisons = pd.read_csv(tmp_path / "quarantaine_raisons.csv")
+    assert dict(zip(raisons["raison"], raisons["nombre"]))["lat_manquante"] == 3